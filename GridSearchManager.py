@@ -4,11 +4,14 @@ Dropped in from TempFlow. Removed the yaml config support.
 
 import copy
 import datetime
+import json
+import multiprocessing
+import os
 import warnings
 import re
 import pydoc
 from abc import abstractmethod, ABCMeta
-from typing import Dict, List, Union, Any, Callable, Tuple, NamedTuple, Generator
+from typing import Dict, List, Union, Any, Callable, Tuple, NamedTuple, Generator, Optional
 
 
 class SearchConfiguration(NamedTuple):
@@ -17,6 +20,19 @@ class SearchConfiguration(NamedTuple):
     id: int
 
 
+class _SearchRunTask(NamedTuple):
+    targetFunc: Callable
+    config: Dict[str, Any]
+    searchPoint: Dict[str, Any]
+    runName: str
+    instance: int
+
+
+def _execute_search_run(task: _SearchRunTask) -> Tuple[_SearchRunTask, Any]:
+    # Module-level, so that the process pool can pickle it.
+    return task, task.targetFunc(task.config, task.searchPoint, task.runName)
+
+
 class AbstractSearchManager(metaclass=ABCMeta):
 
     def __init__(self):
@@ -40,9 +56,9 @@ class AbstractSearchManager(metaclass=ABCMeta):
         :return:
         """
         configs, paramAxisValues = [], []
-        for config, axes in self.generate_configuration():
-            configs.append(config)
-            paramAxisValues.append(axes)
+        for configuration in self.generate_configuration():
+            configs.append(configuration.config)
+            paramAxisValues.append(configuration.searchPoint)
 
         return configs, paramAxisValues
 
@@ -62,38 +78,83 @@ class AbstractSearchManager(metaclass=ABCMeta):
 
     def run_search(self, targetFunc: Callable[[Dict, Dict, str], Union[Dict, Tuple]],
                    nameGenerator: Callable[[Dict], str] = None,
-                   repeatNumber: int = 1):
+                   repeatNumber: int = 1,
+                   workers: int = 1,
+                   resultsPath: Optional[str] = None):
+        """
+        Execute the target function for every search point (several times, if repetitions are requested).
 
+        :param workers: Run this many executions at once on a process pool. The target function must be picklable.
+        :param resultsPath: A JSON-lines file, where each finished run is appended.
+                            If it already exists, the runs it contains are loaded instead of executed,
+                            so an interrupted search can be resumed. The returned values must be JSON-serializable.
+        """
         import numpy as np
 
-        # Run the experiments.
-        runResults = []  # type: List[AbstractSearchManager.RunResult]
         searchConfiguration = list(self.generate_configuration())
-        for config, paramValues in searchConfiguration:
+
+        # Load the runs finished earlier, keyed by the search point and the repetition index.
+        finishedRuns = self._load_run_results(resultsPath) if resultsPath is not None else {}
+
+        runTasks = []
+        runResults = []  # type: List[AbstractSearchManager.RunResult]
+        for searchPoint, config, pointId in searchConfiguration:
             # Perform several runs for each search point, if requested.
             for instanceIndex in range(repeatNumber):
+                runKey = (self._get_point_key(searchPoint), instanceIndex)
+                if runKey in finishedRuns:
+                    runResults.append(AbstractSearchManager.RunResult(finishedRuns[runKey], searchPoint, instanceIndex))
+                    continue
+
                 # Generate run names inside the loop, to generate current timestamps.
                 if nameGenerator is None:
                     runName = datetime.datetime.now().strftime('%y%m%d-%H%M%S_')
-                    runName += '_'.join(['{}-{}'.format(k, paramValues[k]) for k in sorted(paramValues.keys())])
+                    runName += '_'.join(['{}-{}'.format(k, searchPoint[k]) for k in sorted(searchPoint.keys())])
                 else:
-                    runName = nameGenerator(paramValues)
+                    runName = nameGenerator(searchPoint)
                 if repeatNumber > 1:
                     runName += '_instance-{}'.format(instanceIndex)
 
-                returnedValues = targetFunc(config, paramValues, runName)
-                runResults.append(AbstractSearchManager.RunResult(returnedValues, paramValues, instanceIndex))
+                runTasks.append(_SearchRunTask(targetFunc, config, searchPoint, runName, instanceIndex))
+
+        # Run the experiments.
+        if resultsPath is not None:
+            self._drop_partial_run_result(resultsPath)
+        resultsFile = open(resultsPath, 'a') if resultsPath is not None else None
+        pool = multiprocessing.Pool(workers) if workers > 1 else None
+        try:
+            runIterator = pool.imap_unordered(_execute_search_run, runTasks) if pool is not None \
+                else map(_execute_search_run, runTasks)
+            for task, returnedValues in runIterator:
+                runResults.append(AbstractSearchManager.RunResult(returnedValues, task.searchPoint, task.instance))
+                if resultsFile is not None:
+                    self._append_run_result(resultsFile, task, returnedValues)
+        finally:
+            if pool is not None:
+                pool.terminate()
+            if resultsFile is not None:
+                resultsFile.close()
+
+        # Index the results by search point, so that the aggregation is a single pass.
+        pointResults = {}  # type: Dict[str, List[AbstractSearchManager.RunResult]]
+        for runResult in runResults:
+            pointResults.setdefault(self._get_point_key(runResult.paramValues), []).append(runResult)
+        for results in pointResults.values():
+            results.sort(key=lambda r: r.instance)
+
+        # Keep the run results in the search order, whatever order they finished in.
+        runResults = [r for c in searchConfiguration for r in pointResults[self._get_point_key(c.searchPoint)]]
 
         # For convenience, generate two different result formats.
         resultsAvg = []  # type: List[Dict]
         resultsFull = []  # type: List[Dict]
 
-        allSearchPoints = [v[1] for v in searchConfiguration]
+        allSearchPoints = [c.searchPoint for c in searchConfiguration]
 
         # Aggregate the returned metrics, computing mean and std for each search point.
         for searchPoint in allSearchPoints:
             # Fetch all run results for a given search point.
-            allRunResults = [r for r in runResults if searchPoint == r.paramValues]
+            allRunResults = pointResults[self._get_point_key(searchPoint)]
             if len(allRunResults) == 1:
                 # If only a single execution is performed, there's nothing to aggregate.
                 assert repeatNumber == 1
@@ -117,6 +178,64 @@ class AbstractSearchManager(metaclass=ABCMeta):
 
         return runResults, resultsAvg, resultsFull
 
+    @staticmethod
+    def _get_point_key(searchPoint: Dict[str, Any]) -> str:
+        # Parameter values can be unhashable (e.g., lists), use their JSON representation instead.
+        return json.dumps(searchPoint, sort_keys=True, default=str)
+
+    @staticmethod
+    def _load_run_results(resultsPath: str) -> Dict[Tuple[str, int], Any]:
+        finishedRuns = {}
+        if not os.path.exists(resultsPath):
+            return finishedRuns
+
+        with open(resultsPath, 'r') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line could be cut short, if the search was killed while writing it.
+                    continue
+
+                returnedValue = record['returnedValue']
+                # The target function returns either a dict or a tuple, JSON turns the latter into a list.
+                if isinstance(returnedValue, list):
+                    returnedValue = tuple(returnedValue)
+                finishedRuns[(AbstractSearchManager._get_point_key(record['searchPoint']), record['instance'])] = \
+                    returnedValue
+
+        return finishedRuns
+
+    @staticmethod
+    def _drop_partial_run_result(resultsPath: str):
+        # A record cut short by a killed search would otherwise get the next record appended to the same line.
+        if not os.path.exists(resultsPath):
+            return
+
+        with open(resultsPath, 'rb+') as file:
+            content = file.read()
+            if len(content) > 0 and not content.endswith(b'\n'):
+                file.truncate(content.rfind(b'\n') + 1)
+
+    @staticmethod
+    def _append_run_result(file, task: '_SearchRunTask', returnedValue: Any):
+        def to_json_value(value):
+            # Support the numpy scalars and arrays, typically returned as metrics.
+            if hasattr(value, 'tolist'):
+                return value.tolist()
+            raise TypeError(f"Can't store a value of type '{type(value).__name__}' in the results file.")
+
+        record = {
+            'searchPoint': task.searchPoint,
+            'instance': task.instance,
+            'runName': task.runName,
+            'returnedValue': returnedValue
+        }
+        file.write(json.dumps(record, default=to_json_value) + '\n')
+        # Make sure the run survives the search getting killed.
+        file.flush()
+        os.fsync(file.fileno())
+
     @classmethod
     def _decode_python_types_recursive(cls, rawValue):
         """
@@ -329,3 +448,92 @@ class GridSearchManager(AbstractSearchManager):
 
     def get_axes_names_ordered(self):
         return self.axisOrder
+
+
+class SuccessiveHalvingSearchManager(AbstractSearchManager):
+    """
+    Adaptive search over the configurations of another search manager (e.g., a grid), using successive halving.
+    First, all the configurations are evaluated with a small resource (e.g., a few games, or a small budget).
+    Then only the best fraction is promoted to the next rung with more resource, until a single configuration
+    remains or the maximum resource is reached.
+
+    The resource is set in the config and the search point under its own name, so each rung is a separate point.
+    """
+
+    def __init__(self, baseManager: AbstractSearchManager, resourceName: str, minResource: int, maxResource: int,
+                 metricName: str, maximize: bool = True, reductionFactor: int = 3):
+        super().__init__()
+
+        if reductionFactor < 2:
+            raise ValueError("The reduction factor must be at least two.")
+        if minResource > maxResource:
+            raise ValueError("The minimum resource can't exceed the maximum.")
+
+        self.baseManager = baseManager
+        self.resourceName = resourceName
+        self.minResource = minResource
+        self.maxResource = maxResource
+        self.metricName = metricName
+        self.maximize = maximize
+        self.reductionFactor = reductionFactor
+
+        # The state of the current rung: which configurations are evaluated (all if None), and with what resource.
+        self._survivorIds = None  # type: Optional[set]
+        self._resource = minResource
+
+    def generate_configuration(self) -> Generator[SearchConfiguration, None, None]:
+        """
+        Generate the configurations of the current rung, i.e. the surviving configurations with the current resource.
+        Before and after a search, this is every configuration with the minimum resource.
+        """
+        for configuration in self.baseManager.generate_configuration():
+            if self._survivorIds is not None and configuration.id not in self._survivorIds:
+                continue
+
+            config = copy.deepcopy(configuration.config)
+            config[self.resourceName] = self._resource
+            searchPoint = {**configuration.searchPoint, self.resourceName: self._resource}
+
+            yield SearchConfiguration(searchPoint=searchPoint, config=config, id=configuration.id)
+
+    def get_rung_resources(self) -> List[int]:
+        resources = [self.minResource]
+        while resources[-1] < self.maxResource:
+            resources.append(min(resources[-1] * self.reductionFactor, self.maxResource))
+
+        return resources
+
+    def run_search(self, targetFunc: Callable[[Dict, Dict, str], Union[Dict, Tuple]],
+                   nameGenerator: Callable[[Dict], str] = None,
+                   repeatNumber: int = 1,
+                   workers: int = 1,
+                   resultsPath: Optional[str] = None):
+        """
+        Run the rungs one after another, see 'AbstractSearchManager.run_search' for the parameters.
+        The results of all the rungs are concatenated, the search points tell the rungs apart by the resource.
+        """
+        runResultsAll, resultsAvgAll, resultsFullAll = [], [], []
+        try:
+            for resource in self.get_rung_resources():
+                self._resource = resource
+                configIds = [c.id for c in self.generate_configuration()]
+
+                runResults, resultsAvg, resultsFull = super().run_search(targetFunc, nameGenerator, repeatNumber,
+                                                                         workers, resultsPath)
+                runResultsAll += runResults
+                resultsAvgAll += resultsAvg
+                resultsFullAll += resultsFull
+
+                if len(configIds) <= 1:
+                    break
+
+                # Promote the best configurations to the next rung. The sort is stable, so ties go to the earlier ones.
+                ranking = sorted(zip(configIds, resultsAvg), key=lambda p: p[1][self.metricName],
+                                 reverse=self.maximize)
+                survivorNumber = max(1, len(ranking) // self.reductionFactor)
+                self._survivorIds = {configId for configId, _ in ranking[:survivorNumber]}
+        finally:
+            self._survivorIds = None
+            self._resource = self.minResource
+
+        return runResultsAll, resultsAvgAll, resultsFullAll
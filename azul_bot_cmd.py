@@ -1,3 +1,4 @@
+import argparse
 import cmd
 from typing import *
 
@@ -9,7 +10,7 @@ class AzulCmd(cmd.Cmd):
 
     prompt = '> '
 
-    def __init__(self):
+    def __init__(self, maxNodes: int = 1000000):
         # Init with defaults.
         super().__init__()
 
@@ -23,15 +24,33 @@ class AzulCmd(cmd.Cmd):
         self.budget = 1000
         self.samplingWidth = 10
         self.explorationWeight = 20
+        # Keep searching in the background while the human is thinking.
+        self.ponder = True
+        # Pondering never stops on its own, the tree is pruned at this size to keep the memory bounded.
+        # (A node takes a bit over 200 bytes.)
+        self.maxNodes = maxNodes
+        self.bot = None  # type: Optional[MctsBot]
 
     def preloop(self) -> None:
         super().preloop()
 
         Azul.print_state(self.state)
 
+    def precmd(self, line: str) -> str:
+        # The bot can't be used while pondering.
+        if self.bot is not None:
+            self.bot.stop_pondering()
+
+        return super().precmd(line)
+
     def postcmd(self, stop: bool, line: str) -> bool:
         Azul.print_state(self.state)
 
+        # Ponder if it's the human's turn now.
+        if self.ponder and self.bot is not None and not self.azul.is_game_end(self.state) and \
+                self.state.nextPlayer != self.botPlayerIndex:
+            self.bot.start_pondering()
+
         return super().postcmd(stop, line)
 
     def do_move(self, arg: str):
@@ -47,8 +66,11 @@ class AzulCmd(cmd.Cmd):
         self._apply_move(move)
 
     def do_bot_move(self, arg: str):
-        bot = MctsBot(self.azul, self.state, samplingWidth=self.samplingWidth, explorationWeight=self.explorationWeight)
-        move = bot.step_n(self.budget)
+        # Reuse the tree that was built up while pondering, if there is one.
+        if self.bot is None:
+            self.bot = MctsBot(self.azul, self.state, samplingWidth=self.samplingWidth,
+                               explorationWeight=self.explorationWeight, maxNodes=self.maxNodes)
+        move = self.bot.step_n(self.budget)
 
         print(f"Bot's move: ")
         print(f"Take {Azul.color_to_str(move.color)} from bin {move.sourceBin} to queue {move.targetQueue}")
@@ -82,6 +104,14 @@ class AzulCmd(cmd.Cmd):
                     print(f"Scores: Bot = {self.state.players[self.botPlayerIndex].score}    "
                           f"Human = {self.state.players[humanIndex].score}")
 
+            # Keep the part of the search tree that's still relevant.
+            # (After a new deal, the bot will most likely have to start over.)
+            if self.bot is not None:
+                if not self.azul.is_game_end(self.state):
+                    self.bot.advance(move, self.state)
+                else:
+                    self.bot = None
+
         except ValueError as e:
             print(f"# {e}")
             print("Undoing the move.")
@@ -95,10 +125,17 @@ class AzulCmd(cmd.Cmd):
 
         print("# UNDO #")
         self.state = self.history.pop()
+        # The search tree doesn't cover the earlier states, start over.
+        self.bot = None
 
 
 def main():
-    azulCmd = AzulCmd()
+    parser = argparse.ArgumentParser(description="Play Azul against the MCTS bot.")
+    parser.add_argument('--max-nodes', type=int, default=1000000,
+                        help="The size of the search tree, it's pruned when reaching it. Zero for no limit.")
+    args = parser.parse_args()
+
+    azulCmd = AzulCmd(maxNodes=args.max_nodes)
 
     azulCmd.cmdloop()
 
@@ -1 +1,2 @@
 from .azul import *
+from .azul_batch import *
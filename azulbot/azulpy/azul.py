@@ -1,4 +1,3 @@
-import random
 from enum import IntEnum
 from typing import *
 
@@ -36,67 +35,162 @@ class Move(NamedTuple):
         return Move(int(s[0]), Azul.str_to_color(s[1]), int(s[2]))
 
 
-class ComparableNumpy():
-    """
-    An abstract class implementing the equality operator
-    with the support for numpy array fields.
-    """
-    def __eq__(self, o: object) -> bool:
-        if type(self) == type(o):
-            # Object's field could be changed dynamically, so we have to check the keys as well as values.
-            if tuple(self.__dict__.keys()) != tuple(o.__dict__.keys()):
-                return False
-            for v1, v2 in zip(self.__dict__.values(), o.__dict__.values()):
-                if isinstance(v1, np.ndarray):
-                    if not np.array_equal(v1, v2):
-                        return False
-                elif v1 != v2:
-                    return False
-
-            return True
-        else:
-            return NotImplemented
-
-
-class PlayerState(ComparableNumpy):
+# The whole game state is stored in a single flat uint8 vector, so that the jitted code can work on it directly:
+#   the bag (per color), the bins (per bin and color, the pool last), then per player: the wall, the queue
+#   (color and count per row), the floor count and the score (two bytes, little-endian),
+#   followed by the next player, the first player and the pool flag.
+# The Python classes are thin views over it.
+_BagOffset = 0
+_BinsOffset = _BagOffset + 6
+_PlayersOffset = _BinsOffset + 6 * 6
+_WallOffset = 0
+_QueueOffset = _WallOffset + 5 * 5
+_FloorOffset = _QueueOffset + 5 * 2
+_ScoreOffset = _FloorOffset + 1
+_PlayerSize = _ScoreOffset + 2
+_NextPlayerOffset = _PlayersOffset + 2 * _PlayerSize
+_FirstPlayerOffset = _NextPlayerOffset + 1
+_PoolWasTouchedOffset = _FirstPlayerOffset + 1
+_StateSize = _PoolWasTouchedOffset + 1
+
+# The jitted code can't read the class constants, duplicate them.
+_ColorNumber = 5
+_TileNumber = 20
+_PlayerNumber = 2
+_BinNumber = 5
+_BinSize = 4
+_WallSize = 5
+_FloorSize = 7
+_FloorScores = np.array([1, 1, 2, 2, 2, 3, 3], dtype=np.uint8)
+_ScorePerRow = 2
+_ScorePerColumn = 7
+_ScorePerColor = 10
+
+# The random generator of the jitted dealing and playouts of the single games, see 'Azul.seed'.
+# The batches bring their own, and pass it to the same kernels.
+_rng = np.random.default_rng()
+
+
+class PlayerState:
 
     def __init__(self, wall: Optional[np.ndarray] = None, queue: Optional[np.ndarray] = None,
                  floorCount: Optional[int] = None, score: Optional[int] = None):
+        self._set_data(np.zeros(_PlayerSize, dtype=np.uint8))
+
+        if wall is not None:
+            self.wall = wall
+        if queue is not None:
+            self.queue = queue
+        self.floorCount = _arg_def(floorCount, 0)
+        self.score = _arg_def(score, 0)
+
+    @staticmethod
+    def _from_data(data: np.ndarray) -> 'PlayerState':
+        # Wrap a part of the game state, without copying.
+        player = PlayerState.__new__(PlayerState)
+        player._set_data(data)
+
+        return player
+
+    def _set_data(self, data: np.ndarray):
+        self._data = data
         # A 2D array that stores the color value at each position.
         # (Somewhat redundant, but support playing with the 'free board' variant.)
-        self.wall = _arg_def(wall, np.zeros(Azul.WallShape, dtype=np.uint8))
+        self._wall = data[_WallOffset:_QueueOffset].reshape(Azul.WallShape)
         # Stores color and count per row.
-        self.queue = _arg_def(queue, np.zeros((Azul.WallShape[0], 2), dtype=np.uint8))
+        self._queue = data[_QueueOffset:_FloorOffset].reshape((Azul.WallShape[0], 2))
+
+    @property
+    def wall(self) -> np.ndarray:
+        return self._wall
+
+    @wall.setter
+    def wall(self, value: np.ndarray):
+        self._wall[...] = value
+
+    @property
+    def queue(self) -> np.ndarray:
+        return self._queue
+
+    @queue.setter
+    def queue(self, value: np.ndarray):
+        self._queue[...] = value
+
+    @property
+    def floorCount(self) -> int:
         # The number of tiles lying on the floor. (The color is irrelevant.)
-        self.floorCount = _arg_def(floorCount, 0)
+        return int(self._data[_FloorOffset])
 
-        self.score = _arg_def(score, 0)
+    @floorCount.setter
+    def floorCount(self, value: int):
+        self._data[_FloorOffset] = value
+
+    @property
+    def score(self) -> int:
+        return int(self._data[_ScoreOffset]) | int(self._data[_ScoreOffset + 1]) << 8
+
+    @score.setter
+    def score(self, value: int):
+        self._data[_ScoreOffset] = value & 0xFF
+        self._data[_ScoreOffset + 1] = value >> 8
+
+    def __eq__(self, o: object) -> bool:
+        if type(self) != type(o):
+            return NotImplemented
+
+        return np.array_equal(self._data, o._data)
 
     def __hash__(self) -> int:
-        return hash(tuple(map(hash, (self.wall.tobytes(), self.queue.tobytes(), self.floorCount, self.score))))
+        return hash(self._data.tobytes())
 
     def copy(self) -> 'PlayerState':
-        return PlayerState(self.wall.copy(), self.queue.copy(), self.floorCount, self.score)
+        return PlayerState._from_data(self._data.copy())
+
+    def __copy__(self) -> 'PlayerState':
+        return self.copy()
+
+    def __deepcopy__(self, memo: Dict) -> 'PlayerState':
+        return self.copy()
+
+    def __getstate__(self) -> bytes:
+        return self._data.tobytes()
+
+    def __setstate__(self, state: bytes):
+        self._set_data(np.frombuffer(state, dtype=np.uint8).copy())
+
+
+class _PlayerList(list):
+    # The player states of a game, viewing its buffer. Assigning a player copies it into the buffer,
+    # so the assigned object stays independent of the game.
+
+    def __setitem__(self, index, value):
+        targets = super().__getitem__(index) if isinstance(index, slice) else [super().__getitem__(index)]
+        players = list(value) if isinstance(index, slice) else [value]
+        if len(players) != len(targets):
+            raise ValueError("Can't change the number of players.")
+
+        for target, player in zip(targets, players):
+            target._data[...] = player._data
 
 
 class IllegalMoveException(Exception):
     pass
 
 
-class Azul(ComparableNumpy):
+class Azul:
 
-    ColorNumber = 5
-    TileNumber = 20
-    PlayerNumber = 2
-    BinNumber = 5
-    BinSize = 4
-    WallShape = (5, 5)
-    FloorSize = 7
-    FloorScores = np.array([1, 1, 2, 2, 2, 3, 3], dtype=np.uint8)
+    ColorNumber = _ColorNumber
+    TileNumber = _TileNumber
+    PlayerNumber = _PlayerNumber
+    BinNumber = _BinNumber
+    BinSize = _BinSize
+    WallShape = (_WallSize, _WallSize)
+    FloorSize = _FloorSize
+    FloorScores = _FloorScores
 
-    ScorePerRow = 2
-    ScorePerColumn = 7
-    ScorePerColor = 10
+    ScorePerRow = _ScorePerRow
+    ScorePerColumn = _ScorePerColumn
+    ScorePerColor = _ScorePerColor
 
     ColorToChar = {
         Color.Empty: '_',
@@ -116,71 +210,147 @@ class Azul(ComparableNumpy):
                  firstPlayer: Optional[int] = None,
                  poolWasTouched: Optional[bool] = None):
 
+        self._set_buffer(np.zeros(_StateSize, dtype=np.uint8))
+
+        self.bag = _arg_def(bag, np.concatenate(([0], np.repeat(Azul.TileNumber, Azul.ColorNumber))))
+        if bins is not None:
+            self.bins = bins
+        if playerStates is not None:
+            self.players = playerStates
+
+        self.nextPlayer = _arg_def(nextPlayer, 0)
+        self.firstPlayer = _arg_def(firstPlayer, 0)
+        self.poolWasTouched = _arg_def(poolWasTouched, False)
+
+    @staticmethod
+    def _from_buffer(buffer: np.ndarray) -> 'Azul':
+        # Wrap a state vector, without copying.
+        azul = Azul.__new__(Azul)
+        azul._set_buffer(buffer)
+
+        return azul
+
+    def _set_buffer(self, buffer: np.ndarray):
+        self._buffer = buffer
+        # The views are only built when accessed, most copies made during search never need them.
+        self._bag = None  # type: Optional[np.ndarray]
+        self._bins = None  # type: Optional[np.ndarray]
+        self._players = None  # type: Optional[List[PlayerState]]
+
+    @property
+    def bag(self) -> np.ndarray:
         # A 1D array that stores how many tiles of each color are left in the bag (indexed by the Color enum).
         # The 'empty' color is always at zero.
-        self.bag = _arg_def(bag, np.concatenate(([0], np.repeat(Azul.TileNumber, Azul.ColorNumber))))
+        if self._bag is None:
+            self._bag = self._buffer[_BagOffset:_BinsOffset]
+        return self._bag
+
+    @bag.setter
+    def bag(self, value: np.ndarray):
+        self.bag[...] = value
+
+    @property
+    def bins(self) -> np.ndarray:
         # Bins store the count per color, similarly to the bag.
         # The last bin is the 'pool'.
-        self.bins = _arg_def(bins, np.zeros((Azul.BinNumber + 1, Azul.ColorNumber + 1), dtype=np.uint8))
+        if self._bins is None:
+            self._bins = self._buffer[_BinsOffset:_PlayersOffset].reshape((Azul.BinNumber + 1, Azul.ColorNumber + 1))
+        return self._bins
+
+    @bins.setter
+    def bins(self, value: np.ndarray):
+        self.bins[...] = value
+
+    @property
+    def players(self) -> List[PlayerState]:
+        if self._players is None:
+            self._players = _PlayerList(PlayerState._from_data(self._buffer[o:o + _PlayerSize])
+                                        for o in range(_PlayersOffset, _NextPlayerOffset, _PlayerSize))
+        return self._players
+
+    @players.setter
+    def players(self, value: List[PlayerState]):
+        for player, newPlayer in zip(self.players, value):
+            player._data[...] = newPlayer._data
+
+    @property
+    def nextPlayer(self) -> int:
+        # The index of the player, whose turn it is to make a move.
+        return int(self._buffer[_NextPlayerOffset])
 
-        self.players = _arg_def(playerStates, [PlayerState() for _ in range(Azul.PlayerNumber)])
+    @nextPlayer.setter
+    def nextPlayer(self, value: int):
+        self._buffer[_NextPlayerOffset] = value
 
-        # The index of the player, whose turn it is to make a move.
-        self.nextPlayer = _arg_def(nextPlayer, 0)
+    @property
+    def firstPlayer(self) -> int:
         # The index of the player that will go first in the next round.
-        self.firstPlayer = _arg_def(firstPlayer, 0)
+        return int(self._buffer[_FirstPlayerOffset])
+
+    @firstPlayer.setter
+    def firstPlayer(self, value: int):
+        self._buffer[_FirstPlayerOffset] = value
+
+    @property
+    def poolWasTouched(self) -> bool:
         # Whether someone has already taken tiles from the center (the pool) this round.
-        self.poolWasTouched = _arg_def(poolWasTouched, False)
+        return bool(self._buffer[_PoolWasTouchedOffset])
+
+    @poolWasTouched.setter
+    def poolWasTouched(self, value: bool):
+        self._buffer[_PoolWasTouchedOffset] = value
+
+    def __eq__(self, o: object) -> bool:
+        if type(self) != type(o):
+            return NotImplemented
+
+        return np.array_equal(self._buffer, o._buffer)
 
     def __hash__(self) -> int:
-        return hash(tuple(map(hash, (self.bag.tobytes(), self.bins.tobytes(),
-                                     tuple(map(hash, self.players)),
-                                     self.nextPlayer, self.firstPlayer, self.poolWasTouched))))
+        # Not cached, since the state can be changed through the views at any time. The buffer is small anyway.
+        return hash(self._buffer.tobytes())
 
     def copy(self) -> 'Azul':
-        return Azul(self.bag.copy(), self.bins.copy(), [p.copy() for p in self.players],
-                    self.nextPlayer, self.firstPlayer, self.poolWasTouched)
+        return Azul._from_buffer(self._buffer.copy())
 
-    def is_game_end(self) -> bool:
-        for player in self.players:
-            if np.any(np.count_nonzero(player.wall, axis=1) == Azul.WallShape[1]):
-                return True
+    def __copy__(self) -> 'Azul':
+        return self.copy()
 
-        return False
+    def __deepcopy__(self, memo: Dict) -> 'Azul':
+        # The default deepcopy would copy each view separately, detaching them from the buffer.
+        return self.copy()
+
+    def __getstate__(self) -> bytes:
+        return self._buffer.tobytes()
+
+    def __setstate__(self, state: bytes):
+        self._set_buffer(np.frombuffer(state, dtype=np.uint8).copy())
+
+    def to_numpy(self) -> np.ndarray:
+        """
+        Return a copy of the packed state. The layout is shared with the C++ engine, see 'AzulState.from_numpy'.
+        """
+        return self._buffer.copy()
+
+    @staticmethod
+    def from_numpy(data: np.ndarray) -> 'Azul':
+        data = np.asarray(data, dtype=np.uint8)
+        if data.shape != (_StateSize,):
+            raise ValueError(f"Expected a packed state of size {_StateSize}, got shape {data.shape}.")
+
+        return Azul._from_buffer(data.copy())
+
+    def is_game_end(self) -> bool:
+        return _is_game_end(self._buffer)
 
     def is_round_end(self) -> bool:
-        return np.all(self.bins == 0)
+        return _is_round_end(self._buffer)
 
     def enumerate_moves(self):
         """
         Enumerate all legal moves in the current state.
         """
-        player = self.players[self.nextPlayer]
-        return Azul._enumerate_moves_fast(self.bins, player.queue, player.wall, Azul.WallShape[0])
-
-    @staticmethod
-    @jit(nopython=True)
-    def _enumerate_moves_fast(bins: np.ndarray, queue: np.ndarray, wall: np.ndarray,
-                              floorIndex: int = 5):
-        moves = []
-        for iSource, source in enumerate(bins):
-            for color, count in enumerate(source):
-                if count == 0 or color == Color.Empty:
-                    continue
-
-                for iTarget, (targetQueue, targetRow) in enumerate(zip(queue, wall)):
-                    # If the color isn't already on the wall in that row,
-                    # and the queue has space (its size is index+1),
-                    # and the queue is completely empty (first element empty) or contains the same color.
-                    if np.all(targetRow != color) and \
-                            targetQueue[1] < iTarget + 1 and \
-                            (targetQueue[0] == Color.Empty or targetQueue[0] == color):
-                        moves.append(Move(iSource, color, iTarget))
-
-                # It's always valid to put the tiles on the floor.
-                moves.append(Move(iSource, color, floorIndex))
-
-        return moves
+        return [Move(int(m[0]), int(m[1]), int(m[2])) for m in _enumerate_moves(self._buffer)]
 
     def apply_move(self, move: Move) -> MoveOutcome['Azul']:
         newState = self.copy()
@@ -189,49 +359,15 @@ class Azul(ComparableNumpy):
         return MoveOutcome(newState, isRandom=newState.is_round_end(), isEnd=newState.is_game_end())
 
     def _apply_move_inplace(self, move: Move):
-        player = self.players[self.nextPlayer]
-        count = self.bins[move.sourceBin, move.color]
-
-        if count == 0:
+        if not _apply_move(self._buffer, move.sourceBin, move.color, move.targetQueue):
             raise IllegalMoveException(f"Not allowed to take zero tiles. Move: {move}")
 
-        # Update who goes first next round (changes when the pool is touched for the first time).
-        if move.sourceBin == Azul.BinNumber:
-            becomeFirstPlayer = not self.poolWasTouched
-            self.poolWasTouched = True
-            if becomeFirstPlayer:
-                player.floorCount += 1
-                self.firstPlayer = self.nextPlayer
-
-        # Pass the turn to the next player.
-        self.nextPlayer = (self.nextPlayer + 1) % Azul.PlayerNumber
-
-        # Take away the tiles of the moved color.
-        self.bins[move.sourceBin, move.color] = 0
-
-        # If the move is to take tiles from a bin, then move the rest into the pool.
-        if move.sourceBin < Azul.BinNumber:
-            self.bins[Azul.BinNumber] += self.bins[move.sourceBin]
-            self.bins[move.sourceBin] = 0
-
-        if move.targetQueue < Azul.WallShape[0]:
-            # Place the tiles into the queue.
-            queueSize = move.targetQueue + 1
-            queueCount = player.queue[move.targetQueue][1]
-            newCount = queueCount + count
-            # Put the tiles into the queue, move the leftovers onto the floor.
-            player.queue[move.targetQueue] = (move.color, min(newCount, queueSize))
-            player.floorCount += max(newCount - queueSize, 0)
-        else:
-            # Place tiles onto the floor.
-            player.floorCount += count
-
     def playout(self, players: Optional[List[Callable[['Azul'], Move]]] = None, maxRoundTimeout: int = 100):
         if players is None:
-            def random_bot(az: Azul):
-                return random.choice(tuple(az.enumerate_moves()))
-
-            players = [random_bot] * Azul.PlayerNumber
+            # Random playouts run completely in the jitted code.
+            if not _playout(self._buffer, maxRoundTimeout, _rng):
+                raise RuntimeError(f"Timed out after {maxRoundTimeout} rounds.")
+            return
 
         roundCount = 0
         while not self.is_game_end():
@@ -255,10 +391,10 @@ class Azul(ComparableNumpy):
         if not self.is_game_end():
             return 0
 
-        assert len(self.players) == 2
+        assert Azul.PlayerNumber == 2
 
-        # 1 if won, 0 otherwise.
-        return int(self.players[playerIndex].score > self.players[(playerIndex + 1) % 2].score)
+        # 1 if won, 0 otherwise. (Read the scores directly, without building the player views.)
+        return int(_get_score(self._buffer, playerIndex) > _get_score(self._buffer, (playerIndex + 1) % 2))
 
     def score_round(self):
         """
@@ -267,87 +403,42 @@ class Azul(ComparableNumpy):
         if not self.is_round_end():
             raise RuntimeError("Not allowed to score the round before it has ended.")
 
-        for player in self.players:
-            for iRow, q in enumerate(player.queue):
-                color, count = q[0], q[1]
-                if count == iRow + 1:
-                    iCol = Azul.get_wall_column_by_color(iRow, color)
-                    player.wall[iRow, iCol] = color
-                    player.queue[iRow] = (Color.Empty, 0)
-                    player.score += Azul.get_tile_score(player.wall, iRow, iCol)
-
-            # Score the floor tiles.
-            for i in range(min(player.floorCount, Azul.FloorSize)):
-                player.score = max(0, player.score - Azul.FloorScores[i])
-
-            player.floorCount = 0
+        _score_round(self._buffer)
 
     def deal_round(self, fixedSample: Optional[List[Color]] = None):
+        """
+        Refill the bag if needed, and distribute a random sample of its tiles among the bins.
+        Note that the jitted code has its own random generator, see 'seed'.
+        """
         if not self.is_round_end():
             raise RuntimeError("Not allowed to deal a new round before the old has ended.")
 
-        # Refill the bag using the discarded tiles, if necessary.
-        sampleSize = Azul.BinNumber * Azul.BinSize
-        bagCount = sum(self.bag)
-        if bagCount < sampleSize:
-            self._refill_bag()
-
-        # Randomly sample the bag to get the tiles for this round.
         if fixedSample is None:
-            # sample = random.sample(Color, counts=self.bag, k=sampleSize)  # Sadly, only works in Python 3.9
-            population = np.repeat(Color, repeats=self.bag)
-            sample = np.random.choice(population, size=sampleSize, replace=False)
+            sample = np.zeros(0, dtype=np.uint8)
         else:
             # Allow the sampled tiles to be specified deterministically for testing.
-            assert len(fixedSample) == sampleSize
-            sample = fixedSample
-
-        # Distribute the sampled tiles among the bins.
-        self.bins[...] = Color.Empty
-        for iBin, iSample in enumerate(range(0, sampleSize, Azul.BinSize)):
-            binSubsample = sample[iSample: iSample + Azul.BinSize]
-            for color, count in zip(*np.unique(binSubsample, return_counts=True)):
-                self.bins[iBin, color] = count
+            assert len(fixedSample) == Azul.BinNumber * Azul.BinSize
+            sample = np.array(fixedSample, dtype=np.uint8)
 
-        # Keep track of which tiles are left in the bag.
-        for color in sample:
-            self.bag[color] -= 1
+        _deal_round(self._buffer, sample, _rng)
 
-        assert np.all(self.bag >= 0)
-
-        # Prepare the first player flags.
-        self.poolWasTouched = False
-        self.nextPlayer = self.firstPlayer
+    @staticmethod
+    def seed(seed: int):
+        """
+        Seed the random generator used by the jitted code, i.e. dealing and random playouts.
+        It's shared by all the single games, but not by the batches.
+        """
+        global _rng
+        _rng = np.random.default_rng(seed)
 
     def score_game(self):
         if not self.is_game_end():
             raise RuntimeError("Cannot score the game before the end of the game.")
 
-        for player in self.players:
-            # Score full rows.
-            player.score += np.sum(np.count_nonzero(player.wall, axis=1) == Azul.WallShape[1]) * Azul.ScorePerRow
-            # Score full columns.
-            player.score += np.sum(np.count_nonzero(player.wall, axis=0) == Azul.WallShape[0]) * Azul.ScorePerColumn
-            # Score complete colors.
-            player.score += np.sum(1 for color, count in zip(*np.unique(player.wall, return_counts=True))
-                                   if color != Color.Empty and count == Azul.WallShape[0]) * Azul.ScorePerColor
+        _score_game(self._buffer)
 
     def _refill_bag(self):
-        # First, count all the tiles that lie on the board, they won't be redrawn.
-        missingTiles = np.zeros(Azul.ColorNumber + 1)
-        for player in self.players:
-            for color, count in player.queue:
-                missingTiles[color] += count
-
-            for color, count in zip(*np.unique(player.wall, return_counts=True)):
-                missingTiles[color] += count
-
-        # The rest are the discarded tiles that return back into the bag.
-        for color in Color:
-            if color != Color.Empty:
-                self.bag[color] = Azul.TileNumber - missingTiles[color]
-
-        assert self.bag[Color.Empty] == 0
+        _refill_bag(self._buffer)
 
     def print_state(self):
         print('#' * 20)
@@ -411,31 +502,7 @@ class Azul(ComparableNumpy):
         """
         Compute the score awarded for placing a tile onto the wall.
         """
-        # Compute how many consecutive neighbors lie in each direction.
-        directions = [(1, 0), (-1, 0), (0, 1), (0, -1)]
-        neighbors = [0] * 4
-        for i, d in enumerate(directions):
-            pos = (iRow, iCol)
-            while True:
-                nextPos = pos[0] + d[0], pos[1] + d[1]
-                if nextPos[0] < 0 or nextPos[0] >= Azul.WallShape[0] or \
-                        nextPos[1] < 0 or nextPos[1] >= Azul.WallShape[0] or \
-                        wall[nextPos] == Color.Empty:
-                    break
-
-                neighbors[i] += 1
-                pos = nextPos
-
-        # Compute the total score based on the neighbor information.
-        # todo Is there a cleaner way?
-        scoreRow = neighbors[0] + neighbors[1] + 1
-        scoreCol = neighbors[2] + neighbors[3] + 1
-        scoreRow = scoreRow if scoreRow > 1 else 0
-        scoreCol = scoreCol if scoreCol > 1 else 0
-
-        score = scoreRow + scoreCol
-
-        return score if score > 0 else 1
+        return _get_tile_score(np.asarray(wall, dtype=np.uint8), iRow, iCol)
 
     @staticmethod
     def get_wall_column_by_color(iRow: int, color: Union[Color, int]) -> int:
@@ -447,3 +514,317 @@ class Azul(ComparableNumpy):
         return Color((iCol - iRow) % Azul.ColorNumber + 1)
 
 
+
+
+# The jitted kernels below operate on the flat state vector directly, see the layout at the top of the module.
+
+@jit(nopython=True, cache=True)
+def _player_offset(playerIndex: int) -> int:
+    return _PlayersOffset + playerIndex * _PlayerSize
+
+
+@jit(nopython=True, cache=True)
+def _get_score(state: np.ndarray, playerIndex: int) -> int:
+    offset = _player_offset(playerIndex) + _ScoreOffset
+    return np.int64(state[offset]) | (np.int64(state[offset + 1]) << 8)
+
+
+@jit(nopython=True, cache=True)
+def _set_score(state: np.ndarray, playerIndex: int, score: int):
+    offset = _player_offset(playerIndex) + _ScoreOffset
+    state[offset] = np.uint8(score & 0xFF)
+    state[offset + 1] = np.uint8(score >> 8)
+
+
+@jit(nopython=True, cache=True)
+def _get_wall(state: np.ndarray, playerIndex: int) -> np.ndarray:
+    offset = _player_offset(playerIndex) + _WallOffset
+    return state[offset:offset + _WallSize * _WallSize].reshape((_WallSize, _WallSize))
+
+
+@jit(nopython=True, cache=True)
+def _get_queue(state: np.ndarray, playerIndex: int) -> np.ndarray:
+    offset = _player_offset(playerIndex) + _QueueOffset
+    return state[offset:offset + _WallSize * 2].reshape((_WallSize, 2))
+
+
+@jit(nopython=True, cache=True)
+def _get_bins(state: np.ndarray) -> np.ndarray:
+    return state[_BinsOffset:_PlayersOffset].reshape((_BinNumber + 1, _ColorNumber + 1))
+
+
+@jit(nopython=True, cache=True)
+def _is_game_end(state: np.ndarray) -> bool:
+    for iPlayer in range(_PlayerNumber):
+        wall = _get_wall(state, iPlayer)
+        for iRow in range(_WallSize):
+            if np.count_nonzero(wall[iRow]) == _WallSize:
+                return True
+
+    return False
+
+
+@jit(nopython=True, cache=True)
+def _is_round_end(state: np.ndarray) -> bool:
+    return not np.any(state[_BinsOffset:_PlayersOffset])
+
+
+@jit(nopython=True, cache=True)
+def _enumerate_moves(state: np.ndarray) -> np.ndarray:
+    bins = _get_bins(state)
+    player = state[_NextPlayerOffset]
+    queue = _get_queue(state, player)
+    wall = _get_wall(state, player)
+
+    # There are at most (bins * colors) sources and (rows + floor) targets.
+    moves = np.empty(((_BinNumber + 1) * _ColorNumber * (_WallSize + 1), 3), dtype=np.int64)
+    moveCount = 0
+    for iSource in range(_BinNumber + 1):
+        for color in range(1, _ColorNumber + 1):
+            if bins[iSource, color] == 0:
+                continue
+
+            for iTarget in range(_WallSize):
+                # If the color isn't already on the wall in that row,
+                # and the queue has space (its size is index+1),
+                # and the queue is completely empty (first element empty) or contains the same color.
+                if np.all(wall[iTarget] != color) and \
+                        queue[iTarget, 1] < iTarget + 1 and \
+                        (queue[iTarget, 0] == Color.Empty or queue[iTarget, 0] == color):
+                    moves[moveCount] = (iSource, color, iTarget)
+                    moveCount += 1
+
+            # It's always valid to put the tiles on the floor.
+            moves[moveCount] = (iSource, color, _WallSize)
+            moveCount += 1
+
+    return moves[:moveCount]
+
+
+@jit(nopython=True, cache=True)
+def _apply_move(state: np.ndarray, sourceBin: int, color: int, targetQueue: int) -> bool:
+    bins = _get_bins(state)
+    player = state[_NextPlayerOffset]
+    queue = _get_queue(state, player)
+    floorOffset = _player_offset(player) + _FloorOffset
+    count = bins[sourceBin, color]
+
+    # Taking zero tiles is illegal, leave the state untouched.
+    if count == 0:
+        return False
+
+    # Update who goes first next round (changes when the pool is touched for the first time).
+    if sourceBin == _BinNumber:
+        if not state[_PoolWasTouchedOffset]:
+            state[_PoolWasTouchedOffset] = True
+            state[floorOffset] += 1
+            state[_FirstPlayerOffset] = player
+
+    # Pass the turn to the next player.
+    state[_NextPlayerOffset] = (player + 1) % _PlayerNumber
+
+    # Take away the tiles of the moved color.
+    bins[sourceBin, color] = 0
+
+    # If the move is to take tiles from a bin, then move the rest into the pool.
+    if sourceBin < _BinNumber:
+        bins[_BinNumber] += bins[sourceBin]
+        bins[sourceBin] = 0
+
+    if targetQueue < _WallSize:
+        # Put the tiles into the queue, move the leftovers onto the floor.
+        queueSize = targetQueue + 1
+        newCount = np.int64(queue[targetQueue, 1]) + np.int64(count)
+        queue[targetQueue, 0] = color
+        queue[targetQueue, 1] = min(newCount, queueSize)
+        state[floorOffset] += max(newCount - queueSize, 0)
+    else:
+        # Place tiles onto the floor.
+        state[floorOffset] += count
+
+    return True
+
+
+@jit(nopython=True, cache=True)
+def _get_tile_score(wall: np.ndarray, iRow: int, iCol: int) -> int:
+    # Count the consecutive neighbors in the row and in the column.
+    scoreRow = 1
+    i = iCol - 1
+    while i >= 0 and wall[iRow, i] != Color.Empty:
+        scoreRow += 1
+        i -= 1
+    i = iCol + 1
+    while i < _WallSize and wall[iRow, i] != Color.Empty:
+        scoreRow += 1
+        i += 1
+
+    scoreCol = 1
+    i = iRow - 1
+    while i >= 0 and wall[i, iCol] != Color.Empty:
+        scoreCol += 1
+        i -= 1
+    i = iRow + 1
+    while i < _WallSize and wall[i, iCol] != Color.Empty:
+        scoreCol += 1
+        i += 1
+
+    # A lone tile scores one point, otherwise each line of neighbors is scored separately.
+    scoreRow = scoreRow if scoreRow > 1 else 0
+    scoreCol = scoreCol if scoreCol > 1 else 0
+    score = scoreRow + scoreCol
+
+    return score if score > 0 else 1
+
+
+@jit(nopython=True, cache=True)
+def _score_round(state: np.ndarray):
+    for iPlayer in range(_PlayerNumber):
+        wall = _get_wall(state, iPlayer)
+        queue = _get_queue(state, iPlayer)
+        floorOffset = _player_offset(iPlayer) + _FloorOffset
+        score = _get_score(state, iPlayer)
+
+        for iRow in range(_WallSize):
+            color, count = queue[iRow, 0], queue[iRow, 1]
+            if count == iRow + 1:
+                iCol = (color - 1 + iRow) % _ColorNumber
+                wall[iRow, iCol] = color
+                queue[iRow, 0] = Color.Empty
+                queue[iRow, 1] = 0
+                score += _get_tile_score(wall, iRow, iCol)
+
+        # Score the floor tiles.
+        for i in range(min(state[floorOffset], _FloorSize)):
+            score = max(0, score - np.int64(_FloorScores[i]))
+
+        state[floorOffset] = 0
+        _set_score(state, iPlayer, score)
+
+
+@jit(nopython=True, cache=True)
+def _score_game(state: np.ndarray):
+    for iPlayer in range(_PlayerNumber):
+        wall = _get_wall(state, iPlayer)
+        score = _get_score(state, iPlayer)
+
+        for i in range(_WallSize):
+            # Score full rows.
+            if np.count_nonzero(wall[i]) == _WallSize:
+                score += _ScorePerRow
+            # Score full columns.
+            if np.count_nonzero(wall[:, i]) == _WallSize:
+                score += _ScorePerColumn
+        # Score complete colors.
+        for color in range(1, _ColorNumber + 1):
+            if np.sum(wall == color) == _WallSize:
+                score += _ScorePerColor
+
+        _set_score(state, iPlayer, score)
+
+
+@jit(nopython=True, cache=True)
+def _refill_bag(state: np.ndarray):
+    # All the tiles that lie on the board won't be redrawn,
+    # the rest are the discarded tiles that return back into the bag.
+    bag = state[_BagOffset:_BinsOffset]
+    bag[1:] = _TileNumber
+    for iPlayer in range(_PlayerNumber):
+        wall = _get_wall(state, iPlayer)
+        queue = _get_queue(state, iPlayer)
+        for iRow in range(_WallSize):
+            if queue[iRow, 0] != Color.Empty:
+                bag[queue[iRow, 0]] -= queue[iRow, 1]
+            for iCol in range(_WallSize):
+                if wall[iRow, iCol] != Color.Empty:
+                    bag[wall[iRow, iCol]] -= 1
+
+
+@jit(nopython=True, cache=True)
+def _random_index(rng: np.random.Generator, n: int) -> int:
+    # Several times faster than 'rng.integers' in the jitted code, and the bias is negligible for small numbers.
+    return int(rng.random() * n)
+
+
+@jit(nopython=True, cache=True)
+def _draw_tile(bag: np.ndarray, rng: np.random.Generator) -> int:
+    # Draw one tile without replacement, directly from the per-color counts.
+    sample = _random_index(rng, np.sum(bag))
+    for color in range(1, _ColorNumber + 1):
+        if sample < bag[color]:
+            bag[color] -= 1
+            return color
+        sample -= bag[color]
+
+    return Color.Empty
+
+
+@jit(nopython=True, cache=True)
+def _deal_round(state: np.ndarray, fixedSample: np.ndarray, rng: np.random.Generator):
+    bag = state[_BagOffset:_BinsOffset]
+    bins = _get_bins(state)
+
+    # Refill the bag using the discarded tiles, if necessary.
+    sampleSize = _BinNumber * _BinSize
+    if np.sum(bag) < sampleSize:
+        _refill_bag(state)
+
+    # Distribute the sampled tiles among the bins, keep track of which tiles are left in the bag.
+    bins[...] = 0
+    if len(fixedSample) > 0:
+        # The sample is fixed for testing.
+        for i in range(len(fixedSample)):
+            color = fixedSample[i]
+            if bag[color] == 0:
+                raise ValueError("Not enough tiles in the bag.")
+            bins[i // _BinSize, color] += 1
+            bag[color] -= 1
+    else:
+        for i in range(min(sampleSize, np.sum(bag))):
+            bins[i // _BinSize, _draw_tile(bag, rng)] += 1
+
+    # Prepare the first player flags.
+    state[_PoolWasTouchedOffset] = False
+    state[_NextPlayerOffset] = state[_FirstPlayerOffset]
+
+
+@jit(nopython=True, cache=True)
+def _deal_rounds(states: np.ndarray, games: np.ndarray, rng: np.random.Generator):
+    # Deal a round in many games at once, the states are stacked as rows.
+    noSample = np.zeros(0, dtype=np.uint8)
+    for i in games:
+        _deal_round(states[i], noSample, rng)
+
+
+@jit(nopython=True, cache=True)
+def _playout(state: np.ndarray, maxRoundTimeout: int, rng: np.random.Generator) -> bool:
+    noSample = np.zeros(0, dtype=np.uint8)
+    roundCount = 0
+    while not _is_game_end(state):
+        # We might get a game in the middle of a round, so we have to check.
+        if _is_round_end(state):
+            _deal_round(state, noSample, rng)
+
+        while not _is_round_end(state):
+            moves = _enumerate_moves(state)
+            move = moves[_random_index(rng, len(moves))]
+            _apply_move(state, move[0], move[1], move[2])
+
+        _score_round(state)
+        roundCount += 1
+
+        if roundCount > maxRoundTimeout:
+            return False
+
+    _score_game(state)
+
+    return True
+
+
+@jit(nopython=True, cache=True)
+def _playouts(states: np.ndarray, games: np.ndarray, maxRoundTimeout: int, rng: np.random.Generator) -> bool:
+    # Play out many games at once, the states are stacked as rows. Fails if any of them times out.
+    for i in games:
+        if not _playout(states[i], maxRoundTimeout, rng):
+            return False
+
+    return True
@@ -0,0 +1,265 @@
+from typing import *
+
+import numpy as np
+
+from .azul import Azul, Color, _BagOffset, _BinsOffset, _PlayersOffset, _PlayerSize, _WallOffset, _QueueOffset, \
+    _FloorOffset, _ScoreOffset, _NextPlayerOffset, _FirstPlayerOffset, _PoolWasTouchedOffset, _StateSize, _deal_rounds, \
+    _playouts
+
+
+class AzulBatch:
+    """
+    Many games stored as stacked arrays, which are advanced by random moves all at once.
+    Each row of the buffer has the same layout as the state of a single 'Azul' game,
+    and the fields are exposed as views with an extra leading 'game' dimension.
+
+    'step' moves all the games with vectorized NumPy code, which is handy to inspect the games move by move.
+    For bulk rollouts, 'playout' runs the jitted single-game kernels over the rows, which is much faster.
+    The batch draws all its random numbers from its own generator, the single games are not affected.
+    """
+
+    def __init__(self, gameNumber: int = 1, rng: Optional[np.random.Generator] = None):
+        buffer = np.zeros((gameNumber, _StateSize), dtype=np.uint8)
+        buffer[:] = Azul()._buffer
+
+        self.rng = rng or np.random.default_rng()
+        self._set_buffer(buffer)
+
+    @staticmethod
+    def from_states(states: Sequence[Azul], rng: Optional[np.random.Generator] = None) -> 'AzulBatch':
+        batch = AzulBatch(0, rng)
+        batch._set_buffer(np.stack([s._buffer for s in states]))
+
+        return batch
+
+    @staticmethod
+    def from_numpy(data: np.ndarray, rng: Optional[np.random.Generator] = None) -> 'AzulBatch':
+        """
+        Wrap packed states stacked as rows, e.g. from 'AzulState.to_numpy_batch'. The data is copied.
+        """
+        data = np.asarray(data, dtype=np.uint8)
+        if data.ndim != 2 or data.shape[1] != _StateSize:
+            raise ValueError(f"Expected packed states of shape (N, {_StateSize}), got shape {data.shape}.")
+
+        batch = AzulBatch(0, rng)
+        batch._set_buffer(data.copy())
+
+        return batch
+
+    def to_numpy(self) -> np.ndarray:
+        return self._buffer.copy()
+
+    def _set_buffer(self, buffer: np.ndarray):
+        self._buffer = buffer
+        n = len(buffer)
+        self.bags = buffer[:, _BagOffset:_BinsOffset]
+        self.bins = buffer[:, _BinsOffset:_PlayersOffset].reshape((n, Azul.BinNumber + 1, Azul.ColorNumber + 1))
+
+        players = buffer[:, _PlayersOffset:_NextPlayerOffset].reshape((n, Azul.PlayerNumber, _PlayerSize))
+        self.walls = players[..., _WallOffset:_QueueOffset].reshape((n, Azul.PlayerNumber) + Azul.WallShape)
+        self.queues = players[..., _QueueOffset:_FloorOffset].reshape((n, Azul.PlayerNumber, Azul.WallShape[0], 2))
+        self.floorCounts = players[..., _FloorOffset]
+        self._scoreBytes = players[..., _ScoreOffset:_ScoreOffset + 2]
+
+        self.nextPlayers = buffer[:, _NextPlayerOffset]
+        self.firstPlayers = buffer[:, _FirstPlayerOffset]
+        self.poolWasTouched = buffer[:, _PoolWasTouchedOffset]
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def __getitem__(self, index: int) -> Azul:
+        return Azul._from_buffer(self._buffer[index].copy())
+
+    @property
+    def scores(self) -> np.ndarray:
+        # A copy, the scores are stored as two bytes each. Shape: (games, players).
+        return self._scoreBytes[..., 0].astype(np.int64) | self._scoreBytes[..., 1].astype(np.int64) << 8
+
+    def _set_scores(self, mask: np.ndarray, scores: np.ndarray):
+        self._scoreBytes[mask, :, 0] = scores & 0xFF
+        self._scoreBytes[mask, :, 1] = scores >> 8
+
+    def is_game_end(self) -> np.ndarray:
+        return np.any(np.all(self.walls != Color.Empty, axis=3), axis=(1, 2))
+
+    def is_round_end(self) -> np.ndarray:
+        return np.all(self.bins == 0, axis=(1, 2))
+
+    def get_legal_move_mask(self, games: np.ndarray) -> np.ndarray:
+        """
+        Compute which moves are legal in the given games.
+
+        :return: A bool array of shape (games, sources, colors, targets), the colors exclude 'empty'.
+        """
+        players = self.nextPlayers[games]
+        walls = self.walls[games, players]
+        queues = self.queues[games, players]
+        colors = np.arange(1, Azul.ColorNumber + 1)
+
+        # Shape: (games, sources, colors).
+        sourceMask = self.bins[games][..., 1:] > 0
+
+        # Shape: (games, rows, colors).
+        notOnWall = ~np.any(walls[:, :, np.newaxis, :] == colors[np.newaxis, np.newaxis, :, np.newaxis], axis=3)
+        queueColors, queueCounts = queues[..., 0:1], queues[..., 1:2]
+        queueSizes = np.arange(1, Azul.WallShape[0] + 1)[np.newaxis, :, np.newaxis]
+        queueFits = (queueCounts < queueSizes) & ((queueColors == Color.Empty) | (queueColors == colors))
+        # It's always valid to put the tiles on the floor.
+        targetMask = np.concatenate((notOnWall & queueFits, np.ones((len(games), 1, Azul.ColorNumber), dtype=bool)),
+                                    axis=1)
+
+        return sourceMask[:, :, :, np.newaxis] & targetMask.transpose(0, 2, 1)[:, np.newaxis, :, :]
+
+    def step(self) -> np.ndarray:
+        """
+        Make one random move in every unfinished game, scoring and dealing rounds where needed.
+
+        :return: A bool mask of the games that have ended.
+        """
+        isGameEnd = self.is_game_end()
+        # We might get games in the middle of a round, or not dealt yet.
+        toDeal = ~isGameEnd & self.is_round_end()
+        if np.any(toDeal):
+            self.deal_round(toDeal)
+
+        games = np.flatnonzero(~isGameEnd)
+        if len(games) > 0:
+            self._apply_random_moves(games)
+
+            roundEnded = np.zeros(len(self), dtype=bool)
+            roundEnded[games] = self.is_round_end()[games]
+            if np.any(roundEnded):
+                self.score_round(roundEnded)
+                gameEnded = roundEnded & self.is_game_end()
+                self.score_game(gameEnded)
+                isGameEnd |= gameEnded
+
+        return isGameEnd
+
+    def playout(self, maxRoundTimeout: int = 100):
+        """
+        Play all the games until the end with random moves.
+        """
+        games = np.flatnonzero(~self.is_game_end())
+        if not _playouts(self._buffer, games, maxRoundTimeout, self.rng):
+            raise RuntimeError(f"Timed out after {maxRoundTimeout} rounds.")
+
+    def _apply_random_moves(self, games: np.ndarray):
+        mask = self.get_legal_move_mask(games)
+        flatMask = mask.reshape((len(games), -1))
+        # Pick uniformly among the legal moves: the largest random key wins.
+        keys = np.where(flatMask, self.rng.random(flatMask.shape), -1.0)
+        sources, colors, targets = np.unravel_index(np.argmax(keys, axis=1), mask.shape[1:])
+        colors = colors + 1
+
+        players = self.nextPlayers[games].copy()
+        counts = self.bins[games, sources, colors].astype(np.int64)
+        floorIncrease = np.zeros(len(games), dtype=np.int64)
+
+        # Update who goes first next round (changes when the pool is touched for the first time).
+        becomeFirst = (sources == Azul.BinNumber) & (self.poolWasTouched[games] == 0)
+        self.poolWasTouched[games[sources == Azul.BinNumber]] = True
+        self.firstPlayers[games[becomeFirst]] = players[becomeFirst]
+        floorIncrease += becomeFirst
+
+        # Pass the turn to the next player.
+        self.nextPlayers[games] = (players + 1) % Azul.PlayerNumber
+
+        # Take away the tiles of the moved color, move the rest from the bin into the pool.
+        self.bins[games, sources, colors] = 0
+        fromBin = sources < Azul.BinNumber
+        binGames, binSources = games[fromBin], sources[fromBin]
+        self.bins[binGames, Azul.BinNumber] += self.bins[binGames, binSources]
+        self.bins[binGames, binSources] = 0
+
+        # Put the tiles into the queue, move the leftovers onto the floor.
+        toQueue = targets < Azul.WallShape[0]
+        queueGames, queuePlayers, queueTargets = games[toQueue], players[toQueue], targets[toQueue]
+        newCounts = self.queues[queueGames, queuePlayers, queueTargets, 1] + counts[toQueue]
+        queueSizes = queueTargets + 1
+        self.queues[queueGames, queuePlayers, queueTargets, 0] = colors[toQueue]
+        self.queues[queueGames, queuePlayers, queueTargets, 1] = np.minimum(newCounts, queueSizes)
+        floorIncrease[toQueue] += np.maximum(newCounts - queueSizes, 0)
+        floorIncrease[~toQueue] += counts[~toQueue]
+
+        self.floorCounts[games, players] += floorIncrease.astype(np.uint8)
+
+    def score_round(self, mask: np.ndarray):
+        """
+        Move the tiles from the queues to the walls and score them, in the masked games.
+        """
+        games = np.flatnonzero(mask)
+        walls = self.walls[games]
+        queues = self.queues[games]
+        scores = self.scores[games]
+
+        for iRow in range(Azul.WallShape[0]):
+            colors, counts = queues[:, :, iRow, 0], queues[:, :, iRow, 1]
+            isFull = counts == iRow + 1
+            gameIndices, playerIndices = np.nonzero(isFull)
+            fullColors = colors[isFull].astype(np.int64)
+            iCols = (fullColors - 1 + iRow) % Azul.ColorNumber
+
+            walls[gameIndices, playerIndices, iRow, iCols] = fullColors
+            queues[gameIndices, playerIndices, iRow] = 0
+            scores[gameIndices, playerIndices] += AzulBatch._get_tile_scores(walls[gameIndices, playerIndices],
+                                                                             iRow, iCols)
+
+        # Score the floor tiles.
+        floorPenalties = np.concatenate(([0], np.cumsum(Azul.FloorScores, dtype=np.int64)))
+        floorCounts = np.minimum(self.floorCounts[games], Azul.FloorSize)
+        scores = np.maximum(scores - floorPenalties[floorCounts], 0)
+
+        self.walls[games] = walls
+        self.queues[games] = queues
+        self.floorCounts[games] = 0
+        self._set_scores(games, scores)
+
+    @staticmethod
+    def _get_tile_scores(walls: np.ndarray, iRow: int, iCols: np.ndarray) -> np.ndarray:
+        # Count the consecutive neighbors of the new tiles in the row and in the column.
+        indices = np.arange(len(walls))
+        rows = walls[indices, iRow, :] != Color.Empty
+        cols = walls[indices, :, iCols] != Color.Empty
+
+        def count_line(line: np.ndarray, pos: np.ndarray) -> np.ndarray:
+            total = np.ones(len(line), dtype=np.int64)
+            for direction in (-1, 1):
+                isContinued = np.ones(len(line), dtype=bool)
+                for offset in range(1, line.shape[1]):
+                    p = pos + direction * offset
+                    inside = (p >= 0) & (p < line.shape[1])
+                    isContinued &= inside
+                    isContinued[isContinued] &= line[indices[isContinued], p[isContinued]]
+                    total += isContinued
+
+            return total
+
+        scoreRow = count_line(rows, iCols)
+        scoreCol = count_line(cols, np.full(len(walls), iRow))
+        scoreRow = np.where(scoreRow > 1, scoreRow, 0)
+        scoreCol = np.where(scoreCol > 1, scoreCol, 0)
+
+        return np.maximum(scoreRow + scoreCol, 1)
+
+    def score_game(self, mask: np.ndarray):
+        games = np.flatnonzero(mask)
+        walls = self.walls[games] != Color.Empty
+        scores = self.scores[games]
+
+        # Score full rows and columns.
+        scores += np.sum(np.all(walls, axis=3), axis=2) * Azul.ScorePerRow
+        scores += np.sum(np.all(walls, axis=2), axis=2) * Azul.ScorePerColumn
+        # Score complete colors.
+        colors = np.arange(1, Azul.ColorNumber + 1)
+        colorCounts = np.sum(self.walls[games][..., np.newaxis] == colors, axis=(2, 3))
+        scores += np.sum(colorCounts == Azul.WallShape[0], axis=2) * Azul.ScorePerColor
+
+        self._set_scores(games, scores)
+
+    def deal_round(self, mask: np.ndarray):
+        """
+        Refill the bags if needed, and distribute a random sample of tiles among the bins, in the masked games.
+        """
+        _deal_rounds(self._buffer, np.flatnonzero(mask), self.rng)
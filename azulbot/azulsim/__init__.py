@@ -9,7 +9,7 @@ sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
 # These types are extended in Python.
 # noinspection PyUnresolvedReferences
-from .azul import Azul, AzulState, Move
+from .azul import Azul, AzulState, Move, MctsBot
 # And these are taken as-is from C++.
 # noinspection PyUnresolvedReferences
-from azulcpp import PlayerState, MoveOutcome, Color, MctsBot
+from azulcpp import PlayerState, MoveOutcome, Color, RootPolicy, SearchMode, GameMctsBot
@@ -1,7 +1,9 @@
+import asyncio
+from concurrent.futures import Executor
 from typing import *
 
 from azulbot.game import Game, GameState
-from azulcpp import Azul as AzulCpp, Move as MoveCpp
+from azulcpp import Azul as AzulCpp, Move as MoveCpp, MctsBot as MctsBotCpp
 from azulcpp import AzulState, Color, MoveOutcome
 
 
@@ -102,3 +104,30 @@ class Azul(AzulCpp, Game[AzulState, Move], metaclass=PybindAbcMeta):
     @staticmethod
     def str_to_color(s: str) -> Color:
         return Azul.CharToColor[s.upper().strip()]
+
+
+class MctsBot(MctsBotCpp):
+
+    async def search_async(self, budget: Optional[int] = None, seconds: Optional[float] = None,
+                           executor: Optional[Executor] = None) -> Tuple[MoveCpp, Dict[str, Any]]:
+        """
+        Search for a step budget or a time budget on a worker thread, without blocking the event loop.
+        The native search releases the GIL, so other coroutines and threads keep running.
+
+        :param budget: The number of steps to do.
+        :param seconds: How long to search for.
+        :param executor: Where to run the search, uses the loop's default executor if not given.
+        :return: The best move and the search stats.
+        """
+        if (budget is None) == (seconds is None):
+            raise ValueError("Specify either the step budget or the time budget.")
+
+        def _search():
+            if budget is not None:
+                self.step_n(budget)
+            else:
+                self.step_for(seconds)
+
+            return self.get_best_move(), self.stats()
+
+        return await asyncio.get_running_loop().run_in_executor(executor, _search)
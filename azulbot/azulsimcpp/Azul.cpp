@@ -54,6 +54,11 @@ std::vector<Move> Azul::enumerate_moves(const AzulState& state) const
 }
 
 MoveOutcome Azul::apply_move(const AzulState& state, const Move& move)
+{
+    return apply_move(state, move, _randomEngine);
+}
+
+MoveOutcome Azul::apply_move(const AzulState& state, const Move& move, std::mt19937& randomEngine) const
 {
     //todo apply_move_wc shouldn't check for the end of round
     AzulState next = apply_move_without_scoring(state, move).state;
@@ -71,7 +76,7 @@ MoveOutcome Azul::apply_move(const AzulState& state, const Move& move)
         }
         else
         {
-            next = deal_round(next);
+            next = deal_round(next, {}, randomEngine);
             isRandom = true;
         }
     }
@@ -141,6 +146,14 @@ MoveOutcome Azul::apply_move_without_scoring(const AzulState& state, const Move&
 }
 
 AzulState Azul::playout(const AzulState& state, uint32_t maxRoundTimeout)
+{
+    uint32_t moveCount = 0;
+
+    return playout(state, moveCount, _randomEngine, maxRoundTimeout);
+}
+
+AzulState Azul::playout(const AzulState& state, uint32_t& moveCount, std::mt19937& randomEngine,
+                        uint32_t maxRoundTimeout) const
 {
     AzulState curr{state};
 
@@ -149,14 +162,15 @@ AzulState Azul::playout(const AzulState& state, uint32_t maxRoundTimeout)
     {
         // We might get a _game in the middle of a round, so we have to check.
         if (is_round_end(curr))
-            curr = deal_round(curr);
+            curr = deal_round(curr, {}, randomEngine);
 
         while (!is_round_end(curr))
         {
             std::vector<Move> legalMoves = enumerate_moves(curr);
             std::uniform_int_distribution<> uniform(0, static_cast<int>(legalMoves.size()) - 1);
-            const Move& move = legalMoves[uniform(_randomEngine)];
+            const Move& move = legalMoves[uniform(randomEngine)];
             curr = apply_move_without_scoring(curr, move).state;
+            moveCount += 1;
         }
 
         curr = score_round(curr);
@@ -173,6 +187,12 @@ AzulState Azul::playout(const AzulState& state, uint32_t maxRoundTimeout)
 
 
 AzulState Azul::deal_round(const AzulState& state, const std::vector<Color>& fixedSample)
+{
+    return deal_round(state, fixedSample, _randomEngine);
+}
+
+AzulState Azul::deal_round(const AzulState& state, const std::vector<Color>& fixedSample,
+                           std::mt19937& randomEngine) const
 {
     if (!is_round_end(state))
         throw std::runtime_error{"Not allowed to deal a new round before the old has ended."};
@@ -196,10 +216,10 @@ AzulState Azul::deal_round(const AzulState& state, const std::vector<Color>& fix
             for (uint8_t i = 0; i < next.bag[iColor]; i++)
                 population.push_back(static_cast<Color>(iColor));
 
-        std::sample(population.begin(), population.end(), std::back_inserter(sample), sampleSize, _randomEngine);
+        std::sample(population.begin(), population.end(), std::back_inserter(sample), sampleSize, randomEngine);
         // This sampling line is biased: it preserves the order, which is important since we subdivide into bins later
         // and consider each tile as independent. So we have to shuffle afterwards.
-        std::shuffle(sample.begin(), sample.end(), _randomEngine);
+        std::shuffle(sample.begin(), sample.end(), randomEngine);
     }
     else
     {
@@ -364,6 +384,16 @@ uint32_t Azul::get_score(const AzulState& state, uint32_t playerIndex) const
     
 }
 
+uint32_t Azul::get_next_player(const AzulState& state) const
+{
+    return state.nextPlayer;
+}
+
+size_t Azul::get_move_index(const Move& move)
+{
+    return (move.sourceBin * MoveSpaceShape[1] + static_cast<size_t>(move.color)) * MoveSpaceShape[2] + move.targetQueue;
+}
+
 uint32_t Azul::get_tile_score(std::array<std::array<Color, WallSize>, WallSize> wall, uint8_t iRow, uint8_t iCol)
 {
     // Hardcore search direction, don't do anything fancy.
@@ -28,21 +28,43 @@ public:
     static constexpr uint8_t ScorePerColumn = 7;
     static constexpr uint8_t ScorePerColor = 10;
 
+    static constexpr std::array<size_t, 3> MoveSpaceShape{BinNumber + 1, ColorNumber + 1, WallSize + 1};
+    static constexpr size_t MoveSpaceSize = MoveSpaceShape[0] * MoveSpaceShape[1] * MoveSpaceShape[2];
+
+    // The types used by the generic search (see 'Mcts.h').
+    using State = AzulState;
+    using Move = ::Move;
+    using Outcome = MoveOutcome;
+
     Azul() = default;
 
+    // Seed the internal random engine, e.g., for reproducible games.
+    void seed(uint32_t seed) { _randomEngine.seed(seed); }
+    // Create an engine seeded from the internal one, e.g., to play with it outside of a lock.
+    std::mt19937 spawn_engine() { return std::mt19937{_randomEngine()}; }
+
+    // The methods that take a random engine don't touch the internal one, and are safe to call
+    // from several threads at once (e.g., by MCTS bots sharing the same game), as long as the engines are different.
     std::vector<Move> enumerate_moves(const AzulState& state) const;
     MoveOutcome apply_move(const AzulState& state, const Move& move);
+    MoveOutcome apply_move(const AzulState& state, const Move& move, std::mt19937& randomEngine) const;
     MoveOutcome apply_move_without_scoring(const AzulState& state, const Move& move) const;
 
     AzulState playout(const AzulState& state, uint32_t maxRoundTimeout = 100);
+    AzulState playout(const AzulState& state, uint32_t& moveCount, std::mt19937& randomEngine, uint32_t maxRoundTimeout = 100) const;
     
     AzulState deal_round(const AzulState& state, const std::vector<Color>& fixedSample = {});
+    AzulState deal_round(const AzulState& state, const std::vector<Color>& fixedSample, std::mt19937& randomEngine) const;
     AzulState score_round(const AzulState& state) const;
     AzulState score_game(const AzulState& state) const;
     void _refill_bag(AzulState& state) const;
     bool is_game_end(const AzulState& state) const;
     bool is_round_end(const AzulState& state) const;
     uint32_t get_score(const AzulState& state, uint32_t playerIndex) const;
+    uint32_t get_next_player(const AzulState& state) const;
+
+    // Moves are indexed by [sourceBin][color][targetQueue], the pool and the floor included.
+    static size_t get_move_index(const Move& move);
 
     static uint32_t get_tile_score(std::array<std::array<Color, WallSize>, WallSize> wall, uint8_t iRow, uint8_t iCol);
     static Color get_wall_slot_color(uint8_t rowIndex, uint8_t colIndex)
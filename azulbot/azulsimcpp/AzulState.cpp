@@ -1,4 +1,6 @@
 #include "AzulState.h"
+#include <cstring>
+
 #include "utils.h"
 
 size_t PlayerState::hash() const
@@ -17,6 +19,33 @@ size_t PlayerState::hash() const
     return h;
 }
 
+void PlayerState::pack(uint8_t* data) const
+{
+    static_assert(sizeof(wall) == Azul::WallSize * Azul::WallSize && sizeof(queue) == Azul::WallSize * 2);
+
+    std::memcpy(data, wall.data(), sizeof(wall));
+    data += sizeof(wall);
+    std::memcpy(data, queue.data(), sizeof(queue));
+    data += sizeof(queue);
+    *data++ = floorCount;
+    // Little-endian, whatever the platform.
+    *data++ = static_cast<uint8_t>(score & 0xFF);
+    *data++ = static_cast<uint8_t>((score >> 8) & 0xFF);
+}
+
+PlayerState PlayerState::unpack(const uint8_t* data)
+{
+    PlayerState player{};
+    std::memcpy(player.wall.data(), data, sizeof(player.wall));
+    data += sizeof(player.wall);
+    std::memcpy(player.queue.data(), data, sizeof(player.queue));
+    data += sizeof(player.queue);
+    player.floorCount = *data++;
+    player.score = data[0] | (static_cast<uint32_t>(data[1]) << 8);
+
+    return player;
+}
+
 Move::Move(uint8_t sourceBin, Color color, uint8_t targetQueue)
     :sourceBin(sourceBin), color(color), targetQueue(targetQueue)
 {
@@ -41,3 +70,40 @@ size_t AzulState::hash() const
 
     return h;
 }
+
+void AzulState::pack(uint8_t* data) const
+{
+    static_assert(sizeof(bag) + sizeof(bins) == (Azul::ColorNumber + 1) * (Azul::BinNumber + 2));
+
+    std::memcpy(data, bag.data(), sizeof(bag));
+    data += sizeof(bag);
+    std::memcpy(data, bins.data(), sizeof(bins));
+    data += sizeof(bins);
+    for (const auto& player : players)
+    {
+        player.pack(data);
+        data += PlayerState::PackedSize;
+    }
+    *data++ = nextPlayer;
+    *data++ = firstPlayer;
+    *data++ = poolWasTouched;
+}
+
+AzulState AzulState::unpack(const uint8_t* data)
+{
+    AzulState state{};
+    std::memcpy(state.bag.data(), data, sizeof(state.bag));
+    data += sizeof(state.bag);
+    std::memcpy(state.bins.data(), data, sizeof(state.bins));
+    data += sizeof(state.bins);
+    for (auto& player : state.players)
+    {
+        player = PlayerState::unpack(data);
+        data += PlayerState::PackedSize;
+    }
+    state.nextPlayer = *data++;
+    state.firstPlayer = *data++;
+    state.poolWasTouched = *data++ != 0;
+
+    return state;
+}
@@ -45,6 +45,12 @@ struct PlayerState
         queue[queueIndex][1] = count;
     }
 
+    // Wall, queue, floor count and a two-byte score.
+    static constexpr size_t PackedSize = Azul::WallSize * Azul::WallSize + Azul::WallSize * 2 + 1 + 2;
+
+    void pack(uint8_t* data) const;
+    static PlayerState unpack(const uint8_t* data);
+
     size_t hash() const;
 
     bool operator==(const PlayerState& other) const
@@ -98,6 +104,14 @@ struct AzulState
         bins[binIndex][static_cast<uint8_t>(color)] = count;
     }
 
+    // The packed layout is shared with the pure-Python engine (azulpy), so that states can be converted in bulk.
+    // Bag, bins, players, then the next player, the first player and the pool flag. The counters aren't stored.
+    static constexpr size_t PackedSize = (Azul::ColorNumber + 1) * (Azul::BinNumber + 2) +
+                                         Azul::PlayerNumber * PlayerState::PackedSize + 3;
+
+    void pack(uint8_t* data) const;
+    static AzulState unpack(const uint8_t* data);
+
     size_t hash() const;
 
     bool operator==(const AzulState& other) const
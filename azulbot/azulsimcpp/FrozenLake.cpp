@@ -0,0 +1,84 @@
+#include "FrozenLake.h"
+
+
+template class Mcts<FrozenLake>;
+
+
+std::vector<FrozenLakeMove> FrozenLake::enumerate_moves(const FrozenLakeState& state) const
+{
+    return {Move{0}, Move{1}, Move{2}, Move{3}};
+}
+
+FrozenLakeMoveOutcome FrozenLake::apply_move(const FrozenLakeState& state, const FrozenLakeMove& move)
+{
+    return apply_move(state, move, _randomEngine);
+}
+
+FrozenLakeMoveOutcome FrozenLake::apply_move(const FrozenLakeState& state, const FrozenLakeMove& move,
+                                             std::mt19937& randomEngine) const
+{
+    uint8_t direction = move.direction;
+    if (_isSlippery)
+    {
+        // Like in Gym, slide to either side of the intended direction with the same probability.
+        std::uniform_int_distribution<> uniform(-1, 1);
+        direction = static_cast<uint8_t>((direction + DirectionNumber + uniform(randomEngine)) % DirectionNumber);
+    }
+
+    const State next{_get_neighbor(state.position, direction)};
+
+    return Outcome{next, _isSlippery, is_game_end(next)};
+}
+
+FrozenLakeState FrozenLake::playout(const FrozenLakeState& state)
+{
+    uint32_t moveCount = 0;
+
+    return playout(state, moveCount, _randomEngine);
+}
+
+FrozenLakeState FrozenLake::playout(const FrozenLakeState& state, uint32_t& moveCount, std::mt19937& randomEngine) const
+{
+    std::uniform_int_distribution<> uniform(0, DirectionNumber - 1);
+    State curr{state};
+    while (!is_game_end(curr))
+    {
+        curr = apply_move(curr, Move{static_cast<uint8_t>(uniform(randomEngine))}, randomEngine).state;
+        moveCount += 1;
+    }
+
+    return curr;
+}
+
+bool FrozenLake::is_game_end(const FrozenLakeState& state) const
+{
+    return Map[state.position] == 'H' || Map[state.position] == 'G';
+}
+
+double FrozenLake::get_score(const FrozenLakeState& state, uint32_t playerIndex) const
+{
+    return Map[state.position] == 'G' ? 1.0 : 0.0;
+}
+
+uint32_t FrozenLake::get_next_player(const FrozenLakeState& state) const
+{
+    return 0;
+}
+
+uint8_t FrozenLake::_get_neighbor(uint8_t position, uint8_t direction)
+{
+    // Walking into the edge keeps you in place.
+    const uint8_t row = position / MapSize;
+    const uint8_t col = position % MapSize;
+    switch (direction)
+    {
+    case 0:
+        return col > 0 ? position - 1 : position;
+    case 1:
+        return row < MapSize - 1 ? position + MapSize : position;
+    case 2:
+        return col < MapSize - 1 ? position + 1 : position;
+    default:
+        return row > 0 ? position - MapSize : position;
+    }
+}
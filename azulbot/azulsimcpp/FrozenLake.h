@@ -0,0 +1,86 @@
+#pragma once
+#include <cstdint>
+#include <random>
+#include <vector>
+
+#include "Mcts.h"
+
+
+struct FrozenLakeState
+{
+    uint8_t position{ 0 };
+
+    bool operator==(const FrozenLakeState& other) const
+    {
+        return position == other.position;
+    }
+};
+
+struct FrozenLakeMove
+{
+    // Left, down, right, up, same as in Gym.
+    uint8_t direction{ 0 };
+
+    bool operator==(const FrozenLakeMove& other) const
+    {
+        return direction == other.direction;
+    }
+};
+
+struct FrozenLakeMoveOutcome
+{
+    FrozenLakeState state;
+    bool isRandom;
+    bool isEnd;
+};
+
+
+// A toy single-player game to check the generic search on, the 4x4 FrozenLake from Gym (see 'frozenlake.py').
+// Walk from the start to the goal without falling into the holes. On slippery ice, a move can slide sideways.
+class FrozenLake
+{
+public:
+    static constexpr uint8_t MapSize = 4;
+    // 'S'tart, 'F'rozen, 'H'ole, 'G'oal, row by row.
+    static constexpr const char* Map = "SFFF"
+                                       "FHFH"
+                                       "FFFH"
+                                       "HFFG";
+    static constexpr uint8_t DirectionNumber = 4;
+    static constexpr size_t MoveSpaceSize = DirectionNumber;
+
+    // The types used by the generic search (see 'Mcts.h').
+    using State = FrozenLakeState;
+    using Move = FrozenLakeMove;
+    using Outcome = FrozenLakeMoveOutcome;
+
+    explicit FrozenLake(bool isSlippery = false)
+        :_isSlippery{isSlippery}
+    {
+    }
+
+    std::vector<Move> enumerate_moves(const State& state) const;
+    Outcome apply_move(const State& state, const Move& move);
+    Outcome apply_move(const State& state, const Move& move, std::mt19937& randomEngine) const;
+    State playout(const State& state);
+    State playout(const State& state, uint32_t& moveCount, std::mt19937& randomEngine) const;
+    bool is_game_end(const State& state) const;
+    double get_score(const State& state, uint32_t playerIndex) const;
+    uint32_t get_next_player(const State& state) const;
+    bool is_slippery() const { return _isSlippery; }
+
+    static State get_init_state() { return State{}; }
+    static size_t get_move_index(const Move& move) { return move.direction; }
+
+protected:
+    bool _isSlippery;
+
+    std::mt19937 _randomEngine{std::random_device{}()};
+
+    static uint8_t _get_neighbor(uint8_t position, uint8_t direction);
+};
+
+
+// The search is compiled once for the toy game, in 'FrozenLake.cpp'.
+extern template class Mcts<FrozenLake>;
+using FrozenLakeMctsBot = Mcts<FrozenLake>;
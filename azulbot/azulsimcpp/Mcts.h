@@ -0,0 +1,1202 @@
+#pragma once
+
+#include <algorithm>
+#include <array>
+#include <atomic>
+#include <cassert>
+#include <chrono>
+#include <cmath>
+#include <exception>
+#include <iterator>
+#include <limits>
+#include <memory>
+#include <mutex>
+#include <optional>
+#include <random>
+#include <stdexcept>
+#include <thread>
+#include <utility>
+#include <vector>
+
+#include "utils.h"
+
+
+
+// How to spread the simulations over the moves at the root.
+enum class RootPolicy : uint8_t
+{
+    Uct = 0,
+    SequentialHalving = 1
+};
+
+// How to handle the random events (e.g., dealing new rounds).
+enum class SearchMode : uint8_t
+{
+    // Random moves lead to chance nodes that keep up to 'samplingWidth' sampled outcomes.
+    ChanceNodes = 0,
+    // Information-set MCTS: nodes are keyed by moves only, the random events are sampled anew on each descent,
+    // and the stats are shared across all the outcomes. Only the root keeps a state.
+    InformationSet = 1
+};
+
+// Cheap counters describing the tree and the search so far.
+template <typename TMove>
+struct SearchStats
+{
+    uint64_t nodeCount{};
+    uint64_t treeBytes{};  // Approximate.
+    uint32_t maxDepth{};
+    double meanDepth{};
+    uint64_t stepCount{};
+    uint64_t playoutCount{};
+    uint64_t playoutMoveCount{};
+    uint64_t prunedNodeCount{};
+    double stepsPerSecond{};
+    // Time spent in each phase of the steps, in seconds.
+    double timeSelection{};
+    double timeExpansion{};
+    double timePlayout{};
+    double timeBackprop{};
+    // Per-child statistics at the root.
+    std::vector<TMove> rootMoves{};
+    std::vector<uint32_t> rootPlays{};
+    std::vector<double> rootValues{};
+};
+
+
+// MCTS over any game that provides:
+//  - 'State', 'Move' and 'Outcome' types. States and moves are default-constructible and comparable with '=='.
+//    Outcomes have the 'state' and 'isRandom' fields.
+//  - 'MoveSpaceSize' and a static 'get_move_index(move)' mapping the moves to [0, MoveSpaceSize).
+//    Zero size means the moves can't be indexed, and are compared one by one instead.
+//  - enumerate_moves(state), apply_move(state, move, randomEngine), playout(state, moveCount, randomEngine),
+//    is_game_end(state), get_score(state, playerIndex) and get_next_player(state).
+// The methods taking a random engine must not touch any other random state, so that several bots can share the game.
+template <typename TGame>
+class Mcts
+{
+public:
+    using State = typename TGame::State;
+    using Move = typename TGame::Move;
+    using Outcome = typename TGame::Outcome;
+    using SearchStats = ::SearchStats<Move>;
+
+    Mcts(TGame& game, const State& state, int samplingWidth = 10, double_t explorationWeight = 1 / 1.4142,
+         uint64_t maxNodes = 0, uint64_t maxBytes = 0, SearchMode searchMode = SearchMode::ChanceNodes,
+         bool commonRandomNumbers = false);
+    ~Mcts();
+
+    // Seed the random engine of the search, e.g., for reproducible searches.
+    void seed(uint32_t seed) { _randomEngine.seed(seed); }
+
+    void step();
+    Move step_n(uint32_t nSteps, RootPolicy rootPolicy = RootPolicy::Uct);
+    std::pair<Move, uint32_t> step_n_until_decided(uint32_t maxSteps, uint32_t checkInterval = 100,
+                                                   double_t confidenceZ = 3.0);
+    uint32_t step_for(double_t seconds);
+    Move get_best_move();
+
+    // Search in the background, e.g., while the opponent is thinking.
+    // The bot can't be used while pondering, it has to be stopped first.
+    void start_pondering();
+    void stop_pondering();
+    bool is_pondering() const;
+    // Move the root to the subtree matching the move and the resulting state, keeping its stats.
+    // Returns false if there's no such subtree and the search has to start from scratch.
+    bool advance(const Move& move, const State& state);
+
+    // Run independent searches for many states on a thread pool (all hardware threads by default).
+    // If 'visits' is given, it is filled with the root visit counts of each search,
+    // indexed by [state][moveIndex] (see 'TGame::get_move_index').
+    static std::vector<Move> search_batch(TGame& game, const std::vector<State>& states, uint32_t budget,
+                                          uint32_t threadNumber = 0, int samplingWidth = 10,
+                                          double_t explorationWeight = 1 / 1.4142, uint32_t* visits = nullptr);
+
+    SearchStats stats() const;
+    // The states under each root child, in the order of the moves: the sampled outcomes of the random children
+    // (in the order they were sampled), or the single resulting state of the others.
+    std::vector<std::vector<State>> get_root_outcomes() const;
+
+protected:
+    using Clock = std::chrono::steady_clock;
+
+    class Node
+    {
+    public:
+        State state;
+        Move move;
+        Node* parent;
+        std::vector<std::unique_ptr<Node>> children{};
+        bool isRandom{};
+        // The player that made the move leading to this node.
+        uint8_t player{};
+        // How many times the node was a legal choice during selection. (Only used by the information-set search.)
+        uint32_t availability{};
+        // Seeds the outcomes of the random children, when using common random numbers.
+        uint32_t chanceSeed{};
+        double scores{};
+        double scoresSquared{};
+        uint32_t plays{};
+
+
+        Node(State state, Move move, Node* parent)
+            :state{std::move(state)}, move{std::move(move)}, parent{parent}
+        {
+        }
+
+    };
+
+    // Asks the game for the final scores lazily, only for the players that need them.
+    class ScoreCache
+    {
+    public:
+        ScoreCache(const TGame& game, const State& state)
+            :_game{game}, _state{state}
+        {
+        }
+
+        double get(uint32_t playerIndex)
+        {
+            if (playerIndex >= _scores.size())
+                _scores.resize(playerIndex + 1, std::numeric_limits<double>::quiet_NaN());
+            if (std::isnan(_scores[playerIndex]))
+                _scores[playerIndex] = static_cast<double>(_game.get_score(_state, playerIndex));
+
+            return _scores[playerIndex];
+        }
+
+    private:
+        const TGame& _game;
+        const State& _state;
+        std::vector<double> _scores{};
+    };
+
+    // Approximate memory taken by a node: the node itself and the pointer in its parent's child list.
+    static constexpr uint64_t NodeBytes = sizeof(Node) + sizeof(std::unique_ptr<Node>);
+    // When the tree hits the node limit, prune it down to this fraction of the limit.
+    static constexpr double PruneTargetFraction = 0.75;
+
+    // The bot only calls the game methods that take an explicit random engine,
+    // so several bots can share the same game and run in parallel.
+    TGame& _game;
+    std::unique_ptr<Node> _root;
+    uint32_t _playerIndex;
+    uint32_t _samplingWidth;
+    double_t _explorationWeight;
+    uint64_t _nodeLimit;
+    SearchMode _searchMode;
+    bool _commonRandomNumbers;
+    uint64_t _nodeCountAfterPrune{0};
+
+    std::mt19937 _randomEngine{std::random_device{}()};
+
+    std::thread _ponderThread{};
+    std::atomic<bool> _stopPondering{false};
+    bool _isPondering{false};
+    std::exception_ptr _ponderException{};
+
+    // Search stats.
+    uint64_t _nodeCount{1};
+    uint64_t _depthSum{0};
+    uint32_t _maxDepth{0};
+    uint64_t _stepCount{0};
+    uint64_t _playoutCount{0};
+    uint64_t _playoutMoveCount{0};
+    uint64_t _prunedNodeCount{0};
+    Clock::duration _timeSelection{};
+    Clock::duration _timeExpansion{};
+    Clock::duration _timePlayout{};
+    Clock::duration _timeBackprop{};
+
+    void _step();
+    void _step_from(Node* node);
+    void _step_information_set(Node* node);
+    std::mt19937 _get_common_engine(const Node* parent, size_t outcomeIndex) const;
+    Outcome _sample_common_outcome(const Node* parent, const Move& move, size_t outcomeIndex) const;
+    Move _step_n_sequential_halving(uint32_t nSteps);
+    Node* _select_max_uct(std::vector<std::unique_ptr<Node>>& nodes, int parentPlays);
+    size_t _get_most_visited_child_index() const;
+    bool _is_best_move_decided(uint32_t stepsLeft, double_t confidenceZ) const;
+    void _count_new_node(uint32_t depth);
+    void _prune_if_needed();
+    void _prune();
+    bool _is_node_limit_reached() const;
+    void _throw_if_pondering() const;
+};
+
+
+template <typename TGame>
+Mcts<TGame>::Mcts(TGame& game, const State& state, int samplingWidth, double_t explorationWeight,
+                  uint64_t maxNodes, uint64_t maxBytes, SearchMode searchMode, bool commonRandomNumbers)
+    :_game(game), _root(std::make_unique<Node>(state, Move(), nullptr)), _playerIndex(game.get_next_player(state)), _samplingWidth(samplingWidth), _explorationWeight(explorationWeight),
+     _searchMode(searchMode), _commonRandomNumbers(commonRandomNumbers)
+{
+    // Zero means no limit. If both limits are given, the stricter one applies.
+    _nodeLimit = maxNodes;
+    if (maxBytes > 0)
+    {
+        const uint64_t nodeLimitFromBytes = std::max(maxBytes / NodeBytes, uint64_t{1});
+        _nodeLimit = _nodeLimit > 0 ? std::min(_nodeLimit, nodeLimitFromBytes) : nodeLimitFromBytes;
+    }
+}
+
+template <typename TGame>
+Mcts<TGame>::~Mcts()
+{
+    stop_pondering();
+}
+
+template <typename TGame>
+void Mcts<TGame>::step()
+{
+    _throw_if_pondering();
+    _step();
+}
+
+template <typename TGame>
+void Mcts<TGame>::_step()
+{
+    _prune_if_needed();
+    _step_from(_root.get());
+}
+
+template <typename TGame>
+void Mcts<TGame>::_step_from(Node* node)
+{
+    if (_searchMode == SearchMode::InformationSet)
+        return _step_information_set(node);
+
+    //# Select a leaf node according to UCT.
+    //node = self.root
+    //while len(node.children) > 0:
+    //	if node.plays == 0 and not node.isRandom:  # Can happen on the first run.
+    //		break
+    //	if node.isRandom:
+    //		# When going through a random node, generate new outcomes until the sampling width is reached.
+    //		if len(node.children) < self.samplingWidth:
+    //			newRandomOutcome = self._game.apply_move(node.parent.state, node.move)
+    //			assert newRandomOutcome.isRandom
+    //			newChild = Node(newRandomOutcome.state, None, node, isRandom=False)
+    //			node.children.append(newChild)
+    //			node = newChild
+    //		else:
+    //			node = random.choice(node.children)
+    //	else:
+    //		node = self._select_max_uct(node.children, node.plays)
+    //
+
+    using Clock = std::chrono::steady_clock;
+    const auto timeStart = Clock::now();
+
+    // Keep track of the depth for the search stats.
+    uint32_t depth = 0;
+    for (const Node* n = node; n->parent != nullptr; n = n->parent)
+        depth += 1;
+
+    // Select a leaf node according to UCT, starting from the given node (normally, the root).
+    while (!node->children.empty())
+    {
+        if (node->plays == 0 && !node->isRandom)
+            break;
+
+        depth += 1;
+
+        if (node->isRandom)
+        {
+            // When going through a random node, generate new outcomes until the sampling width is reached.
+            // (Or until the tree hits the memory limit.)
+            if (node->children.size() < _samplingWidth && !_is_node_limit_reached())
+            {
+                Outcome newRandomOutcome = !_commonRandomNumbers
+                    ? _game.apply_move(node->parent->state, node->move, _randomEngine)
+                    : _sample_common_outcome(node->parent, node->move, node->children.size());
+                assert(newRandomOutcome.isRandom);
+                Node* newChild = node->children.emplace_back(std::make_unique<Node>(newRandomOutcome.state, Move(), node)).get();
+                newChild->player = node->player;
+                node = newChild;
+                _count_new_node(depth);
+            }
+            else
+            {
+                // If the sampling width is reached, just pick one of the sampled outcomes.
+                std::uniform_int_distribution<> uniform(0, static_cast<int>(node->children.size()) - 1);
+                node = node->children[uniform(_randomEngine)].get();
+            }
+        }
+        else
+        {
+            node = _select_max_uct(node->children, node->plays);
+        }
+    }
+
+
+
+    //# If the node represents a terminal state, we don't need to expand it.
+    //if not self._game.is_game_end(node.state):  # todo can't we cache this as a flag?
+    //	# Otherwise, expand the node, appending all possible states, and playout a random new child.
+    //	assert len(node.children) == 0
+    //	for move in self._game.enumerate_moves(node.state):
+    //		outcome = self._game.apply_move(node.state, move)
+    //		if not outcome.isRandom:
+    //			node.children.append(Node(outcome.state, move, node))
+    //		else:
+    //			# Create a special random node, whose children are the possible outcomes of the same move.
+    //			randomNode = Node(None, move, node, isRandom=True)
+    //			node.children.append(randomNode)
+    //			randomNode.children.append(Node(outcome.state, None, randomNode, isRandom=False))
+    //
+    //	node = random.choice(node.children)
+    //	if node.isRandom:
+    //		node = random.choice(node.children)
+    //
+    
+
+    const auto timeSelected = Clock::now();
+
+    // If the node represents a terminal state, we don't need to expand it.
+    // If the tree hits the memory limit, we don't expand either, and just do a playout from the leaf.
+    if (!_game.is_game_end(node->state) && !_is_node_limit_reached())  // todo No need to recompute, store the move outcome.
+    {
+        // Otherwise, expand the node, appending all possible states, and playout a random new child.
+        assert(node->children.empty());
+        // With common random numbers, the first outcome of every random child comes from the seed shared by
+        // all the siblings. The engine is seeded once, and each move gets a copy, so they all see the same numbers.
+        std::optional<std::mt19937> commonEngine{};
+        if (_commonRandomNumbers)
+        {
+            node->chanceSeed = _randomEngine();
+            commonEngine = _get_common_engine(node, 0);
+        }
+        const auto apply_move = [&](const Move& move)
+        {
+            if (!commonEngine)
+                return _game.apply_move(node->state, move, _randomEngine);
+
+            std::mt19937 engine{*commonEngine};
+            return _game.apply_move(node->state, move, engine);
+        };
+
+        const auto player = static_cast<uint8_t>(_game.get_next_player(node->state));
+        for (Move& move : _game.enumerate_moves(node->state))
+        {
+            Outcome outcome = apply_move(move);
+            if (!outcome.isRandom)
+            {
+                node->children.emplace_back(std::make_unique<Node>(outcome.state, move, node))->player = player;
+                _count_new_node(depth + 1);
+            }
+            else
+            {
+                // Create a special random node, whose children are the possible outcomes of the same move. Fill one of those outcome.
+                Node* randomNode = node->children.emplace_back(std::make_unique<Node>(State{}, move, node)).get();
+                randomNode->isRandom = true;
+                randomNode->player = player;
+                randomNode->children.emplace_back(std::make_unique<Node>(outcome.state, Move{}, randomNode))->player = player;
+                _count_new_node(depth + 1);
+                _count_new_node(depth + 2);
+            }
+        }
+
+        // Now that the node was expanded, choose one of its children to do a playout.
+        assert(!node->children.empty());
+        std::uniform_int_distribution<> uniform(0, static_cast<int>(node->children.size()) - 1);
+        node = node->children[uniform(_randomEngine)].get();
+        if (node->isRandom)
+        {
+            assert(!node->children.empty());
+            uniform = std::uniform_int_distribution<>(0, static_cast<int>(node->children.size()) - 1);
+            node = node->children[uniform(_randomEngine)].get();
+        }
+    }
+
+
+    //if not self._game.is_game_end(node.state):
+    //	# Do a playout.
+    //	terminalState = self._game.playout(node.state)
+    //
+    //else:
+    //	# We're already in the terminal state, just reuse the result.
+    //	terminalState = node.state
+    //
+    //isWinInt = self._game.get_score(terminalState, self.playerIndex)
+    //
+    //# Update the parents.
+    //while node is not None:
+    //	node.plays += 1
+    //	node.wins += isWinInt
+    //	node = node.parent
+
+    const auto timeExpanded = Clock::now();
+
+    State terminalState;
+    if (!_game.is_game_end(node->state))
+    {
+        // Do a playout.
+        uint32_t moveCount = 0;
+        terminalState = _game.playout(node->state, moveCount, _randomEngine);
+        _playoutCount += 1;
+        _playoutMoveCount += moveCount;
+    }
+    else
+    {
+        // We're already in the terminal state, just reuse the result.
+        terminalState = node->state;
+    }
+
+    const auto timePlayedOut = Clock::now();
+
+    ScoreCache scores{_game, terminalState};
+
+    // Update the parents;
+    while (true)
+    {
+        node->plays += 1;
+        if (node->parent == nullptr)
+            break;
+        // Update the node with score of the player whose action led to the node state. I.e., the previous player.
+        // Also, we don't assume it's just the other player (like in Azul), the nodes store the prev. player explicitly.
+        const double score = scores.get(node->player);
+        node->scores += score;
+        node->scoresSquared += score * score;
+        node = node->parent;
+    }
+
+    const auto timeEnd = Clock::now();
+
+    _stepCount += 1;
+    _timeSelection += timeSelected - timeStart;
+    _timeExpansion += timeExpanded - timeSelected;
+    _timePlayout += timePlayedOut - timeExpanded;
+    _timeBackprop += timeEnd - timePlayedOut;
+}
+
+template <typename TGame>
+void Mcts<TGame>::_step_information_set(Node* node)
+{
+    // Same as the regular step, but the tree nodes don't store the states. Instead, we carry a 'determinized' state
+    // along the way down, sampling the random events (new deals) anew every time.
+    // Since the legal moves depend on the deal, the children only cover the moves that were legal at some point,
+    // and UCT counts how often each child was available instead of the parent visits.
+    const auto timeStart = Clock::now();
+
+    // Get the current state by replaying the moves from the root. (Normally, we start at the root anyway.)
+    std::vector<const Node*> path{};
+    for (const Node* n = node; n->parent != nullptr; n = n->parent)
+        path.push_back(n);
+    uint32_t depth = static_cast<uint32_t>(path.size());
+
+    State current = _root->state;
+    for (auto it = path.rbegin(); it != path.rend(); ++it)
+        current = _game.apply_move(current, (*it)->move, _randomEngine).state;
+
+    // Map the legal moves to the existing children. If the game doesn't index its moves, compare them one by one.
+    std::array<int32_t, TGame::MoveSpaceSize> childIndices{};
+    auto findChild = [&](const Move& move) -> int32_t
+    {
+        if constexpr (TGame::MoveSpaceSize > 0)
+        {
+            return childIndices[TGame::get_move_index(move)];
+        }
+        else
+        {
+            for (size_t i = 0; i < node->children.size(); i++)
+                if (node->children[i]->move == move)
+                    return static_cast<int32_t>(i);
+            return -1;
+        }
+    };
+
+    while (!_game.is_game_end(current))
+    {
+        const std::vector<Move> moves = _game.enumerate_moves(current);
+
+        if constexpr (TGame::MoveSpaceSize > 0)
+        {
+            std::fill(childIndices.begin(), childIndices.end(), -1);
+            for (size_t i = 0; i < node->children.size(); i++)
+                childIndices[TGame::get_move_index(node->children[i]->move)] = static_cast<int32_t>(i);
+        }
+
+        // If some legal moves aren't in the tree yet, this is the leaf to expand.
+        const bool isLeaf = std::any_of(moves.begin(), moves.end(), [&](const Move& m) { return findChild(m) < 0; });
+        if (isLeaf)
+            break;
+
+        // Select among the legal moves according to UCT, using the availability counts.
+        Node* bestNode = nullptr;
+        double bestValue = -1;
+        for (const Move& move : moves)
+        {
+            Node* child = node->children[findChild(move)].get();
+            child->availability += 1;
+            if (bestNode != nullptr && bestNode->plays == 0)
+                continue;  // Already found an unvisited child, just keep counting the availability.
+
+            if (child->plays == 0)
+            {
+                bestNode = child;
+                continue;
+            }
+
+            const double uct = static_cast<double>(child->scores) / child->plays +
+                               _explorationWeight * sqrt(log(child->availability) / child->plays);
+            if (uct > bestValue)
+            {
+                bestValue = uct;
+                bestNode = child;
+            }
+        }
+
+        assert(bestNode != nullptr);
+        current = _game.apply_move(current, bestNode->move, _randomEngine).state;
+        node = bestNode;
+        depth += 1;
+    }
+
+    const auto timeSelected = Clock::now();
+
+    // Expand the leaf with all the moves that are legal in the current determinization, and move into one of them.
+    if (!_game.is_game_end(current) && !_is_node_limit_reached())
+    {
+        std::vector<Node*> newChildren{};
+        const auto player = static_cast<uint8_t>(_game.get_next_player(current));
+        for (const Move& move : _game.enumerate_moves(current))
+        {
+            if (findChild(move) >= 0)
+                continue;
+
+            Node* child = node->children.emplace_back(std::make_unique<Node>(State{}, move, node)).get();
+            child->player = player;
+            _count_new_node(depth + 1);
+            newChildren.push_back(child);
+        }
+
+        assert(!newChildren.empty());
+        std::uniform_int_distribution<> uniform(0, static_cast<int>(newChildren.size()) - 1);
+        node = newChildren[uniform(_randomEngine)];
+        node->availability += 1;
+        current = _game.apply_move(current, node->move, _randomEngine).state;
+    }
+
+    const auto timeExpanded = Clock::now();
+
+    if (!_game.is_game_end(current))
+    {
+        uint32_t moveCount = 0;
+        current = _game.playout(current, moveCount, _randomEngine);
+        _playoutCount += 1;
+        _playoutMoveCount += moveCount;
+    }
+
+    const auto timePlayedOut = Clock::now();
+
+    ScoreCache scores{_game, current};
+
+    // Update the parents with the score of the player whose move led to the node.
+    while (true)
+    {
+        node->plays += 1;
+        if (node->parent == nullptr)
+            break;
+
+        const double score = scores.get(node->player);
+        node->scores += score;
+        node->scoresSquared += score * score;
+        node = node->parent;
+    }
+
+    const auto timeEnd = Clock::now();
+
+    _stepCount += 1;
+    _timeSelection += timeSelected - timeStart;
+    _timeExpansion += timeExpanded - timeSelected;
+    _timePlayout += timePlayedOut - timeExpanded;
+    _timeBackprop += timeEnd - timePlayedOut;
+}
+
+template <typename TGame>
+typename Mcts<TGame>::Move Mcts<TGame>::step_n(uint32_t nSteps, RootPolicy rootPolicy)
+{
+    _throw_if_pondering();
+    if (rootPolicy == RootPolicy::SequentialHalving)
+        return _step_n_sequential_halving(nSteps);
+
+    for (uint32_t i = 0; i < nSteps; i++)
+        _step();
+
+    return get_best_move();
+}
+
+template <typename TGame>
+std::pair<typename Mcts<TGame>::Move, uint32_t> Mcts<TGame>::step_n_until_decided(uint32_t maxSteps,
+                                                                                   uint32_t checkInterval,
+                                                                                   double_t confidenceZ)
+{
+    // Same as step_n, but every 'checkInterval' steps look at the root statistics
+    // and stop as soon as spending the rest of the budget cannot change the decision.
+    // The decision is the most visited child, which (unlike the best mean in 'get_best_move') the plays can bound.
+    _throw_if_pondering();
+    uint32_t stepsDone = 0;
+    while (stepsDone < maxSteps)
+    {
+        _step();
+        stepsDone += 1;
+
+        if (checkInterval > 0 && stepsDone % checkInterval == 0 &&
+            _is_best_move_decided(maxSteps - stepsDone, confidenceZ))
+            break;
+    }
+
+    if (_root->children.empty())
+        throw std::runtime_error("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?");
+
+    return {_root->children[_get_most_visited_child_index()]->move, stepsDone};
+}
+
+template <typename TGame>
+uint32_t Mcts<TGame>::step_for(double_t seconds)
+{
+    const auto timeEnd = Clock::now() + std::chrono::duration_cast<Clock::duration>(std::chrono::duration<double>(seconds));
+
+    _throw_if_pondering();
+    uint32_t stepsDone = 0;
+    while (Clock::now() < timeEnd)
+    {
+        _step();
+        stepsDone += 1;
+    }
+
+    return stepsDone;
+}
+
+template <typename TGame>
+void Mcts<TGame>::start_pondering()
+{
+    _throw_if_pondering();
+
+    // Keep stepping in the background until asked to stop.
+    _stopPondering = false;
+    _ponderException = nullptr;
+    _isPondering = true;
+    _ponderThread = std::thread([this]()
+    {
+        try
+        {
+            while (!_stopPondering)
+                _step();
+        }
+        catch (...)
+        {
+            // Rethrow on the caller's side when the pondering is stopped.
+            _ponderException = std::current_exception();
+        }
+    });
+}
+
+template <typename TGame>
+void Mcts<TGame>::stop_pondering()
+{
+    if (!_isPondering)
+        return;
+
+    _stopPondering = true;
+    _ponderThread.join();
+    _isPondering = false;
+
+    if (_ponderException)
+        std::rethrow_exception(std::exchange(_ponderException, nullptr));
+}
+
+template <typename TGame>
+bool Mcts<TGame>::is_pondering() const
+{
+    return _isPondering;
+}
+
+template <typename TGame>
+bool Mcts<TGame>::advance(const Move& move, const State& state)
+{
+    _throw_if_pondering();
+
+    // Find the subtree that matches the move and the resulting state, and make it the new root.
+    // For random moves, the state has to match one of the sampled outcomes.
+    std::unique_ptr<Node>* newRoot = nullptr;
+    for (auto& child : _root->children)
+    {
+        if (!(child->move == move))
+            continue;
+
+        if (_searchMode == SearchMode::InformationSet)
+        {
+            // The stats are shared across all the deals, so the subtree is valid whatever the actual state is.
+            newRoot = &child;
+        }
+        else if (!child->isRandom)
+        {
+            if (child->state == state)
+                newRoot = &child;
+        }
+        else
+        {
+            for (auto& outcome : child->children)
+                if (outcome->state == state)
+                    newRoot = &outcome;
+        }
+        break;
+    }
+
+    _playerIndex = _game.get_next_player(state);
+    _nodeCountAfterPrune = 0;
+    if (newRoot == nullptr)
+    {
+        // Start from scratch.
+        _root = std::make_unique<Node>(state, Move(), nullptr);
+        _nodeCount = 1;
+        _depthSum = 0;
+        _maxDepth = 0;
+
+        return false;
+    }
+
+    // Detach the subtree before releasing the rest of the tree.
+    std::unique_ptr<Node> subtree = std::move(*newRoot);
+    subtree->parent = nullptr;
+    subtree->move = Move();
+    // Use the given state, in case the convenience counters are different.
+    subtree->state = state;
+    _root = std::move(subtree);
+
+    // Recount the tree, the depths have shifted.
+    _nodeCount = 0;
+    _depthSum = 0;
+    _maxDepth = 0;
+    std::vector<std::pair<const Node*, uint32_t>> stack{{_root.get(), 0}};
+    while (!stack.empty())
+    {
+        auto [node, depth] = stack.back();
+        stack.pop_back();
+        _nodeCount += 1;
+        _depthSum += depth;
+        _maxDepth = std::max(_maxDepth, depth);
+        for (const auto& child : node->children)
+            stack.emplace_back(child.get(), depth + 1);
+    }
+
+    return true;
+}
+
+template <typename TGame>
+std::vector<typename Mcts<TGame>::Move> Mcts<TGame>::search_batch(TGame& game, const std::vector<State>& states, uint32_t budget,
+                                                                 uint32_t threadNumber, int samplingWidth,
+                                                                 double_t explorationWeight, uint32_t* visits)
+{
+    if (threadNumber == 0)
+        threadNumber = std::max(std::thread::hardware_concurrency(), 1u);
+    threadNumber = std::min(threadNumber, static_cast<uint32_t>(states.size()));
+
+    if constexpr (TGame::MoveSpaceSize == 0)
+    {
+        if (visits != nullptr)
+            throw std::invalid_argument("The game doesn't index its moves, can't return the visit counts.");
+    }
+
+    std::vector<Move> moves(states.size());
+    if (visits != nullptr)
+        std::fill(visits, visits + states.size() * TGame::MoveSpaceSize, 0);
+
+    // Each worker picks the next unsearched state, until there are none left.
+    std::atomic<size_t> nextIndex{0};
+    std::exception_ptr exception{};
+    std::mutex exceptionMutex{};
+    auto worker = [&]()
+    {
+        try
+        {
+            for (size_t i = nextIndex++; i < states.size(); i = nextIndex++)
+            {
+                // The bots only use their own random engines, so it's safe to share the game.
+                Mcts bot{game, states[i], samplingWidth, explorationWeight};
+                moves[i] = bot.step_n(budget);
+
+                if constexpr (TGame::MoveSpaceSize > 0)
+                {
+                    if (visits != nullptr)
+                    {
+                        uint32_t* stateVisits = visits + i * TGame::MoveSpaceSize;
+                        for (const auto& child : bot._root->children)
+                            stateVisits[TGame::get_move_index(child->move)] = child->plays;
+                    }
+                }
+            }
+        }
+        catch (...)
+        {
+            // Stop the other workers and report the first error.
+            nextIndex = states.size();
+            std::lock_guard<std::mutex> lock{exceptionMutex};
+            if (!exception)
+                exception = std::current_exception();
+        }
+    };
+
+    std::vector<std::thread> threads{};
+    for (uint32_t i = 0; i < threadNumber; i++)
+        threads.emplace_back(worker);
+    for (auto& thread : threads)
+        thread.join();
+
+    if (exception)
+        std::rethrow_exception(exception);
+
+    return moves;
+}
+
+template <typename TGame>
+typename Mcts<TGame>::SearchStats Mcts<TGame>::stats() const
+{
+    _throw_if_pondering();
+    auto toSeconds = [](Clock::duration d) { return std::chrono::duration<double>(d).count(); };
+
+    SearchStats stats{};
+    stats.nodeCount = _nodeCount;
+    // Every node except the root is owned by a pointer in its parent's child list.
+    // (Ignore the unused vector capacity and allocator overhead.)
+    stats.treeBytes = _nodeCount * NodeBytes - sizeof(std::unique_ptr<Node>);
+    stats.maxDepth = _maxDepth;
+    stats.meanDepth = static_cast<double>(_depthSum) / _nodeCount;
+    stats.stepCount = _stepCount;
+    stats.playoutCount = _playoutCount;
+    stats.playoutMoveCount = _playoutMoveCount;
+    stats.prunedNodeCount = _prunedNodeCount;
+
+    stats.timeSelection = toSeconds(_timeSelection);
+    stats.timeExpansion = toSeconds(_timeExpansion);
+    stats.timePlayout = toSeconds(_timePlayout);
+    stats.timeBackprop = toSeconds(_timeBackprop);
+    const double timeTotal = stats.timeSelection + stats.timeExpansion + stats.timePlayout + stats.timeBackprop;
+    stats.stepsPerSecond = timeTotal > 0 ? _stepCount / timeTotal : 0.0;
+
+    for (const auto& child : _root->children)
+    {
+        stats.rootMoves.push_back(child->move);
+        stats.rootPlays.push_back(child->plays);
+        stats.rootValues.push_back(static_cast<double>(child->scores) / (child->plays + 0.001));
+    }
+
+    return stats;
+}
+
+template <typename TGame>
+typename Mcts<TGame>::Move Mcts<TGame>::get_best_move()
+{
+    _throw_if_pondering();
+    //	if len(self.root.children) == 0:
+    //		raise RuntimeError("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?")
+    //
+    //	node = max(self.root.children, key=lambda n: n.wins / (n.plays + 0.001))
+    //
+    //	return node.move
+    if (_root->children.empty())
+        throw std::runtime_error("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?");
+
+    std::vector<double> winPercentages{};
+    std::transform(_root->children.begin(), _root->children.end(), std::back_inserter(winPercentages),
+                   [](const std::unique_ptr<Node>& n) { return static_cast<double>(n->scores) / (n->plays + 0.001); });
+    const auto maxIt = std::max_element(winPercentages.begin(), winPercentages.end());
+
+    return _root->children[maxIt - winPercentages.begin()]->move;
+}
+
+template <typename TGame>
+size_t Mcts<TGame>::_get_most_visited_child_index() const
+{
+    // The 'robust child', the ties are broken by the mean score.
+    const auto getMean = [](const Node& n) { return static_cast<double>(n.scores) / (n.plays + 0.001); };
+    size_t bestIndex = 0;
+    for (size_t i = 1; i < _root->children.size(); i++)
+    {
+        const Node& node = *_root->children[i];
+        const Node& best = *_root->children[bestIndex];
+        if (node.plays > best.plays || (node.plays == best.plays && getMean(node) > getMean(best)))
+            bestIndex = i;
+    }
+
+    return bestIndex;
+}
+
+template <typename TGame>
+typename Mcts<TGame>::Node* Mcts<TGame>::_select_max_uct(std::vector<std::unique_ptr<Node>>& nodes, int parentPlays)
+{
+    //def _select_max_uct(nodes: Sequence[Node], parentPlays: int):
+    //	bestIndices, bestVal = [], -1
+    //	for i, node in enumerate(nodes):
+    //		if node.plays == 0:
+    //			return node
+    //
+    //		uct = node.wins / node.plays + MctsBot.ExplorationWeight * math.sqrt(math.log(parentPlays) / node.plays)
+    //
+    //		if uct > bestVal:
+    //			bestVal = uct
+    //			bestIndices = [i]
+    //		elif uct == bestVal:
+    //			bestIndices.append(i)
+    //
+    //	return nodes[random.choice(bestIndices)]
+
+    // todo This code is biased, not choosing randomly for equal values (see the Python version).
+    Node* bestNode = nullptr;
+    double bestValue = -1;
+    for (auto& node : nodes)
+    {
+        if (node->plays == 0)
+            return node.get();
+
+        double uct = static_cast<double>(node->scores) / node->plays + _explorationWeight * sqrt(log(parentPlays) / node->plays);
+
+        if (uct > bestValue)
+        {
+            bestValue = uct;
+            bestNode = node.get();
+        }
+    }
+
+    assert(bestNode != nullptr);
+
+    return bestNode;
+}
+
+template <typename TGame>
+typename Mcts<TGame>::Move Mcts<TGame>::_step_n_sequential_halving(uint32_t nSteps)
+{
+    // Split the budget into log2(moves) rounds. Each round, spread the round's budget evenly
+    // over the remaining root moves (using UCT below them), then discard the worse half.
+    uint32_t stepsDone = 0;
+    // Expand the root first, so that we know the moves.
+    if (_root->children.empty() && nSteps > 0)
+    {
+        _step();
+        stepsDone += 1;
+    }
+
+    if (_root->children.empty())
+        throw std::runtime_error("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?");
+
+    auto meanScore = [](const Node* n) { return static_cast<double>(n->scores) / (n->plays + 0.001); };
+
+    std::vector<Node*> candidates{};
+    std::transform(_root->children.begin(), _root->children.end(), std::back_inserter(candidates),
+                   [](const std::unique_ptr<Node>& n) { return n.get(); });
+
+    const auto roundNumber = static_cast<uint32_t>(std::ceil(std::log2(candidates.size())));
+    for (uint32_t iRound = 0; candidates.size() > 1; iRound++)
+    {
+        // Stop if the budget doesn't allow to look at each candidate at least once.
+        const uint32_t stepsLeft = nSteps - stepsDone;
+        if (stepsLeft < candidates.size())
+            break;
+
+        const uint32_t roundsLeft = std::max(roundNumber - std::min(iRound, roundNumber), uint32_t{1});
+        const uint32_t stepsPerCandidate = std::max(stepsLeft / static_cast<uint32_t>(candidates.size() * roundsLeft),
+                                                    uint32_t{1});
+        for (Node* candidate : candidates)
+        {
+            for (uint32_t i = 0; i < stepsPerCandidate; i++)
+            {
+                // Pruning never deletes the root children, so the candidate pointers stay valid.
+                _prune_if_needed();
+                _step_from(candidate);
+            }
+        }
+        stepsDone += stepsPerCandidate * static_cast<uint32_t>(candidates.size());
+
+        // Keep the better half.
+        std::sort(candidates.begin(), candidates.end(),
+                  [&meanScore](const Node* a, const Node* b) { return meanScore(a) > meanScore(b); });
+        candidates.resize((candidates.size() + 1) / 2);
+    }
+
+    const auto bestIt = std::max_element(candidates.begin(), candidates.end(),
+                                         [&meanScore](const Node* a, const Node* b) { return meanScore(a) < meanScore(b); });
+
+    return (*bestIt)->move;
+}
+
+template <typename TGame>
+bool Mcts<TGame>::_is_best_move_decided(uint32_t stepsLeft, double_t confidenceZ) const
+{
+    // Nothing to decide if the root wasn't expanded yet.
+    if (_root->children.empty())
+        return false;
+    // A forced move.
+    if (_root->children.size() == 1)
+        return true;
+
+    // The decision is the most visited child (see 'step_n_until_decided'), and each step goes through exactly
+    // one root child. If the best child leads by more plays than there are steps left, no other child can overtake it.
+    // (A tie is broken by the mean score, which the remaining steps could still change, hence the strict comparison.)
+    // The scores aren't bounded, so no such guarantee exists for the best mean.
+    const size_t bestIndex = _get_most_visited_child_index();
+    const uint32_t mostPlays = _root->children[bestIndex]->plays;
+    uint32_t secondMostPlays = 0;
+    for (size_t i = 0; i < _root->children.size(); i++)
+        if (i != bestIndex)
+            secondMostPlays = std::max(secondMostPlays, _root->children[i]->plays);
+
+    if (mostPlays - secondMostPlays > stepsLeft)
+        return true;
+
+    if (confidenceZ <= 0)
+        return false;
+
+    // Otherwise, check if the confidence interval of the best child's mean score is above the intervals
+    // of all the other children. (If the most visited child doesn't have the best mean, this never holds.)
+    std::vector<double> lowerBounds{}, upperBounds{};
+    for (const auto& node : _root->children)
+    {
+        // Can't estimate the variance without at least two samples.
+        if (node->plays < 2)
+            return false;
+
+        const double mean = static_cast<double>(node->scores) / node->plays;
+        const double variance = std::max(static_cast<double>(node->scoresSquared) / node->plays - mean * mean, 0.0);
+        const double halfWidth = confidenceZ * sqrt(variance / node->plays);
+        lowerBounds.push_back(mean - halfWidth);
+        upperBounds.push_back(mean + halfWidth);
+    }
+
+    for (size_t i = 0; i < _root->children.size(); i++)
+        if (i != bestIndex && upperBounds[i] >= lowerBounds[bestIndex])
+            return false;
+
+    return true;
+}
+
+template <typename TGame>
+void Mcts<TGame>::_count_new_node(uint32_t depth)
+{
+    _nodeCount += 1;
+    _depthSum += depth;
+    _maxDepth = std::max(_maxDepth, depth);
+}
+
+template <typename TGame>
+void Mcts<TGame>::_prune_if_needed()
+{
+    // Free up some memory if the tree has hit the limit. (Only try again once the tree has grown since the last time.)
+    if (_nodeLimit > 0 && _nodeCount >= _nodeLimit && _nodeCount > _nodeCountAfterPrune)
+        _prune();
+}
+
+template <typename TGame>
+void Mcts<TGame>::_prune()
+{
+    // Collapse the least visited subtrees, until the tree shrinks to a fraction of the limit.
+    // Collapsed nodes keep their stats, and get expanded again if the search comes back to them.
+    // Random nodes are never collapsed, they must keep at least one outcome. The root is kept as well.
+    const auto targetCount = static_cast<uint64_t>(_nodeLimit * PruneTargetFraction);
+
+    // Find all the nodes that could be collapsed.
+    std::vector<std::pair<Node*, uint32_t>> candidates{};
+    std::vector<std::pair<Node*, uint32_t>> stack{{_root.get(), 0}};
+    while (!stack.empty())
+    {
+        auto [node, depth] = stack.back();
+        stack.pop_back();
+        if (node != _root.get() && !node->isRandom && !node->children.empty())
+            candidates.emplace_back(node, depth);
+
+        for (auto& child : node->children)
+            stack.emplace_back(child.get(), depth + 1);
+    }
+
+    // Least visited first. Descendants never have more plays than their ancestors,
+    // so break the ties by depth to collapse the descendants first and never touch a deleted node.
+    std::sort(candidates.begin(), candidates.end(), [](const auto& a, const auto& b)
+    {
+        return a.first->plays != b.first->plays ? a.first->plays < b.first->plays : a.second > b.second;
+    });
+
+    for (const auto& [node, depth] : candidates)
+    {
+        if (_nodeCount <= targetCount)
+            break;
+
+        // Update the counters, then delete the whole subtree.
+        std::vector<std::pair<const Node*, uint32_t>> subtree{};
+        for (const auto& child : node->children)
+            subtree.emplace_back(child.get(), depth + 1);
+        while (!subtree.empty())
+        {
+            auto [n, d] = subtree.back();
+            subtree.pop_back();
+            _nodeCount -= 1;
+            _depthSum -= d;
+            _prunedNodeCount += 1;
+            for (const auto& child : n->children)
+                subtree.emplace_back(child.get(), d + 1);
+        }
+
+        node->children.clear();
+    }
+
+    // The deepest subtrees could be gone, measure what's left.
+    _maxDepth = 0;
+    stack.emplace_back(_root.get(), 0);
+    while (!stack.empty())
+    {
+        auto [node, depth] = stack.back();
+        stack.pop_back();
+        _maxDepth = std::max(_maxDepth, depth);
+        for (auto& child : node->children)
+            stack.emplace_back(child.get(), depth + 1);
+    }
+
+    _nodeCountAfterPrune = _nodeCount;
+}
+
+template <typename TGame>
+bool Mcts<TGame>::_is_node_limit_reached() const
+{
+    return _nodeLimit > 0 && _nodeCount >= _nodeLimit;
+}
+
+template <typename TGame>
+void Mcts<TGame>::_throw_if_pondering() const
+{
+    if (_isPondering)
+        throw std::runtime_error("The bot is pondering, stop it before using the tree.");
+}
+
+template <typename TGame>
+typename Mcts<TGame>::Outcome Mcts<TGame>::_sample_common_outcome(const Node* parent, const Move& move, size_t outcomeIndex) const
+{
+    // The k-th outcome of every random child uses the same seed, so the sibling moves are compared on the same deals.
+    // (As long as the bag is the same, which is normally the case.)
+    std::mt19937 engine = _get_common_engine(parent, outcomeIndex);
+
+    return _game.apply_move(parent->state, move, engine);
+}
+
+template <typename TGame>
+std::mt19937 Mcts<TGame>::_get_common_engine(const Node* parent, size_t outcomeIndex) const
+{
+    return std::mt19937{static_cast<std::mt19937::result_type>(hash_combine(size_t{parent->chanceSeed}, outcomeIndex))};
+}
+
+template <typename TGame>
+std::vector<std::vector<typename Mcts<TGame>::State>> Mcts<TGame>::get_root_outcomes() const
+{
+    _throw_if_pondering();
+    std::vector<std::vector<State>> outcomes{};
+    for (const auto& child : _root->children)
+    {
+        auto& childOutcomes = outcomes.emplace_back();
+        if (!child->isRandom)
+            childOutcomes.push_back(child->state);
+        else
+            for (const auto& outcome : child->children)
+                childOutcomes.push_back(outcome->state);
+    }
+
+    return outcomes;
+}
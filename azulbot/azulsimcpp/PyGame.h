@@ -0,0 +1,137 @@
+#pragma once
+#include <cstdint>
+#include <random>
+#include <vector>
+
+#include <pybind11/pybind11.h>
+#include <pybind11/stl.h>
+
+#include "Mcts.h"
+
+namespace py = pybind11;
+
+
+// A Python object that compares by value (i.e., with Python's '__eq__').
+struct PyValue
+{
+    py::object object{};
+
+    bool operator==(const PyValue& other) const
+    {
+        return object.equal(other.object);
+    }
+};
+
+namespace pybind11::detail
+{
+    // Pass the objects through as they are.
+    template <> struct type_caster<PyValue>
+    {
+    public:
+        PYBIND11_TYPE_CASTER(PyValue, _("object"));
+
+        bool load(handle src, bool)
+        {
+            value.object = reinterpret_borrow<object>(src);
+            return true;
+        }
+
+        static handle cast(const PyValue& src, return_value_policy, handle)
+        {
+            return src.object.inc_ref();
+        }
+    };
+}
+
+struct PyMoveOutcome
+{
+    PyValue state;
+    bool isRandom;
+    bool isEnd;
+};
+
+
+// Runs the native search over any Python 'azulbot.game.Game' by calling back into its methods.
+// The search only saves the tree bookkeeping, the game logic still runs in Python. The callbacks need the GIL,
+// so the bot mustn't release it, ponder or search in parallel. The game uses its own random numbers.
+class PyGame
+{
+public:
+    // The moves are arbitrary objects, compare them instead of indexing.
+    static constexpr size_t MoveSpaceSize = 0;
+
+    using State = PyValue;
+    using Move = PyValue;
+    using Outcome = PyMoveOutcome;
+
+    explicit PyGame(py::object game)
+        :_game{std::move(game)}
+    {
+    }
+
+    std::vector<Move> enumerate_moves(const State& state) const
+    {
+        return _game.attr("enumerate_moves")(state.object).cast<std::vector<Move>>();
+    }
+
+    Outcome apply_move(const State& state, const Move& move, std::mt19937& randomEngine) const
+    {
+        const py::object outcome = _game.attr("apply_move")(state.object, move.object);
+
+        return Outcome{PyValue{outcome.attr("state")},
+                       outcome.attr("isRandom").cast<bool>(), outcome.attr("isEnd").cast<bool>()};
+    }
+
+    // Python games don't report the playout length, the move count stays untouched.
+    State playout(const State& state, uint32_t& moveCount, std::mt19937& randomEngine) const
+    {
+        return PyValue{_game.attr("playout")(state.object)};
+    }
+
+    bool is_game_end(const State& state) const
+    {
+        return _game.attr("is_game_end")(state.object).cast<bool>();
+    }
+
+    double get_score(const State& state, uint32_t playerIndex) const
+    {
+        return _game.attr("get_score")(state.object, playerIndex).cast<double>();
+    }
+
+    uint32_t get_next_player(const State& state) const
+    {
+        return _game.attr("get_next_player")(state.object).cast<uint32_t>();
+    }
+
+    static size_t get_move_index(const Move& move)
+    {
+        return 0;
+    }
+
+protected:
+    py::object _game;
+};
+
+
+// Owns the game adapter, so that it lives as long as the search referencing it.
+class PyGameHolder
+{
+protected:
+    explicit PyGameHolder(py::object game)
+        :_pyGame{std::move(game)}
+    {
+    }
+
+    PyGame _pyGame;
+};
+
+class PyMctsBot : private PyGameHolder, public Mcts<PyGame>
+{
+public:
+    PyMctsBot(py::object game, const py::object& state, int samplingWidth = 10, double_t explorationWeight = 1 / 1.4142,
+              uint64_t maxNodes = 0, uint64_t maxBytes = 0, SearchMode searchMode = SearchMode::ChanceNodes)
+        :PyGameHolder{std::move(game)},
+         Mcts<PyGame>{_pyGame, PyValue{state}, samplingWidth, explorationWeight, maxNodes, maxBytes, searchMode}
+    {
+    }
+};
@@ -3,7 +3,9 @@
 #include <pybind11/stl.h>
 
 #include "AzulState.h"
+#include "FrozenLake.h"
 #include "MctsBot.h"
+#include "PyGame.h"
 #include "utils.h"
 
 namespace py = pybind11;
@@ -11,6 +13,48 @@ using namespace pybind11::literals;
 
 
 
+template <typename TMove>
+py::dict search_stats_to_dict(const SearchStats<TMove>& stats)
+{
+    return py::dict(
+        "nodeCount"_a = stats.nodeCount,
+        "treeBytes"_a = stats.treeBytes,
+        "maxDepth"_a = stats.maxDepth,
+        "meanDepth"_a = stats.meanDepth,
+        "stepCount"_a = stats.stepCount,
+        "playoutCount"_a = stats.playoutCount,
+        "playoutMoveCount"_a = stats.playoutMoveCount,
+        "prunedNodeCount"_a = stats.prunedNodeCount,
+        "stepsPerSecond"_a = stats.stepsPerSecond,
+        "timeSelection"_a = stats.timeSelection,
+        "timeExpansion"_a = stats.timeExpansion,
+        "timePlayout"_a = stats.timePlayout,
+        "timeBackprop"_a = stats.timeBackprop,
+        "rootMoves"_a = stats.rootMoves,
+        "rootPlays"_a = py::array_t<uint32_t>(stats.rootPlays.size(), stats.rootPlays.data()),
+        "rootValues"_a = py::array_t<double>(stats.rootValues.size(), stats.rootValues.data())
+    );
+}
+
+// Bind the methods shared by the searches over all the games.
+// The guard is applied to the methods running the search, e.g., to release the GIL.
+template <typename TBot, typename... TGuard>
+py::class_<TBot> bind_mcts_bot(py::module& m, const char* name, const TGuard&... guard)
+{
+    return py::class_<TBot>(m, name)
+        .def("step", &TBot::step, guard...)
+        .def("step_n", &TBot::step_n, py::arg("nSteps"), py::arg("rootPolicy") = RootPolicy::Uct, guard...)
+        .def("step_n_until_decided", &TBot::step_n_until_decided,
+             py::arg("maxSteps"), py::arg("checkInterval") = 100, py::arg("confidenceZ") = 3.0, guard...)
+        .def("step_for", &TBot::step_for, py::arg("seconds"), guard...)
+        .def("advance", &TBot::advance, py::arg("move"), py::arg("state"))
+        .def("get_best_move", &TBot::get_best_move)
+        .def("seed", &TBot::seed, py::arg("seed"))
+        .def("stats", [](const TBot& bot) { return search_stats_to_dict(bot.stats()); })
+        .def("get_root_outcomes", &TBot::get_root_outcomes);
+}
+
+
 PYBIND11_MODULE(azulcpp, m) 
 {
     m.doc() = "azulcpp";
@@ -73,6 +117,38 @@ PYBIND11_MODULE(azulcpp, m)
 
         .def("copy", &AzulState::copy)
         .def("set_bin", &AzulState::set_bin)
+        // Conversion to and from the packed layout of the pure-Python engine.
+        .def("to_numpy", [](const AzulState& state)
+            {
+                py::array_t<uint8_t> data(AzulState::PackedSize);
+                state.pack(data.mutable_data());
+                return data;
+            })
+        .def_static("from_numpy", [](const py::array_t<uint8_t, py::array::c_style | py::array::forcecast>& data)
+            {
+                if (data.ndim() != 1 || static_cast<size_t>(data.shape(0)) != AzulState::PackedSize)
+                    throw std::invalid_argument("Expected a packed state of size " +
+                                                std::to_string(AzulState::PackedSize));
+                return AzulState::unpack(data.data());
+            }, py::arg("data"))
+        .def_static("to_numpy_batch", [](const std::vector<AzulState>& states)
+            {
+                py::array_t<uint8_t> data({states.size(), AzulState::PackedSize});
+                uint8_t* ptr = data.mutable_data();
+                for (size_t i = 0; i < states.size(); i++)
+                    states[i].pack(ptr + i * AzulState::PackedSize);
+                return data;
+            }, py::arg("states"))
+        .def_static("from_numpy_batch", [](const py::array_t<uint8_t, py::array::c_style | py::array::forcecast>& data)
+            {
+                if (data.ndim() != 2 || static_cast<size_t>(data.shape(1)) != AzulState::PackedSize)
+                    throw std::invalid_argument("Expected packed states of shape (N, " +
+                                                std::to_string(AzulState::PackedSize) + ")");
+                std::vector<AzulState> states(data.shape(0));
+                for (size_t i = 0; i < states.size(); i++)
+                    states[i] = AzulState::unpack(data.data() + i * AzulState::PackedSize);
+                return states;
+            }, py::arg("data"))
         .def("__eq__", [](const AzulState& s1, const AzulState& s2) { return s1 == s2; })
         .def("__hash__", &AzulState::hash);
 
@@ -97,26 +173,118 @@ PYBIND11_MODULE(azulcpp, m)
         .def_readonly_static("ScorePerColumn", &Azul::ScorePerColumn)
         .def_readonly_static("ScorePerColor", &Azul::ScorePerColor)
 
+        .def("seed", &Azul::seed, py::arg("seed"))
         .def("enumerate_moves", &Azul::enumerate_moves)
-        .def("apply_move", &Azul::apply_move)
+        .def("apply_move", py::overload_cast<const AzulState&, const Move&>(&Azul::apply_move))
         .def("apply_move_without_scoring", &Azul::apply_move_without_scoring)
-        .def("playout", &Azul::playout, py::arg("state"), py::arg("maxRoundTimeout") = 100)
+        .def("playout", [](Azul& azul, const AzulState& state, uint32_t maxRoundTimeout)
+            {
+                // The internal engine is only touched while holding the GIL, to seed the engine of this playout.
+                std::mt19937 engine = azul.spawn_engine();
+                py::gil_scoped_release release{};
+                uint32_t moveCount = 0;
+
+                return azul.playout(state, moveCount, engine, maxRoundTimeout);
+            },
+            py::arg("state"), py::arg("maxRoundTimeout") = 100)
         .def("is_game_end", &Azul::is_game_end, py::arg("state"))
         .def("is_round_end", &Azul::is_round_end, py::arg("state"))
         .def("get_score", &Azul::get_score)
 
-        .def("deal_round", &Azul::deal_round, py::arg("state"), py::arg("fixedSampled") = std::vector<Color>{})
+        .def("deal_round", py::overload_cast<const AzulState&, const std::vector<Color>&>(&Azul::deal_round),
+             py::arg("state"), py::arg("fixedSampled") = std::vector<Color>{})
         .def("score_round", &Azul::score_round)
         .def("score_game", &Azul::score_game)
         .def("_refill_bag", &Azul::_refill_bag)
         .def_static("get_wall_slot_color", &Azul::get_wall_slot_color);
 
-    py::class_<MctsBot>(m, "MctsBot")
-        .def(py::init<Azul&, const AzulState&, int, double_t>(), 
-             py::arg("azul"), py::arg("state"), py::arg("samplingWidth") = 10, py::arg("explorationWeight") = 1 / 1.4142)
-        .def("step", &MctsBot::step)
-        .def("step_n", &MctsBot::step_n)
-        .def("get_best_move", &MctsBot::get_best_move);
+    py::enum_<RootPolicy>(m, "RootPolicy")
+        .value("Uct", RootPolicy::Uct)
+        .value("SequentialHalving", RootPolicy::SequentialHalving);
 
-}
+    py::enum_<SearchMode>(m, "SearchMode")
+        .value("ChanceNodes", SearchMode::ChanceNodes)
+        .value("InformationSet", SearchMode::InformationSet);
+
+    // The search doesn't touch Python objects, so let other Python threads run in the meantime.
+    bind_mcts_bot<MctsBot>(m, "MctsBot", py::call_guard<py::gil_scoped_release>())
+        .def(py::init<Azul&, const AzulState&, int, double_t, uint64_t, uint64_t, SearchMode, bool>(), 
+             py::arg("azul"), py::arg("state"), py::arg("samplingWidth") = 10, py::arg("explorationWeight") = 1 / 1.4142,
+             py::arg("maxNodes") = 0, py::arg("maxBytes") = 0, py::arg("searchMode") = SearchMode::ChanceNodes,
+             py::arg("commonRandomNumbers") = false,
+             py::keep_alive<1, 2>())  // The bot references the game, keep it alive.
+        .def("start_pondering", &MctsBot::start_pondering)
+        .def("stop_pondering", &MctsBot::stop_pondering, py::call_guard<py::gil_scoped_release>())
+        .def("is_pondering", &MctsBot::is_pondering)
+        .def_static("search_batch", [](Azul& azul, const std::vector<AzulState>& states, uint32_t budget,
+                                       uint32_t threads, int samplingWidth, double_t explorationWeight,
+                                       bool returnVisits) -> py::object
+            {
+                const auto& shape = Azul::MoveSpaceShape;
+                py::array_t<uint32_t> visits{};
+                if (returnVisits)
+                    visits = py::array_t<uint32_t>({states.size(), shape[0], shape[1], shape[2]});
+                uint32_t* visitsPtr = returnVisits ? visits.mutable_data() : nullptr;
 
+                std::vector<Move> moves{};
+                {
+                    py::gil_scoped_release release{};
+                    moves = MctsBot::search_batch(azul, states, budget, threads, samplingWidth, explorationWeight,
+                                                  visitsPtr);
+                }
+
+                if (returnVisits)
+                    return py::make_tuple(moves, visits);
+
+                return py::cast(moves);
+            },
+            py::arg("azul"), py::arg("states"), py::arg("budget"), py::arg("threads") = 0,
+            py::arg("samplingWidth") = 10, py::arg("explorationWeight") = 1 / 1.4142, py::arg("returnVisits") = false);
+
+    // A toy game to check the generic search on.
+    py::class_<FrozenLakeState>(m, "FrozenLakeState")
+        .def(py::init<uint8_t>(), py::arg("position") = 0)
+        .def_readwrite("position", &FrozenLakeState::position)
+        .def("__repr__", [](const FrozenLakeState& s) { return "<FrozenLakeState '" + std::to_string(s.position) + "'>"; })
+        .def("__hash__", [](const FrozenLakeState& s) { return std::hash<uint8_t>()(s.position); })
+        .def("__eq__", [](const FrozenLakeState& s1, const FrozenLakeState& s2) { return s1 == s2; });
+
+    py::class_<FrozenLakeMove>(m, "FrozenLakeMove")
+        .def(py::init<uint8_t>(), py::arg("direction"))
+        .def_readwrite("direction", &FrozenLakeMove::direction)
+        .def("__repr__", [](const FrozenLakeMove& m) { return "<FrozenLakeMove '" + std::to_string(m.direction) + "'>"; })
+        .def("__hash__", [](const FrozenLakeMove& m) { return std::hash<uint8_t>()(m.direction); })
+        .def("__eq__", [](const FrozenLakeMove& m1, const FrozenLakeMove& m2) { return m1 == m2; });
+
+    py::class_<FrozenLakeMoveOutcome>(m, "FrozenLakeMoveOutcome")
+        .def(py::init<const FrozenLakeState&, bool, bool>())
+        .def_readwrite("state", &FrozenLakeMoveOutcome::state)
+        .def_readwrite("isRandom", &FrozenLakeMoveOutcome::isRandom)
+        .def_readwrite("isEnd", &FrozenLakeMoveOutcome::isEnd);
+
+    py::class_<FrozenLake>(m, "FrozenLake")
+        .def(py::init<bool>(), py::arg("isSlippery") = false)
+        .def_readonly_static("MapSize", &FrozenLake::MapSize)
+        .def("enumerate_moves", &FrozenLake::enumerate_moves)
+        .def("apply_move", py::overload_cast<const FrozenLakeState&, const FrozenLakeMove&>(&FrozenLake::apply_move))
+        .def("playout", py::overload_cast<const FrozenLakeState&>(&FrozenLake::playout))
+        .def("is_game_end", &FrozenLake::is_game_end)
+        .def("get_score", &FrozenLake::get_score)
+        .def("get_next_player", &FrozenLake::get_next_player)
+        .def("is_slippery", &FrozenLake::is_slippery)
+        .def_static("get_init_state", &FrozenLake::get_init_state);
+
+    bind_mcts_bot<FrozenLakeMctsBot>(m, "FrozenLakeMctsBot", py::call_guard<py::gil_scoped_release>())
+        .def(py::init<FrozenLake&, const FrozenLakeState&, int, double_t, uint64_t, uint64_t, SearchMode, bool>(),
+             py::arg("game"), py::arg("state"), py::arg("samplingWidth") = 10, py::arg("explorationWeight") = 1 / 1.4142,
+             py::arg("maxNodes") = 0, py::arg("maxBytes") = 0, py::arg("searchMode") = SearchMode::ChanceNodes,
+             py::arg("commonRandomNumbers") = false,
+             py::keep_alive<1, 2>());
+
+    // The search over a Python game calls back into Python all the time, so it keeps the GIL.
+    bind_mcts_bot<PyMctsBot>(m, "GameMctsBot")
+        .def(py::init<py::object, const py::object&, int, double_t, uint64_t, uint64_t, SearchMode>(),
+             py::arg("game"), py::arg("state"), py::arg("samplingWidth") = 10, py::arg("explorationWeight") = 1 / 1.4142,
+             py::arg("maxNodes") = 0, py::arg("maxBytes") = 0, py::arg("searchMode") = SearchMode::ChanceNodes);
+
+}
@@ -0,0 +1,287 @@
+// A standalone benchmark of the engine and the search, without the Python bindings in the way.
+// Build with 'make benchmark' and run 'build/azulbench [--output results.json]'.
+// The results are printed as a table to stderr, and as JSON to stdout or to the output file,
+// in the same format as 'benchmark_perf.py'.
+
+#include <algorithm>
+#include <chrono>
+#include <cmath>
+#include <cstdint>
+#include <fstream>
+#include <iomanip>
+#include <iostream>
+#include <random>
+#include <sstream>
+#include <stdexcept>
+#include <string>
+#include <utility>
+#include <vector>
+
+#include "../Azul.h"
+#include "../AzulState.h"
+#include "../MctsBot.h"
+
+
+using Clock = std::chrono::steady_clock;
+
+struct Options
+{
+    std::string outputPath{};
+    std::string filter{};
+    uint32_t seed{0};
+    uint32_t repeats{15};
+    uint32_t warmup{3};
+    double minSampleMs{20};
+    uint32_t mctsSteps{1000};
+    bool help{false};
+};
+
+const char* Usage =
+    "Usage: azulbench [options]\n"
+    "  --output PATH         Write the JSON results to a file instead of stdout.\n"
+    "  --filter TEXT         Only run the benchmarks containing the text.\n"
+    "  --seed N              Seed of the positions and of the benchmarks (default 0).\n"
+    "  --repeats N           Timed samples per benchmark (default 15).\n"
+    "  --warmup N            Untimed samples per benchmark (default 3).\n"
+    "  --min-sample-ms MS    Minimum duration of a sample (default 20).\n"
+    "  --mcts-steps N        Steps per search in the 'mcts_step_n' benchmarks (default 1000).\n"
+    "  --help                Print this message.\n";
+
+// The same round at three points: before dealing, right after dealing and at the end before scoring.
+struct Position
+{
+    AzulState preDeal;
+    AzulState dealt;
+    AzulState roundEnd;
+};
+
+struct BenchmarkResult
+{
+    std::string name;
+    double medianNs;
+    double iqrNs;
+    double minNs;
+    uint32_t samples;
+    uint64_t callsPerSample;
+};
+
+// Accumulates the results of the benchmarked calls, so that the compiler can't optimize them away.
+static volatile uint64_t sink = 0;
+
+
+Options parse_options(int argc, char** argv)
+{
+    Options options{};
+    for (int i = 1; i < argc; i++)
+    {
+        const std::string arg = argv[i];
+        if (arg == "--help" || arg == "-h")
+        {
+            options.help = true;
+            return options;
+        }
+        if (i + 1 >= argc)
+            throw std::invalid_argument("Missing a value for " + arg);
+
+        const std::string value = argv[++i];
+        if (arg == "--output")
+            options.outputPath = value;
+        else if (arg == "--filter")
+            options.filter = value;
+        else if (arg == "--seed")
+            options.seed = static_cast<uint32_t>(std::stoul(value));
+        else if (arg == "--repeats")
+            options.repeats = static_cast<uint32_t>(std::stoul(value));
+        else if (arg == "--warmup")
+            options.warmup = static_cast<uint32_t>(std::stoul(value));
+        else if (arg == "--min-sample-ms")
+            options.minSampleMs = std::stod(value);
+        else if (arg == "--mcts-steps")
+            options.mctsSteps = static_cast<uint32_t>(std::stoul(value));
+        else
+            throw std::invalid_argument("Unknown argument " + arg);
+    }
+
+    return options;
+}
+
+
+// Play a seeded random game, and pick an opening, a midgame and an endgame round.
+std::vector<std::pair<std::string, Position>> build_positions(const Azul& azul, uint32_t seed)
+{
+    std::mt19937 engine{seed};
+    std::vector<Position> rounds{};
+    AzulState state{};
+    while (!azul.is_game_end(state))
+    {
+        Position position{};
+        position.preDeal = state;
+        state = azul.deal_round(state, {}, engine);
+        position.dealt = state;
+        while (!azul.is_round_end(state))
+        {
+            const auto moves = azul.enumerate_moves(state);
+            std::uniform_int_distribution<size_t> uniform(0, moves.size() - 1);
+            state = azul.apply_move_without_scoring(state, moves[uniform(engine)]).state;
+        }
+        position.roundEnd = state;
+        rounds.push_back(position);
+        state = azul.score_round(state);
+    }
+
+    return {{"opening", rounds.front()}, {"midgame", rounds[rounds.size() / 2]}, {"endgame", rounds.back()}};
+}
+
+
+template <typename TFunc>
+uint64_t time_calls(TFunc& func, uint64_t number)
+{
+    const auto timeBefore = Clock::now();
+    for (uint64_t i = 0; i < number; i++)
+        func();
+
+    return static_cast<uint64_t>(std::chrono::duration_cast<std::chrono::nanoseconds>(Clock::now() - timeBefore).count());
+}
+
+// Linear interpolation between the closest ranks, like numpy's default.
+double percentile(const std::vector<double>& sorted, double q)
+{
+    const double pos = q * (sorted.size() - 1);
+    const auto lower = static_cast<size_t>(std::floor(pos));
+    const size_t upper = std::min(lower + 1, sorted.size() - 1);
+
+    return sorted[lower] + (sorted[upper] - sorted[lower]) * (pos - lower);
+}
+
+// Time a function, repeating the calls within each sample until it's long enough to measure reliably.
+// The statistics are in nanoseconds per operation.
+template <typename TFunc>
+BenchmarkResult time_benchmark(const std::string& name, TFunc func, const Options& options, uint64_t opsPerCall = 1)
+{
+    const auto minSampleNs = static_cast<uint64_t>(options.minSampleMs * 1e6);
+
+    // Calibrate the number of calls per sample, this also warms up the caches.
+    uint64_t number = 1;
+    while (true)
+    {
+        const uint64_t elapsed = time_calls(func, number);
+        if (elapsed >= minSampleNs)
+            break;
+        number *= elapsed == 0 ? 2 : std::clamp<uint64_t>(minSampleNs / elapsed + 1, 2, 10);
+    }
+
+    std::vector<double> samples{};
+    for (uint32_t i = 0; i < options.warmup + options.repeats; i++)
+    {
+        const uint64_t elapsed = time_calls(func, number);
+        if (i >= options.warmup)
+            samples.push_back(static_cast<double>(elapsed) / static_cast<double>(number * opsPerCall));
+    }
+    std::sort(samples.begin(), samples.end());
+
+    return {name, percentile(samples, 0.5), percentile(samples, 0.75) - percentile(samples, 0.25), samples.front(),
+            static_cast<uint32_t>(samples.size()), number};
+}
+
+
+std::string format_ns(double ns)
+{
+    std::ostringstream stream{};
+    stream << std::fixed << std::setprecision(2);
+    if (ns >= 1e9)
+        stream << ns / 1e9 << " s";
+    else if (ns >= 1e6)
+        stream << ns / 1e6 << " ms";
+    else if (ns >= 1e3)
+        stream << ns / 1e3 << " us";
+    else
+        stream << std::setprecision(0) << ns << " ns";
+
+    return stream.str();
+}
+
+void write_json(std::ostream& out, const std::vector<BenchmarkResult>& results, const Options& options)
+{
+    out << "{\n  \"meta\": {\n"
+        << "    \"engine\": \"native\",\n"
+        << "    \"seed\": " << options.seed << ",\n"
+        << "    \"mctsSteps\": " << options.mctsSteps << "\n"
+        << "  },\n  \"results\": {";
+    for (size_t i = 0; i < results.size(); i++)
+    {
+        const auto& r = results[i];
+        out << (i > 0 ? "," : "") << "\n    \"" << r.name << "\": {"
+            << "\"medianNs\": " << r.medianNs << ", \"iqrNs\": " << r.iqrNs << ", \"minNs\": " << r.minNs
+            << ", \"samples\": " << r.samples << ", \"callsPerSample\": " << r.callsPerSample << "}";
+    }
+    out << "\n  }\n}\n";
+}
+
+
+int main(int argc, char** argv)
+{
+    Options options{};
+    try
+    {
+        options = parse_options(argc, argv);
+    }
+    catch (const std::exception& e)
+    {
+        std::cerr << e.what() << std::endl << Usage;
+        return 2;
+    }
+    if (options.help)
+    {
+        std::cout << Usage;
+        return 0;
+    }
+
+    Azul azul{};
+    // Shared by the benchmarks, but reseeded before each of them, so the runs are repeatable.
+    std::mt19937 engine{};
+    std::vector<BenchmarkResult> results{};
+    auto run = [&](const std::string& name, auto func, uint64_t opsPerCall = 1)
+    {
+        if (name.find(options.filter) == std::string::npos)
+            return;
+
+        engine.seed(options.seed);
+        results.push_back(time_benchmark(name, func, options, opsPerCall));
+        const auto& r = results.back();
+        std::cerr << std::left << std::setw(40) << name << std::right << std::setw(12) << format_ns(r.medianNs)
+                  << " +- " << std::setw(10) << format_ns(r.iqrNs) << " (IQR)" << std::endl;
+    };
+
+    for (const auto& [positionName, position] : build_positions(azul, options.seed))
+    {
+        const std::string prefix = "native/" + positionName + "/";
+        const Move move = azul.enumerate_moves(position.dealt).front();
+
+        run(prefix + "enumerate_moves", [&]() { sink += azul.enumerate_moves(position.dealt).size(); });
+        run(prefix + "apply_move", [&]() { sink += azul.apply_move(position.dealt, move, engine).state.nextPlayer; });
+        run(prefix + "deal_round", [&]() { sink += azul.deal_round(position.preDeal, {}, engine).bins[0][1]; });
+        run(prefix + "score_round", [&]() { sink += azul.score_round(position.roundEnd).players[0].score; });
+        run(prefix + "playout", [&]()
+            {
+                uint32_t moveCount = 0;
+                sink += azul.playout(position.dealt, moveCount, engine).players[0].score + moveCount;
+            });
+        // The searches start from scratch every time, the time is per step.
+        run(prefix + "mcts_step_n", [&]()
+            {
+                MctsBot bot{azul, position.dealt};
+                bot.seed(options.seed);
+                sink += bot.step_n(options.mctsSteps).sourceBin;
+            }, options.mctsSteps);
+    }
+
+    if (options.outputPath.empty())
+        write_json(std::cout, results, options);
+    else
+    {
+        std::ofstream file{options.outputPath};
+        write_json(file, results, options);
+    }
+
+    return 0;
+}
@@ -49,4 +49,10 @@ class Game(Generic[TState, TMove], metaclass=ABCMeta):
     @staticmethod
     @abstractmethod
     def get_init_state():
+        pass
+
+    def seed(self, seed: int):
+        """
+        Seed the game's own random generator, if it has one (i.e. doesn't draw from 'random' or 'numpy.random').
+        """
         pass
\ No newline at end of file
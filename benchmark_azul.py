@@ -1,6 +1,12 @@
+import functools
+import json
+import math
+import multiprocessing
 import operator
 import os
+import queue
 import random
+import time
 from datetime import datetime
 from pathlib import Path
 from typing import *
@@ -10,8 +16,9 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 
-from GridSearchManager import GridSearchManager
+from GridSearchManager import GridSearchManager, SuccessiveHalvingSearchManager
 from lib.StageTimer import StageTimer
+from lib.sprt import compute_sprt_llr, get_score_stats, score_to_elo
 
 from azulbot.azulsim import Azul, Move, AzulState
 from azulbot.azulsim import MctsBot as MctsBotCpp
@@ -70,18 +77,299 @@ class MctsBotWrapper:
         self.bot = self.botClass(azul, state,
                                  samplingWidth=self.samplingWidth, explorationWeight=self.explorationWeight)
 
+        # Seeded from the game's generator, to make the games repeatable.
+        if hasattr(self.bot, 'seed'):
+            self.bot.seed(random.getrandbits(32))
+
         for _ in range(self.budget):
             self.bot.step()
 
         return self.bot.get_best_move()
 
 
+class PlayerSpec(NamedTuple):
+    # One of 'random', 'greedy' or 'mcts'. The rest only applies to the MCTS bot.
+    kind: str
+    mctsBudget: int = 0
+    explorationWeight: float = 0
+    samplingWidth: int = 10
+    botClass: type = MctsBotCpp
+
+
+def build_player(spec: PlayerSpec):
+    if spec.kind == 'random':
+        return build_random_bot()
+    elif spec.kind == 'greedy':
+        return build_greedy_bot()
+    elif spec.kind == 'mcts':
+        return MctsBotWrapper(spec.mctsBudget, spec.samplingWidth, spec.explorationWeight, botClass=spec.botClass)
+
+    raise ValueError(f"Unknown player kind: '{spec.kind}'")
+
+
+def build_mcts_spec(config: Dict[str, Any], samplingWidth: int, botClass: type) -> PlayerSpec:
+    return PlayerSpec('mcts', config['mctsBudget'], config['explorationWeight'],
+                      config.get('samplingWidth', samplingWidth), botClass)
+
+
+class GameTask(NamedTuple):
+    configIndex: int
+    gameIndex: int
+    seed: int
+    players: Tuple[PlayerSpec, PlayerSpec]
+    maxRoundsPerGame: int
+    # Whether the second player takes the first seat. The results are still reported in the order of 'players'.
+    swapSeats: bool = False
+
+
+class GameResult(NamedTuple):
+    configIndex: int
+    gameIndex: int
+    # None if the game has timed out.
+    scores: Optional[Tuple[int, int]]
+    roundCount: int
+    # The decision time per move of the second player.
+    timePerMove: float
+    duration: float
+    timings: Dict[str, float]
+
+
+def play_game(task: GameTask) -> GameResult:
+    """
+    Play a single game between two bots. Runs in a worker process.
+    """
+    # Everything random in the game (dealing, the search) is derived from the game's seed.
+    # Games with the same seed get the same deals (as long as the bag contents allow).
+    random.seed(task.seed)
+    azul = Azul()
+    azul.seed(task.seed)
+
+    seats = [1, 0] if task.swapSeats else [0, 1]
+    players = [build_player(task.players[seats[0]]), build_player(task.players[seats[1]])]
+
+    timer = StageTimer()
+    timer.start_pass()
+
+    state = azul.get_init_state()
+
+    roundCount = 0
+    moveCount = 0
+    for _ in range(task.maxRoundsPerGame):
+        timer.start_stage('deal')
+        state = azul.deal_round(state)
+
+        while not azul.is_round_end(state):
+            seat = state.nextPlayer
+            # Only the second player's decisions are timed as 'decide', it's the one being evaluated.
+            timer.start_stage('decide' if seats[seat] == 1 else 'opponent')
+            move = players[seat](state)
+            timer.start_stage('move')
+            state = azul.apply_move_without_scoring(state, move).state
+            moveCount += 1 if seats[seat] == 1 else 0
+
+        timer.start_stage('score')
+        state = azul.score_round(state)
+        roundCount += 1
+
+        if azul.is_game_end(state):
+            state = azul.score_game(state)
+            break
+
+    timer.end_pass()
+    timings = timer.get_pass_timings()
+
+    scores = None
+    if azul.is_game_end(state):
+        seatScores = [state.players[0].score, state.players[1].score]
+        scores = (seatScores[seats.index(0)], seatScores[seats.index(1)])
+
+    return GameResult(task.configIndex, task.gameIndex, scores, roundCount,
+                      timings.get('decide', 0) / max(moveCount, 1), timer.get_pass_duration(), timings)
+
+
+class SprtConfig(NamedTuple):
+    # The hypotheses about the Elo difference of the candidate over the baseline: H0 'elo <= elo0', H1 'elo >= elo1'.
+    elo0: float = 0
+    elo1: float = 50
+    # The false positive and false negative rates.
+    alpha: float = 0.05
+    beta: float = 0.05
+    # Stop undecided after this many games.
+    maxGames: int = 1000
+
+
+class MatchResult(NamedTuple):
+    wins: int
+    draws: int
+    losses: int
+    llr: float
+    # 'H1' if the candidate is stronger, 'H0' if it isn't, None if undecided.
+    decision: Optional[str]
+    eloEstimate: float
+    eloError: float
+
+
+def run_sprt_match(candidate: PlayerSpec, baseline: PlayerSpec, sprt: SprtConfig, maxRoundsPerGame: int,
+                   workerNumber: Optional[int] = None, seed: int = 0, configIndex: int = 0) -> MatchResult:
+    """
+    Play games between two bots until the SPRT accepts one of the hypotheses.
+    The games come in pairs that share the seed (so the deals), with the seats swapped.
+    """
+    workerNumber = workerNumber or multiprocessing.cpu_count()
+    lowerBound = math.log(sprt.beta / (1 - sprt.alpha))
+    upperBound = math.log((1 - sprt.beta) / sprt.alpha)
+    pairSeeds = np.random.SeedSequence(seed).generate_state((sprt.maxGames + 1) // 2)
+
+    results = queue.Queue()  # type: queue.Queue
+
+    def make_task(gameIndex: int) -> GameTask:
+        return GameTask(configIndex, gameIndex, int(pairSeeds[gameIndex // 2]), (candidate, baseline),
+                        maxRoundsPerGame, swapSeats=gameIndex % 2 == 1)
+
+    wins, draws, losses = 0, 0, 0
+    llr, decision = 0.0, None
+    # The pool is dropped as soon as the test is decided, cancelling the games still in progress.
+    with multiprocessing.Pool(workerNumber) as pool:
+        # Keep every worker busy, with a couple of games queued.
+        submittedCount = 0
+        for _ in range(min(2 * workerNumber, sprt.maxGames)):
+            pool.apply_async(play_game, (make_task(submittedCount),), callback=results.put, error_callback=results.put)
+            submittedCount += 1
+
+        finishedCount = 0
+        while finishedCount < submittedCount:
+            result = results.get()
+            finishedCount += 1
+            if isinstance(result, BaseException):
+                raise result
+
+            if result.scores is not None:
+                if result.scores[0] > result.scores[1]:
+                    wins += 1
+                elif result.scores[0] < result.scores[1]:
+                    losses += 1
+                else:
+                    draws += 1
+
+            llr = compute_sprt_llr(wins, draws, losses, sprt.elo0, sprt.elo1)
+            print(f"Game {result.gameIndex}: W/D/L {wins}/{draws}/{losses}, "
+                  f"LLR {llr:.2f} [{lowerBound:.2f}, {upperBound:.2f}]")
+            if llr >= upperBound or llr <= lowerBound:
+                decision = 'H1' if llr >= upperBound else 'H0'
+                break
+
+            if submittedCount < sprt.maxGames:
+                pool.apply_async(play_game, (make_task(submittedCount),), callback=results.put,
+                                 error_callback=results.put)
+                submittedCount += 1
+
+    score, variance, n = get_score_stats(wins, draws, losses)
+    # The 95% confidence interval, propagated from the score to the Elo scale.
+    scoreError = 1.96 * math.sqrt(variance / max(n, 1))
+    eloError = (score_to_elo(score + scoreError) - score_to_elo(score - scoreError)) / 2
+
+    return MatchResult(wins, draws, losses, llr, decision, score_to_elo(score), eloError)
+
+
+def run_sprt_mode(configs: List[Dict[str, Any]], baseline: PlayerSpec, sprt: SprtConfig,
+                  samplingWidth: int, botClass: type, maxRoundsPerGame: int,
+                  workerNumber: Optional[int], seed: int, outDirPath: Path):
+    """
+    Test each configuration of the MCTS bot against the baseline bot, spending only as many games as needed.
+    """
+    resultRows = []
+    for iConfig, config in enumerate(configs):
+        print(f"Config: {config}")
+        candidate = build_mcts_spec(config, samplingWidth, botClass)
+        # Every configuration plays on the same deals.
+        match = run_sprt_match(candidate, baseline, sprt, maxRoundsPerGame, workerNumber, seed, iConfig)
+
+        decisionStr = {'H1': 'stronger', 'H0': 'not stronger', None: 'undecided'}[match.decision]
+        print(f"Result: {decisionStr} after {match.wins + match.draws + match.losses} games, "
+              f"W/D/L {match.wins}/{match.draws}/{match.losses}, "
+              f"Elo {match.eloEstimate:+.0f} ± {match.eloError:.0f}")
+        resultRows.append({**config, **match._asdict()})
+
+    resultTable = pd.DataFrame(resultRows)
+    print(resultTable)
+
+    dateStr = datetime.now().strftime("%y%m%d-%H%M%S")
+    resultTable.to_csv(outDirPath / f'{dateStr}_sprt.csv', sep='\t')
+
+
+def evaluate_config(config: Dict[str, Any], searchPoint: Dict[str, Any], runName: str,
+                    baseline: PlayerSpec, samplingWidth: int, botClass: type, maxRoundsPerGame: int,
+                    workerNumber: Optional[int], seed: int,
+                    gameCache: Optional[Dict[Tuple[str, int], GameResult]] = None) -> Dict[str, float]:
+    """
+    Play 'config['gamesToPlay']' games of the MCTS bot against the baseline, the target function of the searches.
+    The deals only depend on the seed and the game index, so all the configurations play the same games,
+    and a larger number of games extends a smaller one.
+    The games found in the cache (keyed by the rest of the config and the game index) aren't played again.
+    """
+    gameCache = gameCache if gameCache is not None else {}
+    gamesToPlay = config['gamesToPlay']
+    configKey = json.dumps({k: v for k, v in config.items() if k != 'gamesToPlay'}, sort_keys=True, default=str)
+    gameSeeds = np.random.SeedSequence(seed).generate_state(gamesToPlay)
+    tasks = [GameTask(0, iGame, int(gameSeeds[iGame]), (baseline, build_mcts_spec(config, samplingWidth, botClass)),
+                      maxRoundsPerGame)
+             for iGame in range(gamesToPlay) if (configKey, iGame) not in gameCache]
+
+    with multiprocessing.Pool(workerNumber) as pool:
+        for result in pool.imap_unordered(play_game, tasks):
+            gameCache[(configKey, result.gameIndex)] = result
+
+    results = [gameCache[(configKey, iGame)] for iGame in range(gamesToPlay)]
+    results = [r for r in results if r.scores is not None]
+    print(f"Played {len(tasks)} new games, reused {gamesToPlay - len(tasks)}.")
+
+    scoresArray = np.array([r.scores for r in results]).reshape((-1, 2))
+    wins = np.count_nonzero(scoresArray[:, 1] > scoresArray[:, 0])
+    draws = np.count_nonzero(scoresArray[:, 1] == scoresArray[:, 0])
+    print(f"Played {len(results)} games, W/D/L {wins}/{draws}/{len(results) - wins - draws}. Config: {config}")
+
+    return {
+        'winRate': (wins + 0.5 * draws) / max(len(results), 1),
+        'scoreDiff': float(np.mean(scoresArray[:, 1] - scoresArray[:, 0])) if len(results) > 0 else 0.0,
+        'timePerMove': float(np.mean([r.timePerMove for r in results])) if len(results) > 0 else 0.0
+    }
+
+
+def run_halving_mode(searchManager: SuccessiveHalvingSearchManager, baseline: PlayerSpec,
+                     samplingWidth: int, botClass: type, maxRoundsPerGame: int,
+                     workerNumber: Optional[int], seed: int, outDirPath: Path):
+    """
+    Spend a few games on every configuration, and more games only on the ones that keep winning.
+    """
+    targetFunc = functools.partial(evaluate_config, baseline=baseline, samplingWidth=samplingWidth,
+                                   botClass=botClass, maxRoundsPerGame=maxRoundsPerGame,
+                                   workerNumber=workerNumber, seed=seed, gameCache={})
+    # Each configuration parallelizes its own games, the runs are sequential (which also lets them share the cache,
+    # so a promoted configuration only plays the games beyond the previous rung).
+    runResults, _, _ = searchManager.run_search(targetFunc, resultsPath=str(outDirPath / 'halving_runs.jsonl'))
+
+    resultTable = pd.DataFrame([{**r.paramValues, **r.returnedValue} for r in runResults])
+    print(resultTable)
+
+    dateStr = datetime.now().strftime("%y%m%d-%H%M%S")
+    resultTable.to_csv(outDirPath / f'{dateStr}_halving.csv', sep='\t')
+
+
 def main():
     gamesToPlay = 30
     maxRoundsPerGame = 100
     samplingWidth = 10
     botClass = MctsBotCpp
     # botClass = MctsBotPy
+    # The games are played in parallel, by default on all the cores.
+    workerNumber = None  # type: Optional[int]
+    seed = 0
+    # Either play a fixed number of games per configuration ('tournament'),
+    # or stop as soon as a sequential test decides whether the configuration beats the baseline ('sprt'),
+    # or drop the weakest configurations after a few games and play more games with the rest ('halving').
+    mode = 'tournament'
+    sprt = SprtConfig(elo0=0, elo1=50, alpha=0.05, beta=0.05, maxGames=1000)
+    baseline = PlayerSpec('greedy')
 
     searchManager = GridSearchManager(defaultConfig={})
     # searchManager.add_param_axis('mctsBudget', [100, 1000, 10000, 100000, 300000])
@@ -92,60 +380,45 @@ def main():
     outDirPath = Path(os.environ['DEV_OUT_PATH']) / 'azul_bot' if 'DEV_OUT_PATH' in os.environ else Path.cwd()
     outDirPath.mkdir(parents=True, exist_ok=True)
 
-    resultRows = []
+    if mode == 'halving':
+        halvingManager = SuccessiveHalvingSearchManager(searchManager, 'gamesToPlay', minResource=4,
+                                                        maxResource=gamesToPlay, metricName='winRate',
+                                                        reductionFactor=3)
+        run_halving_mode(halvingManager, baseline, samplingWidth, botClass, maxRoundsPerGame,
+                         workerNumber, seed, outDirPath)
+        return
 
-    for config, _, _ in searchManager.generate_configuration():
-        azul = Azul()
-        # players = [build_random_bot(), build_mcts_bot(mctsBudget)]
-        players = [build_greedy_bot(),
-                   MctsBotWrapper(config['mctsBudget'], samplingWidth, config['explorationWeight'],
-                                  botClass=botClass)]
-        scores = []
-        timePerMove = []
-
-        timer = StageTimer()
-        for iGame in range(gamesToPlay):
-            timer.start_pass()
-
-            state = azul.get_init_state()
-
-            roundCount = 0
-            moveCount = 0
-            for _ in range(maxRoundsPerGame):
-                timer.start_stage('deal')
-                state = azul.deal_round(state)
-
-                while not azul.is_round_end(state):
-                    timer.start_stage('decide')
-                    move = players[state.nextPlayer](state)
-                    timer.start_stage('move')
-                    state = azul.apply_move_without_scoring(state, move).state
-                    moveCount += 1 if state.nextPlayer == 1 else 0
-
-                timer.start_stage('score')
-                state = azul.score_round(state)
-                roundCount += 1
-
-                if azul.is_game_end(state):
-                    state = azul.score_game(state)
-                    break
-
-            timer.end_stage()
-
-            if azul.is_game_end(state):
-                timer.end_pass()
-                dur = timer.get_pass_duration()
-                scores.append([state.players[0].score, state.players[1].score])
-                timePerMove.append(timer.get_pass_timings()['decide'] / moveCount)
-                print(f"Finished a game with scores {state.players[0].score}:{state.players[1].score}"
-                      f" in {roundCount} rounds and {dur:.2f} s.")
+    configs = [c.config for c in searchManager.generate_configuration()]
+    if mode == 'sprt':
+        run_sprt_mode(configs, baseline, sprt, samplingWidth, botClass, maxRoundsPerGame,
+                      workerNumber, seed, outDirPath)
+        return
+
+    resultRows = []
 
+    # Dispatch the games of all the configurations at once, so that no core waits for a configuration to finish.
+    gameSeeds = np.random.SeedSequence(seed).generate_state(len(configs) * gamesToPlay)
+    tasks = [GameTask(iConfig, iGame, int(gameSeeds[iConfig * gamesToPlay + iGame]),
+                      (PlayerSpec('greedy'), build_mcts_spec(config, samplingWidth, botClass)), maxRoundsPerGame)
+             for iConfig, config in enumerate(configs) for iGame in range(gamesToPlay)]
+
+    gameResults = [[] for _ in configs]  # type: List[List[GameResult]]
+    timeStart = time.time()
+    with multiprocessing.Pool(workerNumber) as pool:
+        # Results stream back in the order the games finish.
+        for result in pool.imap_unordered(play_game, tasks):
+            gameResults[result.configIndex].append(result)
+            if result.scores is not None:
+                print(f"Finished a game with scores {result.scores[0]}:{result.scores[1]}"
+                      f" in {result.roundCount} rounds and {result.duration:.2f} s. Config: {configs[result.configIndex]}")
             else:
-                print("Timed out playing a game.")
+                print(f"Timed out playing a game. Config: {configs[result.configIndex]}")
 
-        timer.end()
+    print(f"Played {len(tasks)} games in {time.time() - timeStart:.1f} s.")
 
-        scoresArray = np.array(scores)
+    for config, results in zip(configs, gameResults):
+        results = sorted((r for r in results if r.scores is not None), key=operator.attrgetter('gameIndex'))
+        scoresArray = np.array([r.scores for r in results])
         scoresAvg = scoresArray.mean(axis=0)
         winsFirst = np.count_nonzero(scoresArray[:, 0] > scoresArray[:, 1])
         winsSecond = np.count_nonzero(scoresArray[:, 0] < scoresArray[:, 1])
@@ -168,9 +441,13 @@ def main():
                 'isWin': scoresArray[i, 0] < scoresArray[i, 1]
             })
 
-        print(timer.get_total_report())
+        # The stage durations summed over the games, like the timer's total report.
+        stageNames = dict.fromkeys(name for r in results for name in r.timings)
+        print(f"Config: {config}")
+        print(', '.join('{}: {:.3f} s'.format(name, sum(r.timings.get(name, 0) for r in results))
+                        for name in stageNames))
         print("Average scores: {:.1f} {:.1f}".format(*tuple(scoresAvg)))
-        print("Average time per move: {:.1f}".format(np.mean(np.array(timePerMove))))
+        print("Average time per move: {:.1f}".format(np.mean(np.array([r.timePerMove for r in results]))))
         print("Wins: {} vs {}".format(winsFirst, winsSecond))
 
     print("Plotting.")
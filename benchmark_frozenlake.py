@@ -40,11 +40,13 @@ def main():
     scores = []
     rounds = []
 
+    # The transition table is extracted once, and shared by all the games.
+    game = FrozenLake()
+
     timer = StageTimer()
     for iGame in range(gamesToPlay):
         timer.start_pass()
 
-        game = FrozenLake()
         state = game.get_init_state()
 
         roundCount = 0
@@ -1,71 +1,224 @@
+import argparse
+import json
+import platform
+import sys
 import time
+from datetime import datetime
+from typing import *
+
+import numpy as np
 
 from azulbot.azulpy import Azul as AzulPy
-from azulbot.azulsim import Azul as AzulCpp
-
-
-repeats = 10000
-print("Timing enumerate_moves.")
-
-azul = AzulPy()
-timeBefore = time.time()
-for _ in range(repeats):
-    s = azul.enumerate_moves()
-timeAfter = time.time()
-
-print(f"Python finished in {timeAfter - timeBefore:.3f} s.")
-
-
-azul = AzulCpp()
-state = azul.get_init_state()
-timeBefore = time.time()
-for _ in range(repeats):
-    s = azul.enumerate_moves(state)
-timeAfter = time.time()
-
-print(f"C++ finished in {timeAfter - timeBefore:.3f} s.")
-# ---------------------------------
-print("Timing apply_move")
-
-azul = AzulPy()
-azul.deal_round()
-move = azul.enumerate_moves()[0]
-timeBefore = time.time()
-for _ in range(repeats):
-    s = azul.apply_move(move)
-timeAfter = time.time()
-
-print(f"Python finished in {timeAfter - timeBefore:.3f} s.")
-
-azul = AzulCpp()
-state = azul.get_init_state()
-state = azul.deal_round(state)
-move = azul.enumerate_moves(state)[0]
-timeBefore = time.time()
-for _ in range(repeats):
-    s = azul.apply_move_without_scoring(state, move)
-timeAfter = time.time()
-
-print(f"C++ finished in {timeAfter - timeBefore:.3f} s.")
-
-# ---------------------------------
-print("Timing playout")
-
-repeats = 1000
-azul = AzulPy()
-timeBefore = time.time()
-for _ in range(repeats):
-    a = azul.copy()
-    s = a.playout()
-timeAfter = time.time()
-
-print(f"Python finished in {timeAfter - timeBefore:.3f} s.")
-
-azul = AzulCpp()
-state = azul.get_init_state()
-timeBefore = time.time()
-for _ in range(repeats):
-    s = azul.playout(state)
-timeAfter = time.time()
-
-print(f"C++ finished in {timeAfter - timeBefore:.3f} s.")
+from azulbot.azulsim import Azul as AzulCpp, AzulState, MctsBot as MctsBotCpp
+from mcts_bot import MctsBot as MctsBotPy
+
+
+class Position(NamedTuple):
+    # The same round at three points: before dealing, right after dealing and at the end before scoring.
+    preDeal: AzulPy
+    dealt: AzulPy
+    roundEnd: AzulPy
+
+
+def build_positions(seed: int = 0) -> Dict[str, Position]:
+    """
+    Play a seeded random game with the Python engine, and pick an opening, a midgame and an endgame round.
+    The C++ engine gets the same positions through the shared packed layout.
+    """
+    AzulPy.seed(seed)
+    rng = np.random.default_rng(seed)
+
+    rounds = []
+    azul = AzulPy()
+    while not azul.is_game_end():
+        preDeal = azul.copy()
+        azul.deal_round()
+        dealt = azul.copy()
+        while not azul.is_round_end():
+            moves = azul.enumerate_moves()
+            azul = azul.apply_move(moves[rng.integers(len(moves))]).state
+        rounds.append(Position(preDeal, dealt, azul.copy()))
+        azul.score_round()
+
+    return {
+        'opening': rounds[0],
+        'midgame': rounds[len(rounds) // 2],
+        'endgame': rounds[-1]
+    }
+
+
+def to_cpp(state: AzulPy) -> AzulState:
+    return AzulState.from_numpy(state.to_numpy())
+
+
+def build_benchmarks(positions: Dict[str, Position],
+                     mctsSteps: int) -> Dict[str, Callable[[], Any]]:
+    azulCpp = AzulCpp()
+    benchmarks = {}
+    for name, position in positions.items():
+        dealt, preDeal, roundEnd = position.dealt, position.preDeal, position.roundEnd
+        move = dealt.enumerate_moves()[0]
+
+        # The Python engine mutates in place, so those benchmarks include a (cheap, single buffer) copy.
+        benchmarks.update({
+            f'py/{name}/enumerate_moves': dealt.enumerate_moves,
+            f'py/{name}/apply_move': lambda s=dealt, m=move: s.apply_move(m),
+            f'py/{name}/deal_round': lambda s=preDeal: s.copy().deal_round(),
+            f'py/{name}/score_round': lambda s=roundEnd: s.copy().score_round(),
+            f'py/{name}/playout': lambda s=dealt: s.copy().playout(),
+        })
+
+        dealtCpp, preDealCpp, roundEndCpp = to_cpp(dealt), to_cpp(preDeal), to_cpp(roundEnd)
+        moveCpp = azulCpp.enumerate_moves(dealtCpp)[0]
+        benchmarks.update({
+            f'cpp/{name}/enumerate_moves': lambda s=dealtCpp: azulCpp.enumerate_moves(s),
+            f'cpp/{name}/apply_move': lambda s=dealtCpp, m=moveCpp: azulCpp.apply_move(s, m),
+            f'cpp/{name}/deal_round': lambda s=preDealCpp: azulCpp.deal_round(s),
+            f'cpp/{name}/score_round': lambda s=roundEndCpp: azulCpp.score_round(s),
+            f'cpp/{name}/playout': lambda s=dealtCpp: azulCpp.playout(s),
+        })
+
+        # The searches start from scratch every time, a step is one selection-expansion-playout-backprop pass.
+        def mcts_cpp(s=dealtCpp):
+            MctsBotCpp(azulCpp, s).step_n(mctsSteps)
+
+        def mcts_py(s=dealtCpp):
+            bot = MctsBotPy(azulCpp, s, samplingWidth=10)
+            for _ in range(mctsSteps):
+                bot.step()
+
+        benchmarks[f'cpp/{name}/mcts_step_n'] = mcts_cpp
+        benchmarks[f'py/{name}/mcts_step_n'] = mcts_py
+
+    return benchmarks
+
+
+def time_benchmark(func: Callable[[], Any], repeats: int, warmup: int, minSampleNs: int,
+                   opsPerCall: int = 1) -> Dict[str, float]:
+    """
+    Time a function, repeating the calls within each sample until it's long enough to measure reliably.
+
+    :return: Statistics over the samples, in nanoseconds per operation.
+    """
+    # Calibrate the number of calls per sample, this also warms up the caches (and the jit).
+    number = 1
+    while True:
+        timeBefore = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter_ns() - timeBefore
+        if elapsed >= minSampleNs:
+            break
+        number *= 2 if elapsed == 0 else max(2, min(10, int(minSampleNs / elapsed) + 1))
+
+    samples = []
+    for iSample in range(warmup + repeats):
+        timeBefore = time.perf_counter_ns()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter_ns() - timeBefore
+        if iSample >= warmup:
+            samples.append(elapsed / (number * opsPerCall))
+
+    q25, median, q75 = np.percentile(samples, [25, 50, 75])
+
+    return {
+        'medianNs': float(median),
+        'iqrNs': float(q75 - q25),
+        'minNs': float(np.min(samples)),
+        'samples': len(samples),
+        'callsPerSample': number
+    }
+
+
+def compare_results(results: Dict[str, Dict[str, float]], baseline: Dict[str, Dict[str, float]],
+                    threshold: float) -> List[str]:
+    """
+    Print the change of each benchmark relative to the baseline.
+
+    :return: The names of the benchmarks that became slower by more than the threshold (and than the noise).
+    """
+    regressions = []
+    print(f"{'benchmark':40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, stats in results.items():
+        if name not in baseline:
+            print(f"{name:40} {'-':>12} {format_ns(stats['medianNs']):>12}")
+            continue
+
+        base = baseline[name]
+        ratio = stats['medianNs'] / base['medianNs']
+        # Don't flag the differences that are within the spread of the measurements.
+        noise = max(stats['iqrNs'], base['iqrNs'])
+        isRegression = ratio > 1 + threshold and stats['medianNs'] - base['medianNs'] > noise
+        if isRegression:
+            regressions.append(name)
+
+        flag = '  REGRESSION' if isRegression else ''
+        print(f"{name:40} {format_ns(base['medianNs']):>12} {format_ns(stats['medianNs']):>12} "
+              f"{(ratio - 1) * 100:+7.1f}%{flag}")
+
+    return regressions
+
+
+def format_ns(ns: float) -> str:
+    for unit, scale in (('s', 1e9), ('ms', 1e6), ('us', 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+
+    return f"{ns:.0f} ns"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Python and C++ engines on representative positions.")
+    parser.add_argument('--output', type=str, default=None, help="Write the results to a JSON file.")
+    parser.add_argument('--compare', type=str, default=None,
+                        help="A JSON file with baseline results, exit with an error on regressions.")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="The relative slowdown of the median that counts as a regression.")
+    parser.add_argument('--filter', type=str, default='', help="Only run the benchmarks containing this string.")
+    parser.add_argument('--repeats', type=int, default=15)
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--min-sample-ms', type=float, default=20)
+    parser.add_argument('--mcts-steps', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    positions = build_positions(args.seed)
+    benchmarks = build_benchmarks(positions, args.mcts_steps)
+
+    results = {}
+    for name, func in benchmarks.items():
+        if args.filter not in name:
+            continue
+
+        opsPerCall = args.mcts_steps if name.endswith('mcts_step_n') else 1
+        stats = time_benchmark(func, args.repeats, args.warmup, int(args.min_sample_ms * 1e6), opsPerCall)
+        results[name] = stats
+        print(f"{name:40} {format_ns(stats['medianNs']):>12} ± {format_ns(stats['iqrNs']):>10} (IQR)")
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            json.dump({
+                'meta': {
+                    'date': datetime.now().isoformat(),
+                    'python': sys.version,
+                    'platform': platform.platform(),
+                    'processor': platform.processor(),
+                    'args': vars(args)
+                },
+                'results': results
+            }, file, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)['results']
+
+        print()
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"Found {len(regressions)} regression(s).")
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,10 @@
-import copy
+import bisect
 import random
 from dataclasses import dataclass
 from typing import *
 
 import gym
+import numpy as np
 from gym.envs.registration import register
 
 from azulbot import Game, MoveOutcome, GameState
@@ -29,49 +30,100 @@ class State(GameState):
 
 
 class FrozenLake(Game[State, Move]):
-
-    def __init__(self):
-        self.env = gym.make('FrozenLakeNotSlippery-v0')
-        self.isTerminalMap = {0: False}  # type: Dict[int, bool]
-        self.scoreMap = {0: 0}  # type: Dict[int, float]
+    """
+    The game is answered from the transition table of the gym env, extracted once at construction.
+    The outcomes of each (state, action) are padded to the same number, with zero probabilities.
+    """
+
+    def __init__(self, envName: str = 'FrozenLakeNotSlippery-v0'):
+        env = gym.make(envName)
+        # Maps each state and action to a list of (probability, next state, reward, done) tuples.
+        transitions = env.unwrapped.P  # type: Dict[int, Dict[int, List[Tuple[float, int, float, bool]]]]
+
+        self.stateNumber = len(transitions)
+        self.actionNumber = len(transitions[0])
+        outcomeNumber = max(len(outcomes) for actions in transitions.values() for outcomes in actions.values())
+
+        self.nextStates = np.zeros((self.stateNumber, self.actionNumber, outcomeNumber), dtype=np.int64)
+        self.cumulativeProbs = np.ones((self.stateNumber, self.actionNumber, outcomeNumber), dtype=np.float64)
+        # Gym only tells if a transition ends the episode, and what reward it gives. Attribute these to the states.
+        self.isTerminal = np.zeros(self.stateNumber, dtype=np.bool_)
+        self.scores = np.zeros(self.stateNumber, dtype=np.float64)
+        for s, actions in transitions.items():
+            for a, outcomes in actions.items():
+                # Pad by repeating the last outcome, it's never sampled.
+                self.nextStates[s, a, :] = outcomes[-1][1]
+                self.cumulativeProbs[s, a, :len(outcomes)] = np.cumsum([p for p, _, _, _ in outcomes])
+                for i, (_, nextState, reward, done) in enumerate(outcomes):
+                    self.nextStates[s, a, i] = nextState
+                    self.isTerminal[nextState] |= done
+                    self.scores[nextState] = max(self.scores[nextState], reward)
+
+        # On slippery ice, the moves have several outcomes.
+        self.isStochastic = outcomeNumber > 1
+
+        # Single playouts walk the same tables as plain lists, indexing NumPy arrays one element at a time is slower.
+        self._nextStatesList = self.nextStates.tolist()
+        self._cumulativeProbsList = self.cumulativeProbs.tolist()
+        self._isTerminalList = self.isTerminal.tolist()
 
     def enumerate_moves(self, state: State) -> List[Move]:
-        return [Move(d) for d in (0, 1, 2, 3)]
+        return [Move(d) for d in range(self.actionNumber)]
 
     def apply_move(self, state: State, move: Move) -> MoveOutcome[State]:
-        self.env.reset()
-        self.env.s = state.s
-
-        s, reward, isEnd, _ = self.env.step(move.d)
-
-        self.isTerminalMap[s] = isEnd
-        self.scoreMap[s] = reward
+        if not self.isStochastic:
+            s = int(self.nextStates[state.s, move.d, 0])
+        else:
+            outcomeIndex = np.searchsorted(self.cumulativeProbs[state.s, move.d], random.random(), side='right')
+            s = int(self.nextStates[state.s, move.d, min(outcomeIndex, self.nextStates.shape[2] - 1)])
 
-        return MoveOutcome(State(s), False, isEnd)
+        return MoveOutcome(State(s), self.isStochastic, bool(self.isTerminal[s]))
 
     def playout(self, state: State) -> State:
-        players = [lambda s: Move(random.choice((0, 1, 2, 3)))]
-
-        isEnd = False
-        while not isEnd:
-            outcome = self.apply_move(state, players[0](state))
-            state = outcome.state
-            isEnd = outcome.isEnd
-
-        return state
+        s = state.s
+        lastOutcome = self.nextStates.shape[2] - 1
+        while not self._isTerminalList[s]:
+            a = random.randrange(self.actionNumber)
+            outcomeIndex = 0
+            if self.isStochastic:
+                outcomeIndex = min(bisect.bisect_right(self._cumulativeProbsList[s][a], random.random()), lastOutcome)
+            s = self._nextStatesList[s][a][outcomeIndex]
+
+        return State(s)
+
+    def playout_batch(self, states: np.ndarray, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+        """
+        Play many random games at once, moving all the unfinished ones every iteration.
+
+        :param states: The starting state indices.
+        :param rng: The random generator to use, a new one is created if not given.
+        :return: The terminal state indices.
+        """
+        rng = rng or np.random.default_rng(random.getrandbits(32))
+        states = np.array(states, dtype=np.int64)
+
+        active = np.flatnonzero(~self.isTerminal[states])
+        while len(active) > 0:
+            s = states[active]
+            actions = rng.integers(0, self.actionNumber, size=len(active))
+            # Pick the outcome whose cumulative probability first exceeds a uniform sample.
+            samples = rng.random(len(active))
+            outcomeIndices = np.sum(self.cumulativeProbs[s, actions] <= samples[:, np.newaxis], axis=1)
+            outcomeIndices = np.minimum(outcomeIndices, self.nextStates.shape[2] - 1)
+
+            states[active] = self.nextStates[s, actions, outcomeIndices]
+            active = active[~self.isTerminal[states[active]]]
+
+        return states
 
     def is_game_end(self, state: State) -> bool:
-        # Hacky way of evaluating if a state is terminal and its score. Gym doesn't allow for it.
-        if state.s in self.isTerminalMap:
-            return self.isTerminalMap[state.s]
-        else:
-            raise RuntimeError(f"Haven't encountered state {state.s}, don't know if it is terminal.")
+        return bool(self.isTerminal[state.s])
 
     def get_score(self, state: State, playerIndex: int) -> float:
-        if state.s in self.scoreMap:
-            return self.scoreMap[state.s]
-        else:
-            raise RuntimeError(f"Haven't encountered state {state.s}, don't know it's score.")
+        return float(self.scores[state.s])
+
+    def get_next_player(self, state: State) -> int:
+        return 0
 
     @staticmethod
     def get_init_state():
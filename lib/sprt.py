@@ -0,0 +1,38 @@
+import math
+from typing import *
+
+
+def elo_to_score(elo: float) -> float:
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def score_to_elo(score: float) -> float:
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def get_score_stats(wins: int, draws: int, losses: int) -> Tuple[float, float, int]:
+    """
+    Compute the mean and the per-game variance of the candidate's score (1 for a win, 0.5 for a draw).
+    Half a win and half a loss are added, so that one-sided results have a nonzero variance.
+    """
+    w, d, l = wins + 0.5, draws, losses + 0.5
+    n = w + d + l
+    score = (w + d / 2) / n
+    variance = (w * (1 - score) ** 2 + d * (0.5 - score) ** 2 + l * score ** 2) / n
+
+    return score, variance, wins + draws + losses
+
+
+def compute_sprt_llr(wins: int, draws: int, losses: int, elo0: float, elo1: float) -> float:
+    """
+    The log-likelihood ratio of H1 to H0 of the generalized SPRT for win/draw/loss outcomes,
+    using the normal approximation of the score distribution (as done by Fishtest).
+    """
+    score, variance, n = get_score_stats(wins, draws, losses)
+    if n == 0:
+        return 0.0
+
+    s0, s1 = elo_to_score(elo0), elo_to_score(elo1)
+
+    return n * (s1 - s0) * (2 * score - s0 - s1) / (2 * variance)
@@ -1,15 +1,51 @@
 import copy
 import math
+import multiprocessing
 import random
 from typing import *
 
-from azulbot import Game, GameState, TMove
+import numpy as np
+from numba import jit
+
+from azulbot import Game, GameState, MoveOutcome, TMove
+
+
+def _get_winner(game: Game, terminalState: GameState) -> Optional[int]:
+    # Only a clear win and loss of two players is a proven result, draws and other scores are not.
+    # Single-player games (e.g., FrozenLake) score the same for every player index, so they are never solved.
+    scores = game.get_score(terminalState, 0), game.get_score(terminalState, 1)
+    if scores == (1, 0):
+        return 0
+    if scores == (0, 1):
+        return 1
+
+    return None
+
+
+class _TerminalScores:
+    # The scores backed up through the tree, asked from the game lazily, once per player.
+
+    def __init__(self, game: Game, terminalState: Optional[GameState], winner: Optional[int] = None):
+        self.game = game
+        self.terminalState = terminalState
+        # Used instead of the state, when the node was solved without reaching the end.
+        self.winner = winner
+        self.scores = {}  # type: Dict[int, float]
+
+    def get(self, playerIndex: int) -> float:
+        if playerIndex not in self.scores:
+            if self.terminalState is not None:
+                self.scores[playerIndex] = self.game.get_score(self.terminalState, playerIndex)
+            else:
+                self.scores[playerIndex] = float(playerIndex == self.winner)
+
+        return self.scores[playerIndex]
 
 
 class Node:
 
     def __init__(self, state: Optional[GameState], move: Optional[TMove], parent: Optional['Node'],
-                 isRandom: bool = False):
+                 isRandom: bool = False, isEnd: bool = False, player: Optional[int] = None):
         self.state = state
         self.move = move
         self.parent = parent
@@ -18,6 +54,12 @@ class Node:
         self.plays = 0
 
         self.isRandom = isRandom
+        # Taken from the move outcome, so that we don't have to ask the game again.
+        self.isEnd = isEnd
+        # The player whose move led to this node.
+        self.player = player
+        # The winner, if it's known for sure: the node is a terminal win and loss, or solved from its children.
+        self.winner = None  # type: Optional[int]
 
 
 class MctsBot:
@@ -26,16 +68,18 @@ class MctsBot:
                  samplingWidth: int = 10, explorationWeight: float = 1 / 1.4142):
 
         self.game = game
-        self.root = Node(state.copy(), move=None, parent=None)
+        self.root = Node(state.copy(), move=None, parent=None, isEnd=game.is_game_end(state))
+        if self.root.isEnd:
+            self.root.winner = _get_winner(game, self.root.state)
         self.playerIndex = self.game.get_next_player(state)
         self.samplingWidth = samplingWidth
         self.explorationWeight = explorationWeight
 
     def step(self):
 
-        # Select a leaf node according to UCT.
+        # Select a leaf node according to UCT. Stop at the nodes with a known result.
         node = self.root
-        while len(node.children) > 0:
+        while len(node.children) > 0 and node.winner is None:
             if node.plays == 0 and not node.isRandom:  # Can happen on the first run.
                 break
 
@@ -44,7 +88,7 @@ class MctsBot:
                 if len(node.children) < self.samplingWidth:
                     newRandomOutcome = self.game.apply_move(node.parent.state, node.move)
                     assert newRandomOutcome.isRandom
-                    newChild = Node(newRandomOutcome.state, None, node, isRandom=False)
+                    newChild = self._build_node(newRandomOutcome, None, node, node.player)
                     node.children.append(newChild)
                     node = newChild
                 else:
@@ -53,55 +97,75 @@ class MctsBot:
                 node = self._select_max_uct(node.children, node.plays)
 
         # If the node represents a terminal state, we don't need to expand it.
-        if not self.game.is_game_end(node.state):  # todo can't we cache this as a flag?
+        if not node.isEnd and node.winner is None:
             # Otherwise, expand the node, appending all possible states, and playout a random new child.
             assert len(node.children) == 0
+            player = self.game.get_next_player(node.state)
             for move in self.game.enumerate_moves(node.state):
                 outcome = self.game.apply_move(node.state, move)
                 if not outcome.isRandom:
-                    node.children.append(Node(outcome.state, move, node))
+                    node.children.append(self._build_node(outcome, move, node, player))
                 else:
                     # Create a special random node, whose children are the possible outcomes of the same move.
-                    randomNode = Node(None, move, node, isRandom=True)
+                    randomNode = Node(None, move, node, isRandom=True, player=player)
                     node.children.append(randomNode)
-                    randomNode.children.append(Node(outcome.state, None, randomNode, isRandom=False))
+                    randomNode.children.append(self._build_node(outcome, None, randomNode, player))
 
-            node = random.choice(node.children)
-            if node.isRandom:
-                node = random.choice(node.children)
+            # Some of the moves might end the game, which can decide the node.
+            self._solve(node)
 
-        if not self.game.is_game_end(node.state):
-            # Do a playout.
-            terminalState = self.game.playout(node.state)
+            if node.winner is None:
+                node = random.choice(node.children)
+                if node.isRandom:
+                    node = random.choice(node.children)
 
+        if node.isEnd:
+            # We're already in the terminal state, just reuse it.
+            scores = _TerminalScores(self.game, node.state)
+        elif node.winner is not None:
+            # The result is already known.
+            scores = _TerminalScores(self.game, None, node.winner)
         else:
-            # We're already in the terminal state, just reuse the result.
-            terminalState = node.state
-
-        # todo We're not handling draws here.
-        winnerIndex = self.game.get_score(terminalState, 0) >= self.game.get_score(terminalState, 1)
+            # Do a playout.
+            scores = _TerminalScores(self.game, self.game.playout(node.state))
 
         # Update the parents.
         while True:
             node.plays += 1
             if node.parent is None:
                 break
-            # Count the wins fro mthe perspective of the player whose move led to this node.
-            prevState = node.parent.state if not node.parent.isRandom else node.parent.parent.state
-            node.wins += int(self.game.get_next_player(prevState) == winnerIndex)
+            # Count the score of the player whose move led to this node.
+            node.wins += scores.get(node.player)
             node = node.parent
 
     def get_best_move(self):
         if len(self.root.children) == 0:
             raise RuntimeError("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?")
 
-        node = max(self.root.children, key=lambda n: n.wins / (n.plays + 0.001))
+        def _get_value(n: Node) -> float:
+            # Trust the proven results over the estimates.
+            if n.winner is not None:
+                return math.inf if n.winner == n.player else -math.inf
+
+            return n.wins / (n.plays + 0.001)
+
+        node = max(self.root.children, key=_get_value)
 
         return node.move
 
+    def get_root_stats(self) -> Tuple[List[TMove], np.ndarray, np.ndarray]:
+        # The moves, plays and wins of the root children, in the 'enumerate_moves' order.
+        return ([n.move for n in self.root.children],
+                np.array([n.plays for n in self.root.children], dtype=np.int64),
+                np.array([n.wins for n in self.root.children], dtype=np.float64))
+
     def _select_max_uct(self, nodes: Sequence[Node], parentPlays: int):
         bestIndices, bestVal = [], -1
         for i, node in enumerate(nodes):
+            # Never go into a proven loss. (There's no proven win, or the parent would be decided.)
+            if node.winner is not None and node.winner != node.player:
+                continue
+
             if node.plays == 0:
                 return node
 
@@ -114,3 +178,343 @@ class MctsBot:
                 bestIndices.append(i)
 
         return nodes[random.choice(bestIndices)]
+
+    def _build_node(self, outcome: MoveOutcome, move: Optional[TMove], parent: Node, player: int) -> Node:
+        node = Node(outcome.state, move, parent, isEnd=outcome.isEnd, player=player)
+        if outcome.isEnd:
+            node.winner = _get_winner(self.game, outcome.state)
+
+        return node
+
+    @staticmethod
+    def _solve(node: Node):
+        # Decide the node from its children, like in MCTS-Solver, and pass the result up as long as it decides more.
+        # The player to move wins if any move wins, and loses if all of them lose.
+        # The random nodes are never decided, their outcomes are only sampled.
+        while node is not None and node.winner is None and not node.isRandom and len(node.children) > 0:
+            mover = node.children[0].player
+            if any(child.winner == mover for child in node.children):
+                node.winner = mover
+            elif all(child.winner is not None for child in node.children):
+                node.winner = node.children[0].winner
+            else:
+                break
+
+            node = node.parent
+
+
+class ArrayMctsBot:
+    """
+    Same search as 'MctsBot', but the tree lives in flat NumPy arrays instead of node objects.
+    The children of a node are stored contiguously, and the sampled outcomes of a random node in a row of a table.
+    Selection and backpropagation run in jitted kernels over the arrays, only the game calls stay in Python.
+    """
+
+    def __init__(self, game: Game[GameState, TMove], state: GameState,
+                 samplingWidth: int = 10, explorationWeight: float = 1 / 1.4142, initialCapacity: int = 1024):
+
+        self.game = game
+        self.playerIndex = self.game.get_next_player(state)
+        self.samplingWidth = samplingWidth
+        self.explorationWeight = explorationWeight
+        # The scores of the players seen so far are backed up after every playout.
+        self.playerNumber = self.playerIndex + 1
+        # The kernels have their own random generator, seeded from 'random' to keep the searches reproducible.
+        self._rngState = np.array([random.getrandbits(64) | 1], dtype=np.uint64)
+
+        # Node stats and links, grown geometrically.
+        self.nodeCount = 0
+        self.wins = np.zeros(initialCapacity, dtype=np.float64)
+        self.plays = np.zeros(initialCapacity, dtype=np.int64)
+        self.parent = np.zeros(initialCapacity, dtype=np.int32)
+        self.firstChild = np.zeros(initialCapacity, dtype=np.int32)
+        self.childCount = np.zeros(initialCapacity, dtype=np.int32)
+        # The player whose move led to the node.
+        self.player = np.zeros(initialCapacity, dtype=np.int32)
+        self.isRandom = np.zeros(initialCapacity, dtype=np.bool_)
+        self.isEnd = np.zeros(initialCapacity, dtype=np.bool_)
+        # The row of the outcome table of each random node, -1 for the others.
+        self.outcomeRow = np.zeros(initialCapacity, dtype=np.int32)
+        # The Python objects are kept in lists, random nodes don't have a state.
+        self.states = []  # type: List[Optional[GameState]]
+        self.moves = []  # type: List[Optional[TMove]]
+
+        # The sampled outcomes of the random nodes, one row each.
+        self.outcomeRowCount = 0
+        self.outcomes = np.zeros((max(initialCapacity // samplingWidth, 1), samplingWidth), dtype=np.int32)
+        self.outcomeCount = np.zeros(len(self.outcomes), dtype=np.int32)
+
+        self.root = self._add_nodes(1)
+        self.parent[self.root] = -1
+        self.outcomeRow[self.root] = -1
+        self.states[self.root] = state.copy()
+        self.isEnd[self.root] = game.is_game_end(state)
+
+    def step(self):
+
+        # Select a leaf node according to UCT.
+        node = _select_leaf(self.root, self.wins, self.plays, self.firstChild, self.childCount, self.isRandom,
+                            self.outcomeRow, self.outcomes, self.outcomeCount, self.samplingWidth,
+                            self.explorationWeight, self._rngState)
+
+        if self.isRandom[node]:
+            # The selection stopped at a random node below the sampling width, generate a new outcome.
+            outcome = self.game.apply_move(self.states[self.parent[node]], self.moves[node])
+            assert outcome.isRandom
+            node = self._add_outcome(node, outcome)
+
+        # If the node represents a terminal state, we don't need to expand it.
+        elif not self.isEnd[node]:
+            # Otherwise, expand the node, appending all possible states, and playout a random new child.
+            node = self._expand(node)
+
+        if not self.isEnd[node]:
+            # Do a playout.
+            terminalState = self.game.playout(self.states[node])
+        else:
+            # We're already in the terminal state, just reuse it.
+            terminalState = self.states[node]
+
+        scores = np.array([self.game.get_score(terminalState, p) for p in range(self.playerNumber)])
+        _backpropagate(node, self.wins, self.plays, self.parent, self.player, scores)
+
+    def get_best_move(self):
+        if self.childCount[self.root] == 0:
+            raise RuntimeError("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?")
+
+        first = self.firstChild[self.root]
+        children = slice(first, first + self.childCount[self.root])
+        bestIndex = int(np.argmax(self.wins[children] / (self.plays[children] + 0.001)))
+
+        return self.moves[first + bestIndex]
+
+    def get_root_stats(self) -> Tuple[List[TMove], np.ndarray, np.ndarray]:
+        # The moves, plays and wins of the root children, in the 'enumerate_moves' order.
+        first = self.firstChild[self.root]
+        children = slice(first, first + self.childCount[self.root])
+
+        return self.moves[children], self.plays[children].copy(), self.wins[children].copy()
+
+    def _expand(self, node: int) -> int:
+        # Append the children of the node, and return a random one (or a random outcome of it) for the playout.
+        state = self.states[node]
+        player = self.game.get_next_player(state)
+        self.playerNumber = max(self.playerNumber, player + 1)
+        moves = self.game.enumerate_moves(state)
+        outcomes = [self.game.apply_move(state, move) for move in moves]
+
+        # Allocate the children in one block, the outcomes of the random children go after it.
+        first = self._add_nodes(len(moves))
+        children = slice(first, first + len(moves))
+        self.firstChild[node] = first
+        self.childCount[node] = len(moves)
+        self.parent[children] = node
+        self.player[children] = player
+        self.outcomeRow[children] = -1
+        self.moves[children] = moves
+
+        for i, outcome in enumerate(outcomes):
+            if not outcome.isRandom:
+                self.states[first + i] = outcome.state
+                self.isEnd[first + i] = outcome.isEnd
+            else:
+                # A special random node, whose children are the possible outcomes of the same move.
+                self.isRandom[first + i] = True
+                self.outcomeRow[first + i] = self._add_outcome_row()
+                self._add_outcome(first + i, outcome)
+
+        child = first + random.randrange(len(moves))
+        if self.isRandom[child]:
+            row = self.outcomeRow[child]
+            child = int(self.outcomes[row, random.randrange(self.outcomeCount[row])])
+
+        return child
+
+    def _add_outcome(self, randomNode: int, outcome: MoveOutcome) -> int:
+        node = self._add_nodes(1)
+        self.states[node] = outcome.state
+        self.parent[node] = randomNode
+        self.player[node] = self.player[randomNode]
+        self.isEnd[node] = outcome.isEnd
+        self.outcomeRow[node] = -1
+
+        row = self.outcomeRow[randomNode]
+        self.outcomes[row, self.outcomeCount[row]] = node
+        self.outcomeCount[row] += 1
+
+        return node
+
+    def _add_outcome_row(self) -> int:
+        row = self.outcomeRowCount
+        self.outcomeRowCount += 1
+        if self.outcomeRowCount > len(self.outcomes):
+            self.outcomes = _grow_array(self.outcomes, 2 * len(self.outcomes))
+            self.outcomeCount = _grow_array(self.outcomeCount, len(self.outcomes))
+
+        return row
+
+    def _add_nodes(self, count: int) -> int:
+        # Grow the arrays geometrically, and return the index of the first new node.
+        first = self.nodeCount
+        self.nodeCount += count
+        if self.nodeCount > len(self.wins):
+            capacity = len(self.wins)
+            while capacity < self.nodeCount:
+                capacity *= 2
+
+            for name in ('wins', 'plays', 'parent', 'firstChild', 'childCount', 'player', 'isRandom', 'isEnd',
+                         'outcomeRow'):
+                setattr(self, name, _grow_array(getattr(self, name), capacity))
+
+        self.states.extend([None] * count)
+        self.moves.extend([None] * count)
+
+        return first
+
+
+def _grow_array(array: np.ndarray, capacity: int) -> np.ndarray:
+    newArray = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+    newArray[:len(array)] = array
+
+    return newArray
+
+
+@jit(nopython=True, cache=True)
+def _random_index(rngState: np.ndarray, n: int) -> int:
+    # Xorshift64*, the state is a single non-zero number.
+    x = rngState[0]
+    x ^= x >> np.uint64(12)
+    x ^= x << np.uint64(25)
+    x ^= x >> np.uint64(27)
+    rngState[0] = x
+
+    return int((x * np.uint64(2685821657736338717)) >> np.uint64(33)) % n
+
+
+@jit(nopython=True, cache=True)
+def _select_leaf(root: int, wins: np.ndarray, plays: np.ndarray, firstChild: np.ndarray, childCount: np.ndarray,
+                 isRandom: np.ndarray, outcomeRow: np.ndarray, outcomes: np.ndarray, outcomeCount: np.ndarray,
+                 samplingWidth: int, explorationWeight: float, rngState: np.ndarray) -> int:
+    # Go down by UCT, until a node that is not expanded, or a random node that needs a new outcome.
+    node = root
+    while True:
+        if isRandom[node]:
+            row = outcomeRow[node]
+            if outcomeCount[row] < samplingWidth:
+                return node
+            node = outcomes[row, _random_index(rngState, outcomeCount[row])]
+            continue
+
+        if childCount[node] == 0 or plays[node] == 0:  # The latter can happen on the first run.
+            return node
+
+        first = firstChild[node]
+        logParentPlays = math.log(plays[node])
+        best, bestVal, tieCount = -1, -1.0, 0
+        for child in range(first, first + childCount[node]):
+            if plays[child] == 0:
+                best = child
+                break
+
+            uct = wins[child] / plays[child] + explorationWeight * math.sqrt(logParentPlays / plays[child])
+            if uct > bestVal:
+                best, bestVal, tieCount = child, uct, 1
+            elif uct == bestVal:
+                # Break the ties uniformly, keeping each of them with the same probability.
+                tieCount += 1
+                if _random_index(rngState, tieCount) == 0:
+                    best = child
+
+        node = best
+
+
+@jit(nopython=True, cache=True)
+def _backpropagate(node: int, wins: np.ndarray, plays: np.ndarray, parent: np.ndarray, player: np.ndarray,
+                   scores: np.ndarray):
+    # Count the score of the player whose move led to each node. (The root has no such player.)
+    while True:
+        plays[node] += 1
+        if parent[node] < 0:
+            break
+        wins[node] += scores[player[node]]
+        node = parent[node]
+
+
+class RootParallelMctsBot:
+    """
+    Root parallelism: independent searches run in worker processes, and their root stats are summed up.
+    The workers get the game once, when the pool starts, and the pool is reused for every move.
+    The states are pickled, so they have to support it. Close the bot (or use it as a context manager) when done.
+    """
+
+    def __init__(self, game: Game[GameState, TMove], workerNumber: Optional[int] = None,
+                 samplingWidth: int = 10, explorationWeight: float = 1 / 1.4142, botClass: type = MctsBot):
+
+        self.game = game
+        self.workerNumber = workerNumber or multiprocessing.cpu_count()
+        self.pool = multiprocessing.Pool(self.workerNumber, initializer=_init_search_worker,
+                                         initargs=(game, botClass, samplingWidth, explorationWeight))
+
+        self.rootMoves = []  # type: List[TMove]
+        self.rootPlays = np.zeros(0, dtype=np.int64)
+        self.rootWins = np.zeros(0, dtype=np.float64)
+
+    def search(self, state: GameState, budget: int) -> TMove:
+        # Split the budget evenly between the workers.
+        budgets = [budget // self.workerNumber + int(i < budget % self.workerNumber) for i in range(self.workerNumber)]
+        # The forked workers inherit the same random state, reseed them.
+        tasks = [(state, b, random.getrandbits(32)) for b in budgets if b > 0]
+
+        results = self.pool.starmap(_run_search_worker, tasks)
+
+        # The root children follow the order of the legal moves, in every worker.
+        self.rootMoves = self.game.enumerate_moves(state)
+        self.rootPlays = np.zeros(len(self.rootMoves), dtype=np.int64)
+        self.rootWins = np.zeros(len(self.rootMoves), dtype=np.float64)
+        for plays, wins in results:
+            assert len(plays) == len(self.rootMoves)
+            self.rootPlays += plays
+            self.rootWins += wins
+
+        return self.get_best_move()
+
+    def get_best_move(self):
+        if len(self.rootMoves) == 0 or np.sum(self.rootPlays) == 0:
+            raise RuntimeError("Can't get the best move from an empty tree. Did you iterate? Are there legal moves?")
+
+        return self.rootMoves[int(np.argmax(self.rootWins / (self.rootPlays + 0.001)))]
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# The search settings of a worker process, set when the pool starts.
+_workerSettings = None  # type: Optional[Tuple[Game, type, int, float]]
+
+
+def _init_search_worker(game: Game, botClass: type, samplingWidth: int, explorationWeight: float):
+    global _workerSettings
+    _workerSettings = (game, botClass, samplingWidth, explorationWeight)
+
+
+def _run_search_worker(state: GameState, budget: int, seed: int) -> Tuple[np.ndarray, np.ndarray]:
+    game, botClass, samplingWidth, explorationWeight = _workerSettings
+    random.seed(seed)
+    np.random.seed(seed)
+    # The games can have their own generator, inherited by every worker as well.
+    game.seed(seed)
+
+    bot = botClass(game, state, samplingWidth=samplingWidth, explorationWeight=explorationWeight)
+    for _ in range(budget):
+        bot.step()
+
+    _, plays, wins = bot.get_root_stats()
+
+    return plays, wins
@@ -1,6 +1,8 @@
 from enum import IntEnum
 from typing import *
 
+import numpy as np
+
 
 class Color(IntEnum):
     Empty = 0
@@ -11,6 +13,16 @@ class Color(IntEnum):
     White = 5
 
 
+class RootPolicy(IntEnum):
+    Uct = 0
+    SequentialHalving = 1
+
+
+class SearchMode(IntEnum):
+    ChanceNodes = 0
+    InformationSet = 1
+
+
 class Move:
     sourceBin: int
     color: Color
@@ -46,6 +58,14 @@ class AzulState:
     def copy(self) -> AzulState: ...
     def set_bin(self, binIndex: int, color: Color, count: int): ...
 
+    def to_numpy(self) -> np.ndarray: ...
+    @staticmethod
+    def from_numpy(data: np.ndarray) -> AzulState: ...
+    @staticmethod
+    def to_numpy_batch(states: List[AzulState]) -> np.ndarray: ...
+    @staticmethod
+    def from_numpy_batch(data: np.ndarray) -> List[AzulState]: ...
+
 
 class MoveOutcome:
     state: AzulState
@@ -67,6 +87,7 @@ class Azul:
     ScorePerColumn: int
     ScorePerColor: int
 
+    def seed(self, seed: int): ...
     def enumerate_moves(self, state: AzulState) -> List[Move]: ...
     def apply_move(self, state: AzulState, move: Move) -> MoveOutcome:
         """
@@ -87,7 +108,12 @@ class Azul:
         :param move:
         """
         ...
-    def playout(self, state: AzulState, maxRoundTimeout: int = 100) -> AzulState: ...
+    def playout(self, state: AzulState, maxRoundTimeout: int = 100) -> AzulState:
+        """
+        Releases the GIL while playing, so several threads can play out with the same Azul instance.
+        (Each playout gets its own random engine, seeded from the game's one.)
+        """
+        ...
     def is_game_end(self, state: AzulState) -> bool: ...
 
     def is_round_end(self, state: AzulState) -> bool: ...
@@ -102,12 +128,176 @@ class Azul:
 
 
 class MctsBot:
+    """
+    The search methods ('step', 'step_n', 'step_n_until_decided', 'step_for') release the GIL.
+    Bots can share the same Azul instance and search in parallel, but a single bot mustn't be used
+    from several threads at once.
+    """
 
     def __init__(self, azul: Azul, state: AzulState, samplingWidth: int = 10,
-                 explorationWeight: float = 1 / 1.4142): ...
+                 explorationWeight: float = 1 / 1.4142, maxNodes: int = 0, maxBytes: int = 0,
+                 searchMode: SearchMode = SearchMode.ChanceNodes, commonRandomNumbers: bool = False):
+        """
+        :param samplingWidth: How many sampled outcomes (deals) to keep per random move. Only used with chance nodes.
+        :param searchMode: With 'SearchMode.InformationSet', the tree nodes are keyed by the moves alone,
+                           new deals are sampled on every descent, and the stats are shared across the deals.
+                           This keeps the tree from multiplying at round boundaries.
+        :param commonRandomNumbers: Sample the k-th outcome of all the random moves of the same node from a shared seed,
+                                    so that the sibling moves are compared on the same deals. Only used with chance nodes.
+        :param maxNodes: Limit the tree size. Zero means no limit.
+        :param maxBytes: Limit the (approximate) tree memory. Zero means no limit.
+                         When the limit is hit, the least visited subtrees are collapsed, keeping their stats.
+                         If that doesn't free enough, the tree stops growing, but its stats are still updated.
+        """
+        ...
 
     def step(self): ...
-    def step_n(self, nSteps: int) -> Move: ...
+    def step_n(self, nSteps: int, rootPolicy: RootPolicy = RootPolicy.Uct) -> Move:
+        """
+        Run 'nSteps' steps and return the best move.
+        With 'RootPolicy.SequentialHalving', the budget is split into log2(moves) rounds, spread evenly over
+        the remaining root moves, with the worse half discarded after each round. (UCT is still used below the root.)
+        Returns the last remaining move, which can differ from 'get_best_move'.
+        """
+        ...
+    def step_n_until_decided(self, maxSteps: int, checkInterval: int = 100,
+                             confidenceZ: float = 3.0) -> Tuple[Move, int]:
+        """
+        Run up to 'maxSteps' steps, checking the root statistics every 'checkInterval' steps
+        and stopping early once the most visited root move is decided: either no other root move can overtake
+        it within the remaining budget, or its confidence interval (mean +- confidenceZ * std. error)
+        is above all the others. A non-positive 'confidenceZ' disables the confidence test.
+
+        :return: The most visited root move, which can differ from 'get_best_move' (the best mean score),
+                 and the number of steps actually done.
+        """
+        ...
+    def step_for(self, seconds: float) -> int:
+        """
+        Keep stepping until the time runs out.
+
+        :return: The number of steps done.
+        """
+        ...
     def get_best_move(self) -> Move: ...
+    def seed(self, seed: int): ...
+    def start_pondering(self):
+        """
+        Keep searching on a background thread, e.g., while the opponent is thinking.
+        The bot can't be used until 'stop_pondering' is called.
+        """
+        ...
+    def stop_pondering(self): ...
+    def is_pondering(self) -> bool: ...
+    def advance(self, move: Move, state: AzulState) -> bool:
+        """
+        Make the subtree matching the move and the resulting state the new root, keeping its stats.
+        If there's no such subtree (e.g., an unexpected deal), the search starts from scratch.
+
+        :return: Whether the subtree was reused.
+        """
+        ...
+    @staticmethod
+    def search_batch(azul: Azul, states: List[AzulState], budget: int, threads: int = 0,
+                     samplingWidth: int = 10, explorationWeight: float = 1 / 1.4142,
+                     returnVisits: bool = False) -> Union[List[Move], Tuple[List[Move], np.ndarray]]:
+        """
+        Run independent searches with the given step budget for each state on a native thread pool
+        (all hardware threads by default) and return the best move for each.
+        If 'returnVisits' is set, also return the root visit counts as a uint32 array
+        indexed by [state, sourceBin, color, targetQueue].
+        """
+        ...
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the search counters: 'nodeCount', 'treeBytes' (approximate), 'maxDepth', 'meanDepth', 'stepCount',
+        'playoutCount', 'playoutMoveCount', 'prunedNodeCount', 'stepsPerSecond', the time in seconds spent in each phase
+        ('timeSelection', 'timeExpansion', 'timePlayout', 'timeBackprop'), and the root children stats:
+        'rootMoves' (a list), 'rootPlays' and 'rootValues' (NumPy arrays).
+        """
+        ...
+    def get_root_outcomes(self) -> List[List[AzulState]]:
+        """
+        The states under each root child, in the order of 'rootMoves': the sampled outcomes (deals)
+        of the moves ending the round, in the order they were sampled, or the single resulting state of the others.
+        """
+        ...
+
+
+
+
+class FrozenLakeState:
+    position: int
+
+    def __init__(self, position: int = 0): ...
 
 
+class FrozenLakeMove:
+    direction: int
+
+    def __init__(self, direction: int): ...
+
+
+class FrozenLakeMoveOutcome:
+    state: FrozenLakeState
+    isRandom: bool
+    isEnd: bool
+
+
+class FrozenLake:
+    """
+    A toy single-player game to check the generic search on, the 4x4 FrozenLake from Gym.
+    On slippery ice, the moves are random and can slide sideways.
+    """
+    MapSize: int
+
+    def __init__(self, isSlippery: bool = False): ...
+    def enumerate_moves(self, state: FrozenLakeState) -> List[FrozenLakeMove]: ...
+    def apply_move(self, state: FrozenLakeState, move: FrozenLakeMove) -> FrozenLakeMoveOutcome: ...
+    def playout(self, state: FrozenLakeState) -> FrozenLakeState: ...
+    def is_game_end(self, state: FrozenLakeState) -> bool: ...
+    def get_score(self, state: FrozenLakeState, playerIndex: int) -> float: ...
+    def get_next_player(self, state: FrozenLakeState) -> int: ...
+    def is_slippery(self) -> bool: ...
+    @staticmethod
+    def get_init_state() -> FrozenLakeState: ...
+
+
+class FrozenLakeMctsBot:
+    """
+    The same search as 'MctsBot', over the toy game. Releases the GIL like 'MctsBot' does.
+    """
+    def __init__(self, game: FrozenLake, state: FrozenLakeState, samplingWidth: int = 10,
+                 explorationWeight: float = 1 / 1.4142, maxNodes: int = 0, maxBytes: int = 0,
+                 searchMode: SearchMode = SearchMode.ChanceNodes, commonRandomNumbers: bool = False): ...
+    def step(self): ...
+    def step_n(self, nSteps: int, rootPolicy: RootPolicy = RootPolicy.Uct) -> FrozenLakeMove: ...
+    def step_n_until_decided(self, maxSteps: int, checkInterval: int = 100,
+                             confidenceZ: float = 3.0) -> Tuple[FrozenLakeMove, int]: ...
+    def step_for(self, seconds: float) -> int: ...
+    def get_best_move(self) -> FrozenLakeMove: ...
+    def seed(self, seed: int): ...
+    def advance(self, move: FrozenLakeMove, state: FrozenLakeState) -> bool: ...
+    def stats(self) -> Dict[str, Any]: ...
+    def get_root_outcomes(self) -> List[List[FrozenLakeState]]: ...
+
+
+class GameMctsBot:
+    """
+    The native search over any Python 'azulbot.game.Game', calling back into its methods.
+    Only the tree bookkeeping is native, the game logic still runs in Python, so the bot keeps the GIL.
+    The moves and the states are compared with '__eq__'. The games use their own random numbers.
+    """
+    def __init__(self, game: Any, state: Any, samplingWidth: int = 10,
+                 explorationWeight: float = 1 / 1.4142, maxNodes: int = 0, maxBytes: int = 0,
+                 searchMode: SearchMode = SearchMode.ChanceNodes): ...
+    def step(self): ...
+    def step_n(self, nSteps: int, rootPolicy: RootPolicy = RootPolicy.Uct) -> Any: ...
+    def step_n_until_decided(self, maxSteps: int, checkInterval: int = 100,
+                             confidenceZ: float = 3.0) -> Tuple[Any, int]: ...
+    def step_for(self, seconds: float) -> int: ...
+    def get_best_move(self) -> Any: ...
+    def seed(self, seed: int): ...
+    def advance(self, move: Any, state: Any) -> bool: ...
+    def stats(self) -> Dict[str, Any]: ...
+    def get_root_outcomes(self) -> List[List[Any]]: ...
@@ -1,9 +1,10 @@
 import itertools
 import unittest
+from typing import *
 
 import numpy as np
 
-from azulbot.azulpy import Azul, Color, Move
+from azulbot.azulpy import Azul, AzulBatch, Color, Move, PlayerState
 
 
 class TestAzul(unittest.TestCase):
@@ -349,3 +350,201 @@ class TestAzul(unittest.TestCase):
 
 
 
+
+    def test_hash_cache(self):
+        azul = Azul()
+        azul.deal_round()
+        hashBefore = hash(azul)
+
+        # A copy has the same hash, until either one is mutated.
+        azulCopy = azul.copy()
+        self.assertEqual(hash(azulCopy), hashBefore)
+
+        azulCopy._apply_move_inplace(azulCopy.enumerate_moves()[0])
+        self.assertNotEqual(hash(azulCopy), hashBefore)
+        self.assertEqual(hash(azul), hashBefore)
+
+        azul.players[1].floorCount = 2
+        self.assertNotEqual(hash(azul), hashBefore)
+
+        azul.players[1].floorCount = 0
+        self.assertEqual(hash(azul), hashBefore)
+
+        azul.nextPlayer = 1
+        self.assertNotEqual(hash(azul), hashBefore)
+
+        # Writing through a view that was taken before hashing must change the hash as well.
+        bins = azul.bins
+        players = azul.players
+        hashBefore = hash(azul)
+        bins[0, 1] += 1
+        self.assertNotEqual(hash(azul), hashBefore)
+        hashBefore = hash(azul)
+        players[0].wall[0, 0] = Color.Blue
+        self.assertNotEqual(hash(azul), hashBefore)
+
+        same = Azul.from_numpy(azul.to_numpy())
+        self.assertEqual(same, azul)
+        self.assertEqual(hash(same), hash(azul))
+        self.assertIn(same, {azul})
+
+    def test_assign_player(self):
+        azul = Azul()
+        azul.deal_round()
+        player = PlayerState(score=7)
+        player.wall[0, 0] = Color.Blue
+
+        # Assigning a player writes it into the game state.
+        azul.players[1] = player
+        self.assertEqual(azul.players[1], player)
+        self.assertEqual(azul.copy().players[1].score, 7)
+        self.assertEqual(Azul.from_numpy(azul.to_numpy()).players[1].wall[0, 0], Color.Blue)
+        self.assertEqual(hash(azul), hash(azul.copy()))
+
+        # But the assigned object isn't tied to the game.
+        player.score = 8
+        self.assertEqual(azul.players[1].score, 7)
+
+        azul.players[:] = [azul.players[1], PlayerState()]
+        self.assertEqual(azul.players[0].score, 7)
+        self.assertEqual(azul.players[1], PlayerState())
+
+        with self.assertRaises(ValueError):
+            azul.players[:] = [player]
+
+    def test_playout(self):
+        for _ in range(10):
+            azul = Azul()
+            azul.playout()
+
+            self.assertTrue(azul.is_game_end())
+            self.assertTrue(azul.is_round_end())
+            self.assertEqual(np.sum(azul.bins), 0)
+            self.assertLessEqual(np.sum(azul.bag), Azul.ColorNumber * Azul.TileNumber)
+
+    def test_seed(self):
+        def play(seed: int) -> Azul:
+            Azul.seed(seed)
+            azul = Azul()
+            azul.deal_round()
+            azul.playout()
+
+            return azul
+
+        self.assertEqual(play(1), play(1))
+        self.assertNotEqual(play(1), play(2))
+
+    def test_deal_round_counts(self):
+        azul = Azul()
+        azul.bag[...] = [0, 1, 0, 3, 10, 20]
+        azul.deal_round()
+
+        sampleSize = Azul.BinNumber * Azul.BinSize
+        self.assertTrue(np.all(np.sum(azul.bins[:-1], axis=1) == Azul.BinSize))
+        self.assertEqual(np.sum(azul.bag), 34 - sampleSize)
+        self.assertTrue(np.all(np.sum(azul.bins, axis=0) + azul.bag == [0, 1, 0, 3, 10, 20]))
+
+    def test_pickle(self):
+        import pickle
+
+        azul1 = Azul()
+        azul1.deal_round()
+        azul1 = azul1.apply_move(azul1.enumerate_moves()[0]).state
+        azul1.players[0].score = 300
+
+        azul2 = pickle.loads(pickle.dumps(azul1))
+
+        self.assertEqual(azul1, azul2)
+        self.assertEqual(azul2.players[0].score, 300)
+
+        # The views must stay attached to the state after unpickling.
+        azul2.players[1].floorCount = 3
+        azul2.bins[0] = 0
+
+        self.assertNotEqual(azul1, azul2)
+        self.assertEqual(azul2.players[1].floorCount, 3)
+
+
+class TestAzulBatch(unittest.TestCase):
+
+    @staticmethod
+    def _get_random_states(number: int, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        states = []
+        for _ in range(number):
+            azul = Azul()
+            for _ in range(rng.integers(0, 60)):
+                if azul.is_game_end():
+                    break
+                if azul.is_round_end():
+                    azul.deal_round()
+
+                moves = azul.enumerate_moves()
+                azul = azul.apply_move(moves[rng.integers(len(moves))]).state
+                if azul.is_round_end() and rng.random() < 0.5:
+                    azul.score_round()
+
+            states.append(azul)
+
+        return states
+
+    def test_legal_move_mask(self):
+        states = self._get_random_states(50)
+        batch = AzulBatch.from_states(states)
+
+        mask = batch.get_legal_move_mask(np.arange(len(batch)))
+        for azul, gameMask in zip(states, mask):
+            expected = sorted(tuple(m) for m in azul.enumerate_moves())
+            actual = sorted((s, c + 1, t) for s, c, t in zip(*np.nonzero(gameMask)))
+
+            self.assertEqual(expected, actual)
+
+    def test_score_round(self):
+        states = [s for s in self._get_random_states(100) if s.is_round_end()]
+        batch = AzulBatch.from_states(states)
+
+        batch.score_round(np.ones(len(batch), dtype=bool))
+        for i, azul in enumerate(states):
+            azul.score_round()
+            self.assertEqual(azul, batch[i])
+
+    def test_playout(self):
+        batch = AzulBatch(100, np.random.default_rng(0))
+        batch.playout()
+
+        # All the random numbers come from the batch generator.
+        batchCopy = AzulBatch(100, np.random.default_rng(0))
+        batchCopy.playout()
+        self.assertTrue(np.array_equal(batch.scores, batchCopy.scores))
+
+        self.assertTrue(np.all(batch.is_game_end()))
+        self.assertTrue(np.all(batch.is_round_end()))
+        self.assertTrue(np.all(batch.scores >= 0))
+        for i in range(len(batch)):
+            self.assertTrue(batch[i].is_game_end())
+
+    def test_step(self):
+        batch = AzulBatch(50, np.random.default_rng(0))
+        isGameEnd = np.zeros(len(batch), dtype=bool)
+        for _ in range(1000):
+            isGameEnd = batch.step()
+            if np.all(isGameEnd):
+                break
+
+        self.assertTrue(np.all(isGameEnd))
+        self.assertTrue(np.all(batch.scores >= 0))
+        for i in range(len(batch)):
+            self.assertTrue(batch[i].is_game_end())
+
+    def test_generator(self):
+        # The batches don't touch the generator of the single games.
+        def deal_after(func: Callable[[], None]) -> Azul:
+            Azul.seed(1)
+            func()
+            azul = Azul()
+            azul.deal_round()
+
+            return azul
+
+        batch = AzulBatch(10, np.random.default_rng(0))
+        self.assertEqual(deal_after(lambda: None), deal_after(batch.playout))
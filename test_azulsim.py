@@ -1,9 +1,14 @@
+import asyncio
 import itertools
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from typing import *
 
 import numpy as np
 
-from azulbot.azulsim import Azul, Color, Move
+from azulbot.azulsim import Azul, AzulState, Color, Move, MctsBot, RootPolicy, SearchMode, GameMctsBot
+from azulcpp import FrozenLake, FrozenLakeMctsBot
 
 
 class TestAzul(unittest.TestCase):
@@ -376,6 +381,376 @@ class TestAzul(unittest.TestCase):
 
         self.assertTrue(azul.is_game_end(state))
 
+    def test_playout_threads(self):
+        # The playouts release the GIL, but the threads sharing the game still draw from separate engines.
+        azul = Azul()
+        azul.seed(0)
+        state = azul.get_init_state()
+        with ThreadPoolExecutor(4) as executor:
+            states = list(executor.map(lambda _: azul.playout(state), range(40)))
+
+        self.assertTrue(all(azul.is_game_end(s) for s in states))
+        self.assertGreater(len({tuple(p.score for p in s.players) for s in states}), 1)
+
+
+    def test_seed(self):
+        azul = Azul()
+
+        def play(seed: int):
+            azul.seed(seed)
+            return azul.playout(azul.get_init_state())
+
+        self.assertEqual(play(1), play(1))
+        self.assertNotEqual(play(1), play(2))
+
+        def search(seed: int):
+            bot = MctsBot(azul, azul.deal_round(azul.get_init_state(), [Color.Blue] * 20))
+            bot.seed(seed)
+            bot.step_n(100)
+            return bot.stats()['nodeCount']
+
+        self.assertEqual(search(1), search(1))
+
+    def test_numpy_conversion(self):
+        from azulbot.azulpy import Azul as AzulPy, AzulBatch
+
+        azul = Azul()
+        states = []
+        state = azul.deal_round(azul.get_init_state())
+        while not azul.is_game_end(state):
+            states.append(state)
+            moves = azul.enumerate_moves(state)
+            state = azul.apply_move(state, moves[len(states) % len(moves)]).state
+        states.append(state)
+
+        for state in states:
+            data = state.to_numpy()
+            self.assertEqual(AzulState.from_numpy(data), state)
+
+            # The pure-Python engine reads the same layout.
+            azulPy = AzulPy.from_numpy(data)
+            self.assertEqual(azulPy.is_game_end(), azul.is_game_end(state))
+            self.assertEqual([p.score for p in azulPy.players], [p.score for p in state.players])
+            if not azul.is_round_end(state):
+                movesCpp = {(m.sourceBin, int(m.color), m.targetQueue) for m in azul.enumerate_moves(state)}
+                self.assertEqual(set(azulPy.enumerate_moves()), movesCpp)
+
+            self.assertEqual(AzulState.from_numpy(azulPy.to_numpy()), state)
+
+        batchData = AzulState.to_numpy_batch(states)
+        self.assertEqual(batchData.shape, (len(states), len(states[0].to_numpy())))
+        self.assertEqual(AzulState.from_numpy_batch(AzulBatch.from_numpy(batchData).to_numpy()), states)
+
+        with self.assertRaises(ValueError):
+            AzulState.from_numpy(np.zeros(3, dtype=np.uint8))
+
+
+class TestMctsBot(unittest.TestCase):
+
+    @staticmethod
+    def _build_forced_state():
+        # A single tile is left, and all the queues are full, so the only legal move is to the floor.
+        azul = Azul()
+        state = azul.get_init_state()
+        state.set_bin(0, Color.Blue, 1)
+        for i in range(Azul.WallSize):
+            state.players[0].set_queue(i, Color.Red, i + 1)
+
+        return azul, state
+
+    def test_step_n_until_decided_forced_move(self):
+        azul, state = self._build_forced_state()
+        self.assertEqual(len(azul.enumerate_moves(state)), 1)
+
+        bot = MctsBot(azul, state)
+        move, stepsDone = bot.step_n_until_decided(10000, checkInterval=10)
+
+        self.assertEqual(stepsDone, 10)
+        self.assertEqual(move, Move(0, Color.Blue, Azul.WallSize))
+        self.assertEqual(bot.get_best_move(), Move(0, Color.Blue, Azul.WallSize))
+
+    def test_step_n_until_decided_respects_budget(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        move, stepsDone = bot.step_n_until_decided(50, checkInterval=10, confidenceZ=0)
+
+        self.assertLessEqual(stepsDone, 50)
+        self.assertIn(move, azul.enumerate_moves(state))
+
+    def test_step_n_until_decided_best_move(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        bot.seed(0)
+        maxSteps = 20000
+        move, stepsDone = bot.step_n_until_decided(maxSteps, checkInterval=100, confidenceZ=0)
+        self.assertLess(stepsDone, maxSteps)
+
+        # The returned move is the one that the rest of the budget couldn't overturn.
+        stats = bot.stats()
+        plays = sorted(stats['rootPlays'], reverse=True)
+        self.assertGreater(plays[0] - plays[1], maxSteps - stepsDone)
+        self.assertEqual(move, stats['rootMoves'][int(np.argmax(stats['rootPlays']))])
+
+        # The best move still goes by the mean score, like after 'step_n'.
+        self.assertEqual(bot.get_best_move(), stats['rootMoves'][int(np.argmax(stats['rootValues']))])
+
+    def test_step_n_sequential_halving(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        move = bot.step_n(500, rootPolicy=RootPolicy.SequentialHalving)
+
+        self.assertIn(move, azul.enumerate_moves(state))
+
+        # The forced move is found even with a tiny budget.
+        azul, state = self._build_forced_state()
+        bot = MctsBot(azul, state)
+        self.assertEqual(bot.step_n(1, rootPolicy=RootPolicy.SequentialHalving), Move(0, Color.Blue, Azul.WallSize))
+
+    def test_stats(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        stats = bot.stats()
+        self.assertEqual(stats['nodeCount'], 1)
+        self.assertEqual(stats['stepCount'], 0)
+
+        bot.step_n(100)
+        stats = bot.stats()
+        moves = azul.enumerate_moves(state)
+
+        self.assertEqual(stats['stepCount'], 100)
+        self.assertEqual(stats['playoutCount'], 100)
+        self.assertGreater(stats['playoutMoveCount'], stats['playoutCount'])
+        self.assertGreater(stats['nodeCount'], len(moves))
+        self.assertGreater(stats['treeBytes'], 0)
+        self.assertGreaterEqual(stats['maxDepth'], 2)
+        self.assertGreater(stats['meanDepth'], 0)
+        self.assertGreater(stats['stepsPerSecond'], 0)
+
+        self.assertEqual(stats['rootMoves'], moves)
+        self.assertIsInstance(stats['rootPlays'], np.ndarray)
+        self.assertEqual(stats['rootPlays'].shape, (len(moves),))
+        self.assertEqual(np.sum(stats['rootPlays']), 100)
+        self.assertEqual(stats['rootValues'].shape, (len(moves),))
+
+    def test_node_limit(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+        maxNodes = 2000
+
+        bot = MctsBot(azul, state, maxNodes=maxNodes)
+        bot.step_n(1000)
+        stats = bot.stats()
+
+        # The limit can be overshot by a single expansion.
+        self.assertLess(stats['nodeCount'], maxNodes + 200)
+        self.assertGreater(stats['prunedNodeCount'], 0)
+        # The root stats are still being updated.
+        self.assertEqual(np.sum(stats['rootPlays']), 1000)
+
+        bot = MctsBot(azul, state, maxBytes=maxNodes * 200)
+        bot.step_n(1000)
+        self.assertLess(bot.stats()['treeBytes'], maxNodes * 200 + 200 * 200)
+
+        # After pruning, the max depth is the one of the tree that's left, so it has to fit the exact counters:
+        # the depths sum to at least a chain down to the deepest node, with the rest right below the root children.
+        bot = MctsBot(azul, state, maxNodes=200)
+        bot.step_n(1000)
+        stats = bot.stats()
+        self.assertGreater(stats['prunedNodeCount'], 0)
+        rootChildNumber = len(stats['rootPlays'])
+        deeperNumber = stats['nodeCount'] - 1 - rootChildNumber
+        minDepthSum = rootChildNumber + sum(range(2, stats['maxDepth'] + 1)) + \
+                      2 * (deeperNumber - max(stats['maxDepth'] - 1, 0))
+        self.assertGreaterEqual(stats['meanDepth'] * stats['nodeCount'] + 1e-6, minDepthSum)
+
+    def test_step_for(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        stepsDone = bot.step_for(0.05)
+
+        self.assertGreater(stepsDone, 0)
+        self.assertEqual(bot.stats()['stepCount'], stepsDone)
+
+    def test_search_async(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        async def _search_concurrently():
+            # The bots share the same game, but run in parallel.
+            bots = [MctsBot(azul, state), MctsBot(azul, state)]
+            return await asyncio.gather(bots[0].search_async(budget=200), bots[1].search_async(seconds=0.05))
+
+        results = asyncio.run(_search_concurrently())
+
+        for move, stats in results:
+            self.assertIn(move, azul.enumerate_moves(state))
+            self.assertGreater(stats['stepCount'], 0)
+        self.assertEqual(results[0][1]['stepCount'], 200)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(MctsBot(azul, state).search_async())
+
+    def test_pondering(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        bot.start_pondering()
+        self.assertTrue(bot.is_pondering())
+        time.sleep(0.05)
+
+        # Can't touch the tree while pondering.
+        with self.assertRaises(RuntimeError):
+            bot.step()
+
+        bot.stop_pondering()
+        self.assertFalse(bot.is_pondering())
+        self.assertGreater(bot.stats()['stepCount'], 0)
+
+    def test_advance(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state)
+        move = bot.step_n(1000)
+        stats = bot.stats()
+        moveIndex = stats['rootMoves'].index(move)
+        movePlays = stats['rootPlays'][moveIndex]
+
+        # Within a round, the subtree is reused.
+        nextState = azul.apply_move_without_scoring(state, move).state
+        self.assertTrue(bot.advance(move, nextState))
+        stats = bot.stats()
+        # (The node's own playout isn't counted by the children, unless it was expanded right away.)
+        self.assertIn(np.sum(stats['rootPlays']), (movePlays - 1, movePlays))
+
+        bot.step_n(100)
+        self.assertIn(bot.get_best_move(), azul.enumerate_moves(nextState))
+
+        # An unknown state starts the search over.
+        self.assertFalse(bot.advance(move, state))
+        self.assertEqual(bot.stats()['nodeCount'], 1)
+
+    def test_search_batch(self):
+        azul = Azul()
+        states = [azul.deal_round(azul.get_init_state()) for _ in range(5)]
+
+        moves = MctsBot.search_batch(azul, states, 200, threads=3)
+        self.assertEqual(len(moves), len(states))
+        for move, state in zip(moves, states):
+            self.assertIn(move, azul.enumerate_moves(state))
+
+        moves, visits = MctsBot.search_batch(azul, states, 200, threads=3, returnVisits=True)
+        self.assertEqual(visits.shape, (len(states), Azul.BinNumber + 1, Azul.ColorNumber + 1, Azul.WallSize + 1))
+        np.testing.assert_equal(np.sum(visits, axis=(1, 2, 3)), 200)
+        for i, state in enumerate(states):
+            for move in azul.enumerate_moves(state):
+                self.assertGreater(visits[i, move.sourceBin, int(move.color), move.targetQueue], 0)
+
+    def test_information_set_search(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        bot = MctsBot(azul, state, searchMode=SearchMode.InformationSet)
+        move = bot.step_n(1000)
+        stats = bot.stats()
+
+        self.assertIn(move, azul.enumerate_moves(state))
+        self.assertEqual(stats['stepCount'], 1000)
+        self.assertEqual(np.sum(stats['rootPlays']), 1000)
+        self.assertEqual(stats['rootMoves'], azul.enumerate_moves(state))
+
+        # The subtree is reused whatever the deal.
+        nextState = azul.apply_move_without_scoring(state, move).state
+        self.assertTrue(bot.advance(move, nextState))
+        self.assertIn(bot.step_n(100), azul.enumerate_moves(nextState))
+
+        # The search goes through the round boundaries without chance nodes.
+        azul, state = self._build_forced_state()
+        bot = MctsBot(azul, state, searchMode=SearchMode.InformationSet)
+        bot.step_n(300)
+        self.assertGreaterEqual(bot.stats()['maxDepth'], 2)
+        self.assertEqual(bot.get_best_move(), Move(0, Color.Blue, Azul.WallSize))
+
+    def test_common_random_numbers(self):
+        azul = Azul()
+        state = azul.get_init_state()
+        # Every move ends the round.
+        state.set_bin(0, Color.Blue, 1)
+        # Fill the bag, so that it isn't refilled from the discarded tiles, which depend on the move.
+        data = state.to_numpy()
+        data[1:Azul.ColorNumber + 1] = Azul.TileNumber
+        state = AzulState.from_numpy(data)
+
+        bot = MctsBot(azul, state, samplingWidth=3, commonRandomNumbers=True)
+        move = bot.step_n(500)
+
+        self.assertIn(move, azul.enumerate_moves(state))
+        self.assertEqual(np.sum(bot.stats()['rootPlays']), 500)
+
+        # The k-th deal is the same under every sibling move. (The bag and the bins come first in the packed state.)
+        def get_deals(bot: MctsBot) -> List[List[bytes]]:
+            return [[s.to_numpy()[:42].tobytes() for s in outcomes] for outcomes in bot.get_root_outcomes()]
+
+        # (Less visited moves might have sampled fewer deals.)
+        deals = get_deals(bot)
+        self.assertEqual(len(deals), len(azul.enumerate_moves(state)))
+        longest = max(deals, key=len)
+        self.assertEqual(len(longest), 3)
+        self.assertEqual(len(set(longest)), 3)
+        for childDeals in deals:
+            self.assertEqual(childDeals, longest[:len(childDeals)])
+
+        # Without them, the siblings get independent deals.
+        bot = MctsBot(azul, state, samplingWidth=3)
+        bot.step_n(500)
+        deals = get_deals(bot)
+        self.assertNotEqual(deals[0][0], deals[1][0])
+
+    def test_frozen_lake(self):
+        # The same search runs on a toy game, and finds the way to the goal.
+        game = FrozenLake()
+        state = game.get_init_state()
+        for _ in range(20):
+            if game.is_game_end(state):
+                break
+            bot = FrozenLakeMctsBot(game, state)
+            state = game.apply_move(state, bot.step_n(1000)).state
+
+        self.assertTrue(game.is_game_end(state))
+        self.assertEqual(game.get_score(state, 0), 1.0)
+
+        # On slippery ice, the moves lead to chance nodes.
+        game = FrozenLake(isSlippery=True)
+        bot = FrozenLakeMctsBot(game, game.get_init_state(), samplingWidth=3)
+        bot.step_n(500)
+        stats = bot.stats()
+        self.assertEqual(np.sum(stats['rootPlays']), 500)
+        self.assertGreater(stats['maxDepth'], 2)
+
+    def test_game_mcts_bot(self):
+        # The native search calls back into any Python game.
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
 
+        for searchMode in (SearchMode.ChanceNodes, SearchMode.InformationSet):
+            bot = GameMctsBot(azul, state, searchMode=searchMode)
+            move = bot.step_n(200)
+            stats = bot.stats()
 
+            self.assertIn(move, azul.enumerate_moves(state))
+            self.assertEqual(stats['stepCount'], 200)
+            self.assertEqual(stats['rootMoves'], azul.enumerate_moves(state))
 
+            # The states and the moves are compared by value.
+            self.assertTrue(bot.advance(move, azul.apply_move(state, move).state))
@@ -0,0 +1,150 @@
+import os
+import tempfile
+import time
+import unittest
+from typing import *
+
+from GridSearchManager import GridSearchManager, SuccessiveHalvingSearchManager
+
+
+class _CrashError(Exception):
+    pass
+
+
+_calledPoints = []  # type: List[Dict[str, Any]]
+
+
+def _target(config: Dict[str, Any], searchPoint: Dict[str, Any], runName: str) -> Dict[str, Any]:
+    # Module-level, so that the process pool can pickle it.
+    _calledPoints.append(searchPoint)
+    if config.get('crashAt') == (config['a'], config['b']):
+        raise _CrashError()
+    # Finish the runs out of order, when run in parallel.
+    time.sleep(config.get('delay', 0) * (3 - config['a']))
+
+    return {'value': config['a'] * 10 + config['b'], 'isSecond': runName.endswith('_instance-1')}
+
+
+def _build_grid(**defaultConfig) -> GridSearchManager:
+    searchManager = GridSearchManager(defaultConfig)
+    searchManager.add_param_axis('a', [0, 1, 2])
+    searchManager.add_param_axis('b', [0, 1])
+
+    return searchManager
+
+
+class TestGridSearchManager(unittest.TestCase):
+
+    def setUp(self):
+        _calledPoints.clear()
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.resultsPath = os.path.join(self.tempDir.name, 'runs.jsonl')
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def test_run_search(self):
+        runResults, resultsAvg, resultsFull = _build_grid().run_search(_target)
+
+        self.assertEqual([r.metrics['value'] for r in runResults], [0, 1, 10, 11, 20, 21])
+        self.assertEqual([(r['a'], r['b'], r['value']) for r in resultsAvg],
+                         [(0, 0, 0), (0, 1, 1), (1, 0, 10), (1, 1, 11), (2, 0, 20), (2, 1, 21)])
+        self.assertEqual(resultsFull, resultsAvg)
+
+    def test_workers(self):
+        runResults, resultsAvg, resultsFull = _build_grid(delay=0.05).run_search(_target, repeatNumber=2, workers=3)
+
+        # The results keep the search order, even though the later points finish first.
+        self.assertEqual([(r.paramValues['a'], r.paramValues['b'], r.instance) for r in runResults],
+                         [(a, b, i) for a in range(3) for b in range(2) for i in range(2)])
+        self.assertEqual([r.metrics['isSecond'] for r in runResults], [False, True] * 6)
+        self.assertEqual([r['value'] for r in resultsAvg], [0, 1, 10, 11, 20, 21])
+        self.assertEqual([r['value-std'] for r in resultsFull], [0] * 6)
+
+    def test_resume(self):
+        with self.assertRaises(_CrashError):
+            _build_grid(crashAt=(2, 0)).run_search(_target, resultsPath=self.resultsPath)
+
+        # Cut the last record short, as if the search was killed while writing it.
+        with open(self.resultsPath, 'rb+') as file:
+            content = file.read()
+            self.assertEqual(content.count(b'\n'), 4)
+            file.truncate(len(content) - 10)
+
+        _calledPoints.clear()
+        runResults, resultsAvg, _ = _build_grid().run_search(_target, resultsPath=self.resultsPath)
+
+        # Only the partial run and the runs that didn't start are executed.
+        self.assertEqual([(p['a'], p['b']) for p in _calledPoints], [(1, 1), (2, 0), (2, 1)])
+        self.assertEqual([r['value'] for r in resultsAvg], [0, 1, 10, 11, 20, 21])
+
+        # Every run was stored, on its own line.
+        with open(self.resultsPath, 'r') as file:
+            self.assertEqual(len(file.readlines()), 6)
+
+        _calledPoints.clear()
+        runResults, resultsAvg, _ = _build_grid().run_search(_target, resultsPath=self.resultsPath)
+        self.assertEqual(_calledPoints, [])
+        self.assertEqual([r.metrics['value'] for r in runResults], [0, 1, 10, 11, 20, 21])
+
+
+def _halving_target(config: Dict[str, Any], searchPoint: Dict[str, Any], runName: str) -> Dict[str, Any]:
+    return {'value': config['values'][config['a']], 'games': config['games']}
+
+
+class TestSuccessiveHalvingSearchManager(unittest.TestCase):
+
+    @staticmethod
+    def _build_halving(values: List[float], maximize: bool = True,
+                       minResource: int = 1, maxResource: int = 9) -> SuccessiveHalvingSearchManager:
+        baseManager = GridSearchManager({'values': values})
+        baseManager.add_param_axis('a', list(range(len(values))))
+
+        return SuccessiveHalvingSearchManager(baseManager, 'games', minResource=minResource, maxResource=maxResource,
+                                              metricName='value', maximize=maximize, reductionFactor=3)
+
+    def test_rung_resources(self):
+        self.assertEqual(self._build_halving([0], minResource=1, maxResource=9).get_rung_resources(), [1, 3, 9])
+        self.assertEqual(self._build_halving([0], minResource=4, maxResource=30).get_rung_resources(), [4, 12, 30])
+        self.assertEqual(self._build_halving([0], minResource=5, maxResource=5).get_rung_resources(), [5])
+
+        with self.assertRaises(ValueError):
+            self._build_halving([0], minResource=10, maxResource=5)
+
+    def _get_rungs(self, runResults) -> List[List[int]]:
+        rungs = {}
+        for r in runResults:
+            self.assertEqual(r.metrics['games'], r.paramValues['games'])
+            rungs.setdefault(r.paramValues['games'], []).append(r.paramValues['a'])
+
+        return [rungs[resource] for resource in sorted(rungs)]
+
+    def test_promotion(self):
+        values = [3, 8, 1, 5, 9, 0, 7, 2, 4]
+        searchManager = self._build_halving(values)
+        runResults, resultsAvg, _ = searchManager.run_search(_halving_target)
+
+        self.assertEqual(self._get_rungs(runResults), [list(range(9)), [1, 4, 6], [4]])
+        self.assertEqual(len(resultsAvg), 9 + 3 + 1)
+
+        # The state of the search is reset afterwards.
+        self.assertEqual([c.config['games'] for c in searchManager.generate_configuration()], [1] * 9)
+
+        runResults, _, _ = self._build_halving(values, maximize=False).run_search(_halving_target)
+        self.assertEqual(self._get_rungs(runResults), [list(range(9)), [2, 5, 7], [5]])
+
+    def test_ties(self):
+        # The earlier configurations win the ties.
+        runResults, _, _ = self._build_halving([1, 2, 2, 2, 2, 0, 0, 2, 1]).run_search(_halving_target)
+        self.assertEqual(self._get_rungs(runResults), [list(range(9)), [1, 2, 3], [1]])
+
+        runResults, _, _ = self._build_halving([1] * 9, maximize=False).run_search(_halving_target)
+        self.assertEqual(self._get_rungs(runResults), [list(range(9)), [0, 1, 2], [0]])
+
+        # A single configuration stops after the first rung.
+        runResults, _, _ = self._build_halving([1]).run_search(_halving_target)
+        self.assertEqual(self._get_rungs(runResults), [[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,286 @@
+import copy
+import random
+import unittest
+from dataclasses import dataclass
+from typing import *
+
+import gym
+import numpy as np
+
+from azulbot import Game, GameState, MoveOutcome
+from azulbot.azulsim import Azul, Color, Move
+from frozenlake import FrozenLake, Move as FrozenLakeMove, State as FrozenLakeState
+import mcts_bot
+from mcts_bot import MctsBot, ArrayMctsBot, RootParallelMctsBot
+
+
+@dataclass
+class NimState(GameState):
+    stones: int
+    nextPlayer: int = 0
+
+    def copy(self) -> 'NimState':
+        return NimState(self.stones, self.nextPlayer)
+
+
+class Nim(Game[NimState, int]):
+    # A pure-Python game that can be pickled: take 1-3 stones, whoever takes the last one wins.
+
+    def enumerate_moves(self, state: NimState) -> List[int]:
+        return list(range(1, min(3, state.stones) + 1))
+
+    def apply_move(self, state: NimState, move: int) -> MoveOutcome[NimState]:
+        next_ = NimState(state.stones - move, 1 - state.nextPlayer)
+        return MoveOutcome(next_, False, self.is_game_end(next_))
+
+    def playout(self, state: NimState) -> NimState:
+        while not self.is_game_end(state):
+            state = self.apply_move(state, np.random.randint(1, min(3, state.stones) + 1)).state
+
+        return state
+
+    def is_game_end(self, state: NimState) -> bool:
+        return state.stones == 0
+
+    def get_score(self, state: NimState, playerIndex: int) -> float:
+        # The player who took the last stone is not the next one.
+        return float(state.nextPlayer != playerIndex)
+
+    def get_next_player(self, state: NimState) -> int:
+        return state.nextPlayer
+
+    @staticmethod
+    def get_init_state():
+        return NimState(10)
+
+
+@dataclass
+class CoinState(GameState):
+    stepsLeft: int
+    winner: int = -1
+
+    def copy(self) -> 'CoinState':
+        return CoinState(self.stepsLeft, self.winner)
+
+
+class CoinGame(Game[CoinState, int]):
+    # A single-player game of forced moves, won or lost by a coin flip drawn from the game's own generator.
+
+    def __init__(self):
+        self.rng = np.random.default_rng()
+
+    def enumerate_moves(self, state: CoinState) -> List[int]:
+        return [0] if state.stepsLeft > 0 else []
+
+    def apply_move(self, state: CoinState, move: int) -> MoveOutcome[CoinState]:
+        next_ = CoinState(state.stepsLeft - 1)
+        return MoveOutcome(next_, False, self.is_game_end(next_))
+
+    def playout(self, state: CoinState) -> CoinState:
+        return CoinState(0, int(self.rng.random() < 0.5))
+
+    def is_game_end(self, state: CoinState) -> bool:
+        return state.stepsLeft == 0
+
+    def get_score(self, state: CoinState, playerIndex: int) -> float:
+        return float(state.winner == 1)
+
+    def get_next_player(self, state: CoinState) -> int:
+        return 0
+
+    @staticmethod
+    def get_init_state():
+        return CoinState(1000)
+
+    def seed(self, seed: int):
+        self.rng = np.random.default_rng(seed)
+
+
+class TestMctsBot(unittest.TestCase):
+
+    def test_solver(self):
+        nim = Nim()
+
+        # Taking two stones leaves a multiple of four, which wins.
+        bot = MctsBot(nim, NimState(10))
+        for _ in range(2000):
+            bot.step()
+
+        self.assertEqual(bot.root.winner, 0)
+        self.assertEqual(bot.get_best_move(), 2)
+        # The decided subtrees don't need playouts, the steps stop at the root.
+        childPlays = [n.plays for n in bot.root.children]
+        bot.step()
+        self.assertEqual([n.plays for n in bot.root.children], childPlays)
+
+        # A multiple of four loses whatever the move.
+        bot = MctsBot(nim, NimState(8))
+        for _ in range(2000):
+            bot.step()
+
+        self.assertEqual(bot.root.winner, 1)
+        self.assertTrue(all(n.winner == 1 for n in bot.root.children))
+
+    def test_terminal_nodes(self):
+        nim = Nim()
+        bot = MctsBot(nim, NimState(2))
+        bot.step()
+
+        # Taking both stones ends the game, and is known to win right after the expansion.
+        self.assertEqual([n.isEnd for n in bot.root.children], [False, True])
+        self.assertEqual(bot.root.children[1].winner, 0)
+        self.assertEqual(bot.root.winner, 0)
+        self.assertEqual(bot.get_best_move(), 2)
+
+
+    def test_single_player(self):
+        # The score doesn't depend on the player index, so the holes must not be taken as proven wins.
+        random.seed(0)
+        game = FrozenLake()
+
+        for botClass in (MctsBot, ArrayMctsBot):
+            # The hole is to the right.
+            bot = botClass(game, FrozenLakeState(4))
+            for _ in range(300):
+                bot.step()
+            self.assertNotEqual(bot.get_best_move().d, 2)
+
+            # The ice isn't slippery, so the bot should always reach the goal.
+            for _ in range(5):
+                state = game.get_init_state()
+                while not game.is_game_end(state):
+                    bot = botClass(game, state)
+                    for _ in range(300):
+                        bot.step()
+                    state = game.apply_move(state, bot.get_best_move()).state
+
+                self.assertEqual(game.get_score(state, 0), 1.0)
+
+
+class TestArrayMctsBot(unittest.TestCase):
+
+    def test_step(self):
+        azul = Azul()
+        state = azul.deal_round(azul.get_init_state())
+
+        # Start small, to make the arrays grow.
+        bot = ArrayMctsBot(azul, state, initialCapacity=4)
+        for _ in range(300):
+            bot.step()
+
+        self.assertIn(bot.get_best_move(), azul.enumerate_moves(state))
+        self.assertEqual(bot.plays[bot.root], 300)
+
+        first, count = bot.firstChild[bot.root], bot.childCount[bot.root]
+        self.assertEqual(count, len(azul.enumerate_moves(state)))
+        self.assertEqual(bot.moves[first:first + count], azul.enumerate_moves(state))
+        # Every step goes through exactly one root child.
+        self.assertEqual(np.sum(bot.plays[first:first + count]), 300)
+        self.assertGreaterEqual(len(bot.wins), bot.nodeCount)
+
+    def test_random_moves(self):
+        # A single tile is left, and all the queues are full, so the only legal move is to the floor.
+        # It ends the round, so it leads to a random node.
+        azul = Azul()
+        state = azul.get_init_state()
+        state.set_bin(0, Color.Blue, 1)
+        for i in range(Azul.WallSize):
+            state.players[0].set_queue(i, Color.Red, i + 1)
+
+        bot = ArrayMctsBot(azul, state, samplingWidth=3)
+        for _ in range(50):
+            bot.step()
+
+        self.assertEqual(bot.get_best_move(), Move(0, Color.Blue, Azul.WallSize))
+        randomNode = bot.firstChild[bot.root]
+        self.assertTrue(bot.isRandom[randomNode])
+        self.assertEqual(bot.outcomeCount[bot.outcomeRow[randomNode]], 3)
+        self.assertEqual(bot.plays[randomNode], 50)
+
+
+class TestRootParallelMctsBot(unittest.TestCase):
+
+    def test_search(self):
+        nim = Nim()
+        state = nim.get_init_state()
+
+        for botClass in (MctsBot, ArrayMctsBot):
+            with RootParallelMctsBot(nim, workerNumber=3, botClass=botClass) as bot:
+                # The pool is reused across the moves.
+                for budget in (100, 200):
+                    move = bot.search(state, budget)
+
+                    self.assertIn(move, nim.enumerate_moves(state))
+                    self.assertEqual(bot.rootMoves, nim.enumerate_moves(state))
+                    # Once the root is solved, the steps stop at the root.
+                    self.assertGreater(np.sum(bot.rootPlays), 0)
+                    self.assertLessEqual(np.sum(bot.rootPlays), budget)
+
+    def test_worker_seeds(self):
+        game = CoinGame()
+        state = game.get_init_state()
+
+        results = []
+        try:
+            for seed in (1, 2, 1):
+                # Every forked worker starts with a copy of the same game generator.
+                mcts_bot._init_search_worker(copy.deepcopy(game), MctsBot, 10, 1 / 1.4142)
+                results.append(mcts_bot._run_search_worker(state, 100, seed))
+        finally:
+            mcts_bot._workerSettings = None
+
+        (plays1, wins1), (plays2, wins2), (plays3, wins3) = results
+        self.assertEqual(list(plays1), list(plays2))
+        # The workers don't repeat each other's playouts, but a worker seed still reproduces its search.
+        self.assertNotEqual(list(wins1), list(wins2))
+        self.assertEqual(list(wins1), list(wins3))
+
+
+class TestFrozenLake(unittest.TestCase):
+
+    def test_tables(self):
+        for envName in ('FrozenLakeNotSlippery-v0', 'FrozenLake-v1'):
+            game = FrozenLake(envName)
+            transitions = gym.make(envName).unwrapped.P
+            self.assertEqual(game.isStochastic, envName == 'FrozenLake-v1')
+
+            for s, actions in transitions.items():
+                for a, outcomes in actions.items():
+                    # The padding repeats the last outcome with zero probability.
+                    count = len(outcomes)
+                    self.assertEqual(list(game.nextStates[s, a, :count]), [o[1] for o in outcomes])
+                    self.assertTrue(np.all(game.nextStates[s, a, count:] == outcomes[-1][1]))
+                    probs = np.diff(game.cumulativeProbs[s, a], prepend=0)
+                    self.assertTrue(np.allclose(probs[:count], [o[0] for o in outcomes]))
+                    self.assertTrue(np.allclose(probs[count:], 0))
+
+                    for _, nextState, reward, done in outcomes:
+                        self.assertEqual(game.is_game_end(FrozenLakeState(nextState)), done)
+                        # The staying moves of the goal give no reward, the states keep the best one.
+                        self.assertGreaterEqual(game.get_score(FrozenLakeState(nextState), 0), reward)
+
+            self.assertEqual(list(game.scores).count(1.0), 1)
+
+    def test_apply_move(self):
+        game = FrozenLake()
+        transitions = gym.make('FrozenLakeNotSlippery-v0').unwrapped.P
+        for s, actions in transitions.items():
+            for a, ((_, nextState, _, done),) in actions.items():
+                outcome = game.apply_move(FrozenLakeState(s), FrozenLakeMove(a))
+                self.assertEqual(outcome.state.s, nextState)
+                self.assertEqual(outcome.isEnd, done)
+                self.assertFalse(outcome.isRandom)
+
+    def test_playout(self):
+        for envName in ('FrozenLakeNotSlippery-v0', 'FrozenLake-v1'):
+            game = FrozenLake(envName)
+            states = np.repeat(np.arange(game.stateNumber), 20)
+
+            terminalStates = game.playout_batch(states, np.random.default_rng(0))
+            self.assertEqual(terminalStates.shape, states.shape)
+            self.assertTrue(np.all(game.isTerminal[terminalStates]))
+            # The terminal states stay where they are.
+            self.assertTrue(np.all(terminalStates[game.isTerminal[states]] == states[game.isTerminal[states]]))
+
+            for s in range(game.stateNumber):
+                self.assertTrue(game.is_game_end(game.playout(FrozenLakeState(s))))
@@ -0,0 +1,57 @@
+import math
+import unittest
+
+from lib.sprt import elo_to_score, score_to_elo, get_score_stats, compute_sprt_llr
+
+
+class TestSprt(unittest.TestCase):
+
+    def test_elo(self):
+        self.assertAlmostEqual(score_to_elo(0.5), 0)
+        self.assertAlmostEqual(elo_to_score(0), 0.5)
+        self.assertAlmostEqual(score_to_elo(0.75), 400 * math.log10(3))
+        self.assertAlmostEqual(score_to_elo(0.25), -400 * math.log10(3))
+
+        for elo in [-300, -50, 0, 10, 200]:
+            self.assertAlmostEqual(score_to_elo(elo_to_score(elo)), elo)
+
+        # One-sided scores are clipped instead of diverging.
+        self.assertTrue(math.isfinite(score_to_elo(1)))
+        self.assertTrue(math.isfinite(score_to_elo(0)))
+        self.assertGreater(score_to_elo(1), 2000)
+
+    def test_score_stats(self):
+        score, variance, n = get_score_stats(0, 0, 0)
+        self.assertEqual(n, 0)
+        self.assertAlmostEqual(score, 0.5)
+
+        # All wins still get a nonzero variance.
+        score, variance, n = get_score_stats(10, 0, 0)
+        self.assertEqual(n, 10)
+        self.assertLess(score, 1)
+        self.assertGreater(variance, 0)
+
+        score, variance, n = get_score_stats(60, 20, 20)
+        self.assertEqual(n, 100)
+        self.assertAlmostEqual(score, 70.5 / 101)
+
+    def test_llr(self):
+        self.assertEqual(compute_sprt_llr(0, 0, 0, elo0=0, elo1=50), 0)
+
+        # An even result favours H0 when H1 claims a positive Elo difference.
+        self.assertLess(compute_sprt_llr(10, 0, 10, elo0=0, elo1=50), 0)
+        self.assertLess(compute_sprt_llr(0, 10, 0, elo0=0, elo1=50), 0)
+        self.assertLess(compute_sprt_llr(100, 50, 100, elo0=0, elo1=50),
+                        compute_sprt_llr(10, 5, 10, elo0=0, elo1=50))
+
+        self.assertAlmostEqual(compute_sprt_llr(60, 20, 20, elo0=0, elo1=50), 7.190843957621188)
+        self.assertGreater(compute_sprt_llr(61, 20, 19, elo0=0, elo1=50),
+                           compute_sprt_llr(60, 20, 20, elo0=0, elo1=50))
+
+        # Swapping the results and the hypotheses flips the sign.
+        self.assertAlmostEqual(compute_sprt_llr(20, 20, 60, elo0=-50, elo1=0),
+                               -compute_sprt_llr(60, 20, 20, elo0=0, elo1=50))
+
+
+if __name__ == '__main__':
+    unittest.main()